@@ -0,0 +1,37 @@
+"""Add item (owner_id, id) index
+
+Revision ID: 6f1c2a9d4b7e
+Revises: 1a31ce608336
+Create Date: 2026-10-17 21:02:11.114523
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '6f1c2a9d4b7e'
+down_revision = '1a31ce608336'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Build the index without locking writes on big tables, CONCURRENTLY can't
+    # run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_item_owner_id_id',
+            'item',
+            ['owner_id', 'id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_item_owner_id_id', table_name='item', postgresql_concurrently=True
+        )
@@ -0,0 +1,34 @@
+"""Add row version columns to user and item
+
+Revision ID: b3e8d5f2a1c6
+Revises: 6f1c2a9d4b7e
+Create Date: 2026-10-17 23:14:37.518246
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e8d5f2a1c6'
+down_revision = '6f1c2a9d4b7e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A constant default doesn't rewrite the table
+    op.add_column(
+        'user',
+        sa.Column('version', sa.Integer(), server_default='1', nullable=False),
+    )
+    op.add_column(
+        'item',
+        sa.Column('version', sa.Integer(), server_default='1', nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_column('item', 'version')
+    op.drop_column('user', 'version')
@@ -0,0 +1,49 @@
+import hashlib
+from typing import Any
+
+from fastapi import HTTPException, Response
+
+from app.core.compression import decoded_etag
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    Strong ETag from the values that determine a response, e.g. row versions.
+    """
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(header: str | None, etag: str, *, weak: bool) -> bool:
+    """
+    Check an If-None-Match (weak comparison) or If-Match (strong comparison)
+    header against the current ETag. The ETags of its compressed representations
+    match too, see compression.encoded_etag.
+    """
+    if header is None:
+        return False
+    for value in header.split(","):
+        value = value.strip()
+        if value == "*":
+            return True
+        if weak and value.startswith("W/"):
+            value = value[2:]
+        if decoded_etag(value) == etag:
+            return True
+    return False
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+def precondition_failed() -> HTTPException:
+    return HTTPException(
+        status_code=412,
+        detail="The resource was modified, read it again to get its current ETag",
+    )
+
+
+def check_if_match(if_match: str | None, etag: str) -> None:
+    if if_match is not None and not etag_matches(if_match, etag, weak=False):
+        raise precondition_failed()
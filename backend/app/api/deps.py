@@ -1,17 +1,20 @@
-from collections.abc import Generator
+import uuid
+from collections.abc import AsyncGenerator, Generator
 from typing import Annotated
 
-import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core import security
 from app.core.config import settings
-from app.core.db import engine
-from app.models import TokenPayload, User
+from app.core.db import async_engine, engine
+from app.core.security import AuthUser, auth_user_cache
+from app.core.timing import timed
+from app.models import User
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/login/access-token"
@@ -23,33 +26,65 @@ def get_db() -> Generator[Session, None, None]:
         yield session
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    # Don't expire on commit, attributes can't be lazy loaded again outside of
+    # an await, e.g. while FastAPI serializes the response
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+
 SessionDep = Annotated[Session, Depends(get_db)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
 
-def get_current_user(session: SessionDep, token: TokenDep) -> User:
-    try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
-        )
-        token_data = TokenPayload(**payload)
-    except (InvalidTokenError, ValidationError):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Could not validate credentials",
-        )
-    user = session.get(User, token_data.sub)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    if not user.is_active:
-        raise HTTPException(status_code=400, detail="Inactive user")
-    return user
+async def get_current_auth_user(session: AsyncSessionDep, token: TokenDep) -> AuthUser:
+    with timed("auth"):
+        try:
+            user_id = uuid.UUID(security.decode_access_token(token))
+        except (InvalidTokenError, ValidationError, TypeError, ValueError):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Could not validate credentials",
+            )
+        auth_user = auth_user_cache.get(user_id)
+        if auth_user is None:
+            user = await session.get(User, user_id)
+            if not user:
+                raise HTTPException(status_code=404, detail="User not found")
+            # The identity map only holds weak references, keep the user so
+            # get_current_user finds it there instead of querying it again
+            session.info["current_user"] = user
+            auth_user = AuthUser(
+                id=user.id, is_active=user.is_active, is_superuser=user.is_superuser
+            )
+            auth_user_cache.set(user_id, auth_user)
+        if not auth_user.is_active:
+            raise HTTPException(status_code=400, detail="Inactive user")
+        return auth_user
+
+
+# Use it when only the id and the is_active / is_superuser checks are needed,
+# it's cached and doesn't need a query most of the time
+CurrentAuthUser = Annotated[AuthUser, Depends(get_current_auth_user)]
+
+
+async def get_current_user(
+    session: AsyncSessionDep, auth_user: CurrentAuthUser
+) -> User:
+    with timed("auth"):
+        user = await session.get(User, auth_user.id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        if not user.is_active:
+            raise HTTPException(status_code=400, detail="Inactive user")
+        return user
 
 
 CurrentUser = Annotated[User, Depends(get_current_user)]
 
 
-def get_current_active_superuser(current_user: CurrentUser) -> User:
+def get_current_active_superuser(current_user: CurrentAuthUser) -> AuthUser:
     if not current_user.is_superuser:
         raise HTTPException(
             status_code=403, detail="The user doesn't have enough privileges"
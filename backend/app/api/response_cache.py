@@ -0,0 +1,123 @@
+import uuid
+from collections.abc import Iterable
+from urllib.parse import urlencode
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+from app.api.conditional import etag_matches, not_modified
+from app.core.cache import CachedResponse, MemoryResponseCache, ResponseCacheBackend
+from app.core.config import settings
+from app.core.security import AuthUser
+
+
+class ResponseCache:
+    """
+    Cache of the rendered responses of the enabled routes.
+
+    Responses depend on the caller, so the keys include its id and superuser
+    status. Each entry is set with tags, the write routes invalidate the tags of
+    what they change, see the *_tags functions below. The routes take the
+    generation() before their queries and pass it to set(), so that a response
+    read before a concurrent write is committed isn't stored after the write
+    invalidated its tags.
+
+    The cache is per worker process: a write invalidates the responses of the
+    worker that made it, the other workers serve theirs until the TTL.
+    """
+
+    def __init__(self, backend: ResponseCacheBackend, *, routes: Iterable[str]):
+        self.backend = backend
+        self.routes = set(routes)
+
+    def key(self, request: Request, user: AuthUser) -> str | None:
+        """
+        The cache key of the request, None if its route isn't cached.
+        """
+        route = request.scope.get("route")
+        if not isinstance(route, APIRoute) or route.unique_id not in self.routes:
+            return None
+        query = urlencode(sorted(request.query_params.multi_items()))
+        return (
+            f"{route.unique_id}:{user.id}:{int(user.is_superuser)}:"
+            f"{request.url.path}?{query}"
+        )
+
+    def get(self, key: str | None, if_none_match: str | None) -> Response | None:
+        """
+        The cached response, or a 304 if it has the ETag in If-None-Match.
+        """
+        if key is None:
+            return None
+        cached = self.backend.get(key)
+        if cached is None:
+            return None
+        etag = cached.headers.get("etag")
+        if etag and etag_matches(if_none_match, etag, weak=True):
+            return not_modified(etag)
+        return Response(content=cached.body, headers=cached.headers)
+
+    def generation(self) -> int:
+        return self.backend.generation()
+
+    def set(
+        self,
+        key: str | None,
+        response: Response,
+        tags: Iterable[str],
+        generation: int,
+    ) -> None:
+        if key is None:
+            return
+        cached = CachedResponse(
+            body=bytes(response.body), headers=dict(response.headers)
+        )
+        self.backend.set(key, cached, tags=tags, generation=generation)
+
+    def invalidate(self, *tags: str) -> None:
+        self.backend.invalidate(tags)
+
+
+def item_tags(item_id: uuid.UUID, owner_id: uuid.UUID) -> list[str]:
+    return [f"item:{item_id}", f"owner:{owner_id}"]
+
+
+def items_tags(owner_id: uuid.UUID | None) -> list[str]:
+    """
+    Tags of an items list, of an owner or all the items (superusers).
+    """
+    return ["items:all"] if owner_id is None else [f"items:{owner_id}"]
+
+
+def item_write_tags(item_id: uuid.UUID | None, owner_id: uuid.UUID) -> list[str]:
+    """
+    Tags to invalidate when an item of the owner is created (no id), updated or
+    deleted.
+    """
+    tags = ["items:all", f"items:{owner_id}"]
+    if item_id is not None:
+        tags.append(f"item:{item_id}")
+    return tags
+
+
+def user_tags(user_id: uuid.UUID) -> list[str]:
+    return [f"user:{user_id}"]
+
+
+def user_delete_tags(user_id: uuid.UUID) -> list[str]:
+    """
+    Tags to invalidate when a user is deleted, with all their items.
+    """
+    return [*user_tags(user_id), f"owner:{user_id}", "items:all", f"items:{user_id}"]
+
+
+response_cache = ResponseCache(
+    MemoryResponseCache(
+        name="response",
+        maxsize=settings.RESPONSE_CACHE_SIZE,
+        max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+        ttl=settings.RESPONSE_CACHE_TTL,
+        enabled=settings.RESPONSE_CACHE_ENABLED,
+    ),
+    routes=settings.RESPONSE_CACHE_ROUTES if settings.RESPONSE_CACHE_ENABLED else [],
+)
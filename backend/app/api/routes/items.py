@@ -1,109 +1,442 @@
+import csv
+import io
 import uuid
-from typing import Any
+from collections.abc import AsyncIterator, Sequence
+from typing import Annotated, Any
 
-from fastapi import APIRouter, HTTPException
-from sqlmodel import func, select
+from fastapi import (
+    APIRouter,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+)
+from fastapi.responses import StreamingResponse
+from pydantic_core import to_json
+from sqlalchemy.orm.exc import StaleDataError
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.api.deps import CurrentUser, SessionDep
-from app.models import Item, ItemCreate, ItemPublic, ItemsPublic, ItemUpdate, Message
+from app import crud
+from app.api.conditional import (
+    check_if_match,
+    etag_matches,
+    make_etag,
+    not_modified,
+    precondition_failed,
+)
+from app.api.deps import AsyncSessionDep, CurrentAuthUser
+from app.api.response_cache import (
+    item_tags,
+    item_write_tags,
+    items_tags,
+    response_cache,
+)
+from app.api.responses import PydanticJSONResponse, rows_page_response
+from app.core.config import settings
+from app.core.db import async_engine
+from app.core.security import AuthUser
+from app.importer import import_items as import_items_file
+from app.models import (
+    CountMode,
+    Item,
+    ItemBulkResult,
+    ItemCreate,
+    ItemPublic,
+    ItemsBulkCreate,
+    ItemsBulkDelete,
+    ItemsBulkResults,
+    ItemsBulkUpdate,
+    ItemsFileFormat,
+    ItemsImportResult,
+    ItemsPublic,
+    ItemUpdate,
+    Message,
+)
+from app.utils import decode_cursor, encode_cursor, parse_fields
 
 router = APIRouter(prefix="/items", tags=["items"])
 
 
 @router.get("/", response_model=ItemsPublic)
-def read_items(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
+async def read_items(
+    session: AsyncSessionDep,
+    current_user: CurrentAuthUser,
+    request: Request,
+    skip: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1)] = 100,
+    cursor: str | None = None,
+    include_count: bool = True,
+    count_mode: CountMode = "exact",
+    fields: str | None = None,
+    if_none_match: Annotated[str | None, Header()] = None,
 ) -> Any:
     """
     Retrieve items.
+
+    Pass the `next_cursor` of a page as `cursor` to get the next one, `skip` is
+    ignored when a cursor is given. Set `include_count` to false to skip the
+    count, or use `count_mode` to cap or estimate it.
+
+    Set `fields` to a comma separated list of item fields, e.g. `id,title`, to
+    only get those.
+
+    Returns 304 when `If-None-Match` has the `ETag` of the page.
     """
+    cache_key = response_cache.key(request, current_user)
+    if cached := response_cache.get(cache_key, if_none_match):
+        return cached
+    generation = response_cache.generation()
+    field_names = parse_fields(fields, ItemPublic)
+    if not field_names:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid fields, the item fields are {', '.join(ItemPublic.model_fields)}",
+        )
+    limit = min(limit, settings.MAX_PAGE_LIMIT)
+    after_id = None
+    if cursor:
+        after_id = decode_cursor(cursor)
+        if not after_id:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    owner_filter = None
+    if not current_user.is_superuser:
+        owner_filter = col(Item.owner_id) == current_user.id
 
-    if current_user.is_superuser:
-        count_statement = select(func.count()).select_from(Item)
-        count = session.exec(count_statement).one()
-        statement = select(Item).offset(skip).limit(limit)
-        items = session.exec(statement).all()
-    else:
-        count_statement = (
-            select(func.count())
-            .select_from(Item)
-            .where(Item.owner_id == current_user.id)
+    count, count_exact = None, False
+    if include_count:
+        count, count_exact = await crud.async_count(
+            session=session, model=Item, where=owner_filter, mode=count_mode
         )
-        count = session.exec(count_statement).one()
-        statement = (
-            select(Item)
-            .where(Item.owner_id == current_user.id)
-            .offset(skip)
-            .limit(limit)
+    rows = await crud.async_read_page(
+        session=session,
+        model=Item,
+        # Only the requested columns, plus the ones for the cursor and the ETag
+        columns=list(dict.fromkeys([*field_names, "id", "version"])),
+        where=owner_filter,
+        after_id=after_id,
+        skip=skip,
+        # Fetch one more row to know if there's a next page
+        limit=limit + 1,
+    )
+    next_cursor = encode_cursor(rows[limit - 1]["id"]) if len(rows) > limit else None
+    rows = rows[:limit]
+    etag = make_etag(
+        [(row["id"], row["version"]) for row in rows],
+        count,
+        count_exact,
+        next_cursor,
+        field_names,
+    )
+    if etag_matches(if_none_match, etag, weak=True):
+        return not_modified(etag)
+
+    # Built from the rows, skipping FastAPI's validation of the response model,
+    # the database values are valid and the fields can be a subset
+    response = rows_page_response(
+        field_names,
+        rows,
+        count=count,
+        count_exact=count_exact,
+        next_cursor=next_cursor,
+        headers={"ETag": etag},
+    )
+    owner_id = None if current_user.is_superuser else current_user.id
+    response_cache.set(cache_key, response, items_tags(owner_id), generation)
+    return response
+
+
+def item_etag(id: uuid.UUID, version: int) -> str:
+    return make_etag("item", id, version)
+
+
+EXPORT_COLUMNS = ("title", "description", "id", "owner_id")
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def encode_ndjson(rows: Sequence[Sequence[Any]]) -> bytes:
+    return b"".join(
+        to_json(dict(zip(EXPORT_COLUMNS, row, strict=False))) + b"\n" for row in rows
+    )
+
+
+def encode_csv(rows: Sequence[Sequence[Any]]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
+
+
+async def export_items_rows(
+    owner_id: uuid.UUID | None, export_format: ItemsFileFormat
+) -> AsyncIterator[bytes]:
+    # The request session is closed before the response body is sent, so the
+    # rows are read with a session of their own
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        if export_format == "csv":
+            yield encode_csv([EXPORT_COLUMNS])
+        encode = encode_csv if export_format == "csv" else encode_ndjson
+        async for rows in crud.async_stream_items(
+            session=session, owner_id=owner_id, batch_size=settings.EXPORT_BATCH_SIZE
+        ):
+            yield encode(rows)
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_items(
+    current_user: CurrentAuthUser, format: ItemsFileFormat = "ndjson"
+) -> Any:
+    """
+    Export all the items, streamed as newline delimited JSON or CSV.
+    """
+    owner_id = None if current_user.is_superuser else current_user.id
+    return StreamingResponse(
+        export_items_rows(owner_id, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="items.{format}"'},
+    )
+
+
+@router.post("/import", response_model=ItemsImportResult)
+async def import_items(
+    session: AsyncSessionDep,
+    current_user: CurrentAuthUser,
+    file: UploadFile,
+    format: ItemsFileFormat = "ndjson",
+) -> Any:
+    """
+    Import items from an NDJSON or CSV file, in the format of the export.
+
+    Valid rows are imported, the others are reported by line number.
+    """
+    text_file = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    try:
+        return await import_items_file(
+            session=session,
+            owner_id=current_user.id,
+            file=text_file,
+            file_format=format,
         )
-        items = session.exec(statement).all()
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="The file is not valid UTF-8")
+    finally:
+        # Don't close the upload file with the wrapper
+        text_file.detach()
+        # Chunks are committed as they are imported, even if a later one fails
+        response_cache.invalidate(*item_write_tags(None, current_user.id))
+
 
-    return ItemsPublic(data=items, count=count)
+def check_bulk_size(size: int) -> None:
+    if size > settings.MAX_BULK_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many items, the maximum is {settings.MAX_BULK_ITEMS}",
+        )
+
+
+async def get_bulk_errors(
+    *, session: AsyncSession, current_user: AuthUser, ids: list[uuid.UUID]
+) -> dict[uuid.UUID, ItemBulkResult]:
+    """
+    Check that the items exist and belong to the user with a single query.
+    """
+    statement = select(Item.id, Item.owner_id).where(col(Item.id).in_(ids))
+    owners = dict((await session.exec(statement)).all())
+    errors = {}
+    for id in ids:
+        if id not in owners:
+            errors[id] = ItemBulkResult(id=id, status_code=404, detail="Item not found")
+        elif not current_user.is_superuser and owners[id] != current_user.id:
+            errors[id] = ItemBulkResult(
+                id=id, status_code=400, detail="Not enough permissions"
+            )
+    return errors
+
+
+@router.post("/bulk", response_model=ItemsBulkResults)
+async def create_items(
+    *, session: AsyncSessionDep, current_user: CurrentAuthUser, body: ItemsBulkCreate
+) -> Any:
+    """
+    Create new items in a single transaction.
+    """
+    check_bulk_size(len(body.data))
+    items = await crud.async_create_items(
+        session=session, items_in=body.data, owner_id=current_user.id
+    )
+    response_cache.invalidate(*item_write_tags(None, current_user.id))
+    return ItemsBulkResults(
+        data=[ItemBulkResult(id=item.id, status_code=200, item=item) for item in items]
+    )
+
+
+@router.put("/bulk", response_model=ItemsBulkResults)
+async def update_items(
+    *, session: AsyncSessionDep, current_user: CurrentAuthUser, body: ItemsBulkUpdate
+) -> Any:
+    """
+    Update items in a single transaction, items the user can't update are skipped.
+    """
+    check_bulk_size(len(body.data))
+    ids = [item_in.id for item_in in body.data]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Duplicate item ids")
+    errors = await get_bulk_errors(session=session, current_user=current_user, ids=ids)
+    items_in = [item_in for item_in in body.data if item_in.id not in errors]
+    updated = {}
+    if items_in:
+        items = await crud.async_update_items(session=session, items_in=items_in)
+        updated = {item.id: item for item in items}
+        for item in items:
+            response_cache.invalidate(*item_write_tags(item.id, item.owner_id))
+    results = []
+    for id in ids:
+        if id in errors:
+            results.append(errors[id])
+        elif id in updated:
+            results.append(ItemBulkResult(id=id, status_code=200, item=updated[id]))
+        else:
+            # Deleted after the permissions check
+            results.append(
+                ItemBulkResult(id=id, status_code=404, detail="Item not found")
+            )
+    return ItemsBulkResults(data=results)
+
+
+@router.delete("/bulk", response_model=ItemsBulkResults)
+async def delete_items(
+    *, session: AsyncSessionDep, current_user: CurrentAuthUser, body: ItemsBulkDelete
+) -> Any:
+    """
+    Delete items in a single transaction, items the user can't delete are skipped.
+    """
+    check_bulk_size(len(body.ids))
+    ids = list(dict.fromkeys(body.ids))
+    errors = await get_bulk_errors(session=session, current_user=current_user, ids=ids)
+    allowed_ids = [id for id in ids if id not in errors]
+    deleted_owners = {}
+    if allowed_ids:
+        deleted_owners = await crud.async_delete_items(session=session, ids=allowed_ids)
+        for id, owner_id in deleted_owners.items():
+            response_cache.invalidate(*item_write_tags(id, owner_id))
+    results = []
+    for id in ids:
+        if id in errors:
+            results.append(errors[id])
+        elif id in deleted_owners:
+            results.append(ItemBulkResult(id=id, status_code=200))
+        else:
+            results.append(
+                ItemBulkResult(id=id, status_code=404, detail="Item not found")
+            )
+    return ItemsBulkResults(data=results)
 
 
 @router.get("/{id}", response_model=ItemPublic)
-def read_item(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) -> Any:
+async def read_item(
+    session: AsyncSessionDep,
+    current_user: CurrentAuthUser,
+    id: uuid.UUID,
+    request: Request,
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> Any:
     """
     Get item by ID.
+
+    Returns 304 when `If-None-Match` has the `ETag` of the item.
     """
-    item = session.get(Item, id)
-    if not item:
+    cache_key = response_cache.key(request, current_user)
+    if cached := response_cache.get(cache_key, if_none_match):
+        return cached
+    generation = response_cache.generation()
+    row = await crud.async_read_by_id(
+        session=session,
+        model=Item,
+        columns=[*ItemPublic.model_fields, "version"],
+        id=id,
+    )
+    if not row:
         raise HTTPException(status_code=404, detail="Item not found")
-    if not current_user.is_superuser and (item.owner_id != current_user.id):
+    if not current_user.is_superuser and (row["owner_id"] != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
-    return item
+    etag = item_etag(row["id"], row["version"])
+    if etag_matches(if_none_match, etag, weak=True):
+        return not_modified(etag)
+    response = PydanticJSONResponse(
+        ItemPublic.model_validate(row), headers={"ETag": etag}
+    )
+    response_cache.set(
+        cache_key, response, item_tags(row["id"], row["owner_id"]), generation
+    )
+    return response
 
 
 @router.post("/", response_model=ItemPublic)
-def create_item(
-    *, session: SessionDep, current_user: CurrentUser, item_in: ItemCreate
+async def create_item(
+    *, session: AsyncSessionDep, current_user: CurrentAuthUser, item_in: ItemCreate
 ) -> Any:
     """
     Create new item.
     """
-    item = Item.model_validate(item_in, update={"owner_id": current_user.id})
-    session.add(item)
-    session.commit()
-    session.refresh(item)
+    item = await crud.async_create_item(
+        session=session, item_in=item_in, owner_id=current_user.id
+    )
+    response_cache.invalidate(*item_write_tags(None, current_user.id))
     return item
 
 
 @router.put("/{id}", response_model=ItemPublic)
-def update_item(
+async def update_item(
     *,
-    session: SessionDep,
-    current_user: CurrentUser,
+    session: AsyncSessionDep,
+    current_user: CurrentAuthUser,
     id: uuid.UUID,
     item_in: ItemUpdate,
+    response: Response,
+    if_match: Annotated[str | None, Header()] = None,
 ) -> Any:
     """
     Update an item.
+
+    With `If-Match`, the item is only updated if it still has that `ETag`,
+    otherwise 412 is returned.
     """
-    item = session.get(Item, id)
+    item = await session.get(Item, id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     if not current_user.is_superuser and (item.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
+    check_if_match(if_match, item_etag(item.id, item.version))
     update_dict = item_in.model_dump(exclude_unset=True)
     item.sqlmodel_update(update_dict)
     session.add(item)
-    session.commit()
-    session.refresh(item)
+    try:
+        await session.commit()
+    except StaleDataError:
+        # Updated by another request after it was read
+        if if_match is None:
+            raise
+        raise precondition_failed()
+    response_cache.invalidate(*item_write_tags(item.id, item.owner_id))
+    await session.refresh(item)
+    response.headers["ETag"] = item_etag(item.id, item.version)
     return item
 
 
 @router.delete("/{id}")
-def delete_item(
-    session: SessionDep, current_user: CurrentUser, id: uuid.UUID
+async def delete_item(
+    session: AsyncSessionDep, current_user: CurrentAuthUser, id: uuid.UUID
 ) -> Message:
     """
     Delete an item.
     """
-    item = session.get(Item, id)
+    item = await session.get(Item, id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     if not current_user.is_superuser and (item.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
-    session.delete(item)
-    session.commit()
+    await session.delete(item)
+    await session.commit()
+    response_cache.invalidate(*item_write_tags(item.id, item.owner_id))
     return Message(message="Item deleted successfully")
@@ -0,0 +1,28 @@
+import secrets
+from typing import Annotated
+
+from fastapi import APIRouter, Header, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.db import async_engine, engine
+from app.core.metrics import generate_metrics, update_runtime_gauges
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(authorization: Annotated[str | None, Header()] = None) -> Response:
+    """
+    Prometheus metrics of all the worker processes.
+    """
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if settings.METRICS_TOKEN and not secrets.compare_digest(
+        (authorization or "").encode(), f"Bearer {settings.METRICS_TOKEN}".encode()
+    ):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    update_runtime_gauges({"sync": engine.pool, "async": async_engine.pool})
+    # Reads the files of every worker in multiprocess mode
+    content, media_type = await run_in_threadpool(generate_metrics)
+    return Response(content=content, media_type=media_type)
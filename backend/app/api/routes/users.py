@@ -1,19 +1,41 @@
 import uuid
-from typing import Any
+from typing import Annotated, Any
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import col, delete, func, select
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+)
+from sqlalchemy.orm.exc import StaleDataError
 
 from app import crud
+from app.api.conditional import (
+    check_if_match,
+    etag_matches,
+    make_etag,
+    not_modified,
+    precondition_failed,
+)
 from app.api.deps import (
+    AsyncSessionDep,
+    CurrentAuthUser,
     CurrentUser,
-    SessionDep,
     get_current_active_superuser,
 )
+from app.api.response_cache import response_cache, user_delete_tags, user_tags
+from app.api.responses import PydanticJSONResponse, rows_page_response
 from app.core.config import settings
-from app.core.security import get_password_hash, verify_password
+from app.core.security import (
+    async_get_password_hash,
+    async_verify_password,
+    auth_user_cache,
+)
 from app.models import (
-    Item,
+    CountMode,
     Message,
     UpdatePassword,
     User,
@@ -24,45 +46,101 @@ from app.models import (
     UserUpdate,
     UserUpdateMe,
 )
-from app.utils import generate_new_account_email, send_email
+from app.utils import (
+    decode_cursor,
+    encode_cursor,
+    generate_new_account_email,
+    parse_fields,
+    send_email,
+)
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
+def user_etag(user: User) -> str:
+    return make_etag("user", user.id, user.version)
+
+
 @router.get(
     "/",
     dependencies=[Depends(get_current_active_superuser)],
     response_model=UsersPublic,
 )
-def read_users(session: SessionDep, skip: int = 0, limit: int = 100) -> Any:
+async def read_users(
+    session: AsyncSessionDep,
+    skip: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1)] = 100,
+    cursor: str | None = None,
+    include_count: bool = True,
+    count_mode: CountMode = "exact",
+    fields: str | None = None,
+) -> Any:
     """
     Retrieve users.
-    """
 
-    count_statement = select(func.count()).select_from(User)
-    count = session.exec(count_statement).one()
+    Pass the `next_cursor` of a page as `cursor` to get the next one, `skip` is
+    ignored when a cursor is given. Set `include_count` to false to skip the
+    count, or use `count_mode` to cap or estimate it.
 
-    statement = select(User).offset(skip).limit(limit)
-    users = session.exec(statement).all()
+    Set `fields` to a comma separated list of user fields, e.g. `id,email`, to
+    only get those.
+    """
+    field_names = parse_fields(fields, UserPublic)
+    if not field_names:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid fields, the user fields are {', '.join(UserPublic.model_fields)}",
+        )
+    limit = min(limit, settings.MAX_PAGE_LIMIT)
+    count, count_exact = None, False
+    if include_count:
+        count, count_exact = await crud.async_count(
+            session=session, model=User, mode=count_mode
+        )
+
+    after_id = None
+    if cursor:
+        after_id = decode_cursor(cursor)
+        if not after_id:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    rows = await crud.async_read_page(
+        session=session,
+        model=User,
+        # Only the requested columns, plus the id for the cursor
+        columns=list(dict.fromkeys([*field_names, "id"])),
+        after_id=after_id,
+        skip=skip,
+        # Fetch one more row to know if there's a next page
+        limit=limit + 1,
+    )
+    next_cursor = encode_cursor(rows[limit - 1]["id"]) if len(rows) > limit else None
 
-    return UsersPublic(data=users, count=count)
+    # Built from the rows, skipping FastAPI's validation of the response model,
+    # the database values are valid and the fields can be a subset
+    return rows_page_response(
+        field_names,
+        rows[:limit],
+        count=count,
+        count_exact=count_exact,
+        next_cursor=next_cursor,
+    )
 
 
 @router.post(
     "/", dependencies=[Depends(get_current_active_superuser)], response_model=UserPublic
 )
-def create_user(*, session: SessionDep, user_in: UserCreate) -> Any:
+async def create_user(*, session: AsyncSessionDep, user_in: UserCreate) -> Any:
     """
     Create new user.
     """
-    user = crud.get_user_by_email(session=session, email=user_in.email)
+    user = await crud.async_get_user_by_email(session=session, email=user_in.email)
     if user:
         raise HTTPException(
             status_code=400,
             detail="The user with this email already exists in the system.",
         )
 
-    user = crud.create_user(session=session, user_create=user_in)
+    user = await crud.async_create_user(session=session, user_create=user_in)
     if settings.emails_enabled and user_in.email:
         email_data = generate_new_account_email(
             email_to=user_in.email, username=user_in.email, password=user_in.password
@@ -76,15 +154,17 @@ def create_user(*, session: SessionDep, user_in: UserCreate) -> Any:
 
 
 @router.patch("/me", response_model=UserPublic)
-def update_user_me(
-    *, session: SessionDep, user_in: UserUpdateMe, current_user: CurrentUser
+async def update_user_me(
+    *, session: AsyncSessionDep, user_in: UserUpdateMe, current_user: CurrentUser
 ) -> Any:
     """
     Update own user.
     """
 
     if user_in.email:
-        existing_user = crud.get_user_by_email(session=session, email=user_in.email)
+        existing_user = await crud.async_get_user_by_email(
+            session=session, email=user_in.email
+        )
         if existing_user and existing_user.id != current_user.id:
             raise HTTPException(
                 status_code=409, detail="User with this email already exists"
@@ -92,41 +172,56 @@ def update_user_me(
     user_data = user_in.model_dump(exclude_unset=True)
     current_user.sqlmodel_update(user_data)
     session.add(current_user)
-    session.commit()
-    session.refresh(current_user)
+    await session.commit()
+    await session.refresh(current_user)
+    auth_user_cache.delete(current_user.id)
+    response_cache.invalidate(*user_tags(current_user.id))
     return current_user
 
 
 @router.patch("/me/password", response_model=Message)
-def update_password_me(
-    *, session: SessionDep, body: UpdatePassword, current_user: CurrentUser
+async def update_password_me(
+    *, session: AsyncSessionDep, body: UpdatePassword, current_user: CurrentUser
 ) -> Any:
     """
     Update own password.
     """
-    if not verify_password(body.current_password, current_user.hashed_password):
+    if not await async_verify_password(
+        body.current_password, current_user.hashed_password
+    ):
         raise HTTPException(status_code=400, detail="Incorrect password")
     if body.current_password == body.new_password:
         raise HTTPException(
             status_code=400, detail="New password cannot be the same as the current one"
         )
-    hashed_password = get_password_hash(body.new_password)
+    hashed_password = await async_get_password_hash(body.new_password)
     current_user.hashed_password = hashed_password
     session.add(current_user)
-    session.commit()
+    await session.commit()
+    auth_user_cache.delete(current_user.id)
     return Message(message="Password updated successfully")
 
 
 @router.get("/me", response_model=UserPublic)
-def read_user_me(current_user: CurrentUser) -> Any:
+async def read_user_me(
+    current_user: CurrentUser,
+    response: Response,
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> Any:
     """
     Get current user.
+
+    Returns 304 when `If-None-Match` has the `ETag` of the user.
     """
+    etag = user_etag(current_user)
+    if etag_matches(if_none_match, etag, weak=True):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return current_user
 
 
 @router.delete("/me", response_model=Message)
-def delete_user_me(session: SessionDep, current_user: CurrentUser) -> Any:
+async def delete_user_me(session: AsyncSessionDep, current_user: CurrentUser) -> Any:
     """
     Delete own user.
     """
@@ -134,43 +229,56 @@ def delete_user_me(session: SessionDep, current_user: CurrentUser) -> Any:
         raise HTTPException(
             status_code=403, detail="Super users are not allowed to delete themselves"
         )
-    session.delete(current_user)
-    session.commit()
+    await session.delete(current_user)
+    await session.commit()
+    auth_user_cache.delete(current_user.id)
+    response_cache.invalidate(*user_delete_tags(current_user.id))
     return Message(message="User deleted successfully")
 
 
 @router.post("/signup", response_model=UserPublic)
-def register_user(session: SessionDep, user_in: UserRegister) -> Any:
+async def register_user(session: AsyncSessionDep, user_in: UserRegister) -> Any:
     """
     Create new user without the need to be logged in.
     """
-    user = crud.get_user_by_email(session=session, email=user_in.email)
+    user = await crud.async_get_user_by_email(session=session, email=user_in.email)
     if user:
         raise HTTPException(
             status_code=400,
             detail="The user with this email already exists in the system",
         )
     user_create = UserCreate.model_validate(user_in)
-    user = crud.create_user(session=session, user_create=user_create)
+    user = await crud.async_create_user(session=session, user_create=user_create)
     return user
 
 
 @router.get("/{user_id}", response_model=UserPublic)
-def read_user_by_id(
-    user_id: uuid.UUID, session: SessionDep, current_user: CurrentUser
+async def read_user_by_id(
+    user_id: uuid.UUID,
+    session: AsyncSessionDep,
+    current_user: CurrentAuthUser,
+    request: Request,
 ) -> Any:
     """
     Get a specific user by id.
     """
-    user = session.get(User, user_id)
-    if user == current_user:
-        return user
-    if not current_user.is_superuser:
+    cache_key = response_cache.key(request, current_user)
+    if cached := response_cache.get(cache_key, None):
+        return cached
+    generation = response_cache.generation()
+    row = await crud.async_read_by_id(
+        session=session, model=User, columns=list(UserPublic.model_fields), id=user_id
+    )
+    if not (row and row["id"] == current_user.id) and not current_user.is_superuser:
         raise HTTPException(
             status_code=403,
             detail="The user doesn't have enough privileges",
         )
-    return user
+    if not row:
+        return None
+    response = PydanticJSONResponse(UserPublic.model_validate(row))
+    response_cache.set(cache_key, response, user_tags(row["id"]), generation)
+    return response
 
 
 @router.patch(
@@ -178,49 +286,65 @@ def read_user_by_id(
     dependencies=[Depends(get_current_active_superuser)],
     response_model=UserPublic,
 )
-def update_user(
+async def update_user(
     *,
-    session: SessionDep,
+    session: AsyncSessionDep,
     user_id: uuid.UUID,
     user_in: UserUpdate,
+    response: Response,
+    if_match: Annotated[str | None, Header()] = None,
 ) -> Any:
     """
     Update a user.
+
+    With `If-Match`, the user is only updated if it still has that `ETag`,
+    otherwise 412 is returned.
     """
 
-    db_user = session.get(User, user_id)
+    db_user = await session.get(User, user_id)
     if not db_user:
         raise HTTPException(
             status_code=404,
             detail="The user with this id does not exist in the system",
         )
+    check_if_match(if_match, user_etag(db_user))
     if user_in.email:
-        existing_user = crud.get_user_by_email(session=session, email=user_in.email)
+        existing_user = await crud.async_get_user_by_email(
+            session=session, email=user_in.email
+        )
         if existing_user and existing_user.id != user_id:
             raise HTTPException(
                 status_code=409, detail="User with this email already exists"
             )
 
-    db_user = crud.update_user(session=session, db_user=db_user, user_in=user_in)
+    try:
+        await crud.async_update_user(session=session, db_user=db_user, user_in=user_in)
+    except StaleDataError:
+        # Updated by another request after it was read
+        if if_match is None:
+            raise
+        raise precondition_failed()
+    response_cache.invalidate(*user_tags(user_id))
+    response.headers["ETag"] = user_etag(db_user)
     return db_user
 
 
 @router.delete("/{user_id}", dependencies=[Depends(get_current_active_superuser)])
-def delete_user(
-    session: SessionDep, current_user: CurrentUser, user_id: uuid.UUID
+async def delete_user(
+    session: AsyncSessionDep, current_user: CurrentAuthUser, user_id: uuid.UUID
 ) -> Message:
     """
     Delete a user.
     """
-    user = session.get(User, user_id)
+    user = await session.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    if user == current_user:
+    if user.id == current_user.id:
         raise HTTPException(
             status_code=403, detail="Super users are not allowed to delete themselves"
         )
-    statement = delete(Item).where(col(Item.owner_id) == user_id)
-    session.exec(statement)  # type: ignore
-    session.delete(user)
-    session.commit()
+    await session.delete(user)
+    await session.commit()
+    auth_user_cache.delete(user_id)
+    response_cache.invalidate(*user_delete_tags(user_id))
     return Message(message="User deleted successfully")
@@ -1,8 +1,21 @@
+from typing import Any
+
 from fastapi import APIRouter, Depends
 from pydantic.networks import EmailStr
 
 from app.api.deps import get_current_active_superuser
-from app.models import Message
+from app.api.response_cache import response_cache
+from app.core.db import async_engine, engine
+from app.core.mailer import mailer
+from app.core.pool import get_pool_status
+from app.core.security import auth_user_cache, password_hash_executor, token_cache
+from app.models import (
+    CacheStatus,
+    MailerStatus,
+    Message,
+    PasswordHashStatus,
+    PoolStatus,
+)
 from app.utils import generate_test_email, send_email
 
 router = APIRouter(prefix="/utils", tags=["utils"])
@@ -29,3 +42,58 @@ def test_email(email_to: EmailStr) -> Message:
 @router.get("/health-check/")
 async def health_check() -> bool:
     return True
+
+
+@router.get(
+    "/db-pool-stats/",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=list[PoolStatus],
+)
+def db_pool_stats() -> Any:
+    """
+    Connection pool statistics of the worker process serving the request.
+    """
+    return [
+        get_pool_status("sync", engine.pool),
+        get_pool_status("async", async_engine.pool),
+    ]
+
+
+@router.get(
+    "/password-hash-stats/",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=PasswordHashStatus,
+)
+def password_hash_stats() -> Any:
+    """
+    Password hashing executor statistics of the worker process serving the request.
+    """
+    return password_hash_executor.status()
+
+
+@router.get(
+    "/mail-stats/",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=MailerStatus,
+)
+def mail_stats() -> Any:
+    """
+    Email queue statistics of the worker process serving the request.
+    """
+    return mailer.status()
+
+
+@router.get(
+    "/cache-stats/",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=list[CacheStatus],
+)
+def cache_stats() -> Any:
+    """
+    In-process cache statistics of the worker process serving the request.
+    """
+    return [
+        auth_user_cache.status(),
+        token_cache.status(),
+        response_cache.backend.status(),
+    ]
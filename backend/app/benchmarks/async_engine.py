@@ -0,0 +1,117 @@
+"""
+Compare the sync (thread pool) and async database paths at high concurrency.
+
+Both variants run the same list query and return the same response model, the
+only difference is a `def` route using SessionDep vs an `async def` route using
+AsyncSessionDep.
+
+Run it against a local database (with migrations applied):
+
+    python -m app.benchmarks.async_engine --concurrency 10 100 400
+"""
+
+import argparse
+import asyncio
+import json
+from typing import Any
+
+import httpx
+from fastapi import FastAPI
+from sqlmodel import Session, func, select
+
+from app.api.deps import AsyncSessionDep, SessionDep
+from app.benchmarks.utils import print_table, run_load, serve
+from app.core.config import settings
+from app.core.db import engine, init_db
+from app.models import Item, ItemsPublic, User
+
+bench_app = FastAPI()
+
+
+@bench_app.get("/sync/items", response_model=ItemsPublic)
+def read_items_sync(session: SessionDep, limit: int = 100, sleep: float = 0) -> Any:
+    if sleep:
+        session.exec(select(func.pg_sleep(sleep)))
+    items = session.exec(select(Item).limit(limit)).all()
+    return ItemsPublic(data=items, count=len(items))
+
+
+@bench_app.get("/async/items", response_model=ItemsPublic)
+async def read_items_async(
+    session: AsyncSessionDep, limit: int = 100, sleep: float = 0
+) -> Any:
+    if sleep:
+        await session.exec(select(func.pg_sleep(sleep)))
+    items = (await session.exec(select(Item).limit(limit))).all()
+    return ItemsPublic(data=items, count=len(items))
+
+
+def seed_items(count: int) -> None:
+    with Session(engine) as session:
+        init_db(session)
+        owner = session.exec(
+            select(User).where(User.email == settings.FIRST_SUPERUSER)
+        ).one()
+        existing = session.exec(select(func.count()).select_from(Item)).one()
+        for i in range(existing, count):
+            session.add(Item(title=f"bench item {i}", owner_id=owner.id))
+        session.commit()
+
+
+async def run(
+    base_url: str, concurrency_levels: list[int], requests: int, params: dict[str, Any]
+) -> list[dict[str, Any]]:
+    results = []
+    limits = httpx.Limits(max_connections=max(concurrency_levels))
+    async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+        for concurrency in concurrency_levels:
+            for variant in ("sync", "async"):
+                url = f"/{variant}/items"
+                # Warm up the pools before measuring
+                await run_load(
+                    client,
+                    variant,
+                    "GET",
+                    url,
+                    concurrency=concurrency,
+                    total_requests=concurrency,
+                    params=params,
+                )
+                result = await run_load(
+                    client,
+                    variant,
+                    "GET",
+                    url,
+                    concurrency=concurrency,
+                    total_requests=requests,
+                    params=params,
+                )
+                results.append(result.summary())
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 100, 400])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--items", type=int, default=1000, help="rows to seed")
+    parser.add_argument(
+        "--sleep", type=float, default=0, help="extra pg_sleep() seconds per request"
+    )
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", action="store_true", help="print JSON results")
+    args = parser.parse_args()
+
+    seed_items(args.items)
+    params = {"limit": args.limit, "sleep": args.sleep}
+    with serve(bench_app, port=args.port) as base_url:
+        results = asyncio.run(run(base_url, args.concurrency, args.requests, params))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    main()
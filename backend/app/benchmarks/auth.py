@@ -0,0 +1,66 @@
+"""
+Time the get_current_auth_user dependency with and without the token cache.
+
+The auth user cache is filled first, so no query runs and the numbers only show
+the token verification cost. No database is needed:
+
+    python -m app.benchmarks.auth --iterations 100000
+"""
+
+import argparse
+import asyncio
+import json
+import uuid
+from datetime import timedelta
+from typing import Any
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api.deps import get_current_auth_user
+from app.benchmarks.utils import print_table, time_calls
+from app.core.db import async_engine
+from app.core.security import (
+    AuthUser,
+    auth_user_cache,
+    create_access_token,
+    token_cache,
+)
+
+
+async def run(iterations: int) -> list[dict[str, Any]]:
+    user_id = uuid.uuid4()
+    auth_user_cache.enabled = True
+    auth_user_cache.set(
+        user_id, AuthUser(id=user_id, is_active=True, is_superuser=False)
+    )
+    token = create_access_token(user_id, expires_delta=timedelta(hours=1))
+    results = []
+    # The session is never used, the auth user is always found in the cache
+    async with AsyncSession(async_engine) as session:
+        for name, enabled in (("no token cache", False), ("token cache", True)):
+            token_cache.enabled = enabled
+            token_cache.clear()
+            result = await time_calls(
+                name,
+                lambda: get_current_auth_user(session, token),
+                iterations=iterations,
+            )
+            results.append(result.summary())
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=100_000)
+    parser.add_argument("--json", action="store_true", help="print JSON results")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.iterations))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    main()
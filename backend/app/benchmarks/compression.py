@@ -0,0 +1,85 @@
+"""
+Compare the CPU cost and the bytes saved of each response encoding and level.
+
+The payloads are ItemsPublic pages rendered like the API does, no database is
+needed:
+
+    python -m app.benchmarks.compression --items 100 1000 --iterations 50
+"""
+
+import argparse
+import json
+import time
+import uuid
+from typing import Any
+
+from app.api.responses import PydanticJSONResponse
+from app.benchmarks.utils import print_table
+from app.core.compression import compress
+from app.models import ItemPublic, ItemsPublic
+
+LEVELS = {"gzip": [1, 6, 9], "br": [1, 4, 6, 11], "zstd": [1, 3, 9, 19]}
+
+
+def items_page(count: int) -> bytes:
+    owner_id = uuid.uuid4()
+    page = ItemsPublic(
+        data=[
+            ItemPublic(
+                id=uuid.uuid4(),
+                owner_id=owner_id,
+                title=f"Item {i}",
+                description=f"Description of item {i}, with a few more words",
+            )
+            for i in range(count)
+        ],
+        count=count,
+        count_exact=True,
+        next_cursor=None,
+    )
+    return PydanticJSONResponse(page).body
+
+
+def run(items: list[int], iterations: int) -> list[dict[str, Any]]:
+    results = []
+    for count in items:
+        payload = items_page(count)
+        for encoding, levels in LEVELS.items():
+            for level in levels:
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    compressed = compress(payload, encoding, level)
+                elapsed = (time.perf_counter() - start) / iterations
+                results.append(
+                    {
+                        "items": count,
+                        "encoding": encoding,
+                        "level": level,
+                        "bytes": len(payload),
+                        "compressed": len(compressed),
+                        "saved_pct": round(
+                            100 * (1 - len(compressed) / len(payload)), 1
+                        ),
+                        "ms": round(elapsed * 1000, 3),
+                        "mb_per_s": round(len(payload) / elapsed / 1e6, 1),
+                    }
+                )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--json", action="store_true", help="print JSON results")
+    args = parser.parse_args()
+
+    results = run(args.items, args.iterations)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    main()
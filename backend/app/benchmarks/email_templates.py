@@ -0,0 +1,110 @@
+"""
+Compare the throughput of generate_reset_password_email with and without the
+compiled email templates.
+
+inline builds a jinja2.Template from the file for each email, the way
+render_email_template did. cached uses the shared environment, compiled once.
+The first email of a new process is also timed, with an empty and with a warm
+bytecode cache. No database is needed:
+
+    python -m app.benchmarks.email_templates --emails 2000
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from collections.abc import Callable
+from typing import Any
+from unittest.mock import patch
+
+from jinja2 import Template
+
+from app import utils
+from app.benchmarks.utils import print_table
+from app.utils import create_email_environment, generate_reset_password_email
+
+
+def render_inline(*, template_name: str, context: dict[str, Any]) -> str:
+    template_str = (utils.EMAIL_TEMPLATES_DIR / template_name).read_text()
+    return Template(template_str).render(context)
+
+
+def generate(i: int) -> str:
+    return generate_reset_password_email(
+        email_to=f"user{i}@example.com", email=f"user{i}@example.com", token="token"
+    ).html_content
+
+
+def throughput(render: Callable[..., str], emails: int) -> float:
+    """
+    Emails generated per second with render as render_email_template.
+    """
+    with patch("app.utils.render_email_template", render):
+        generate(0)
+        start = time.perf_counter()
+        for i in range(emails):
+            generate(i)
+        return emails / (time.perf_counter() - start)
+
+
+def first_email_ms(cache_dir: str) -> float:
+    """
+    Time of the first email generated by a new environment, like in a new worker.
+    """
+    environment = create_email_environment(auto_reload=False, cache_dir=cache_dir)
+
+    def render(*, template_name: str, context: dict[str, Any]) -> str:
+        return environment.get_template(template_name).render(context)
+
+    with patch("app.utils.render_email_template", render):
+        start = time.perf_counter()
+        generate(0)
+        return (time.perf_counter() - start) * 1000
+
+
+def run(emails: int) -> list[dict[str, Any]]:
+    inline = throughput(render_inline, emails)
+    cached = throughput(utils.render_email_template, emails)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cold_ms = first_email_ms(cache_dir)
+        bytecode_ms = first_email_ms(cache_dir)
+    return [
+        {
+            "case": "inline",
+            "emails_per_s": round(inline),
+            "ms": round(1000 / inline, 3),
+        },
+        {
+            "case": "cached",
+            "emails_per_s": round(cached),
+            "ms": round(1000 / cached, 3),
+        },
+        {
+            "case": "first email, empty bytecode cache",
+            "emails_per_s": None,
+            "ms": round(cold_ms, 3),
+        },
+        {
+            "case": "first email, warm bytecode cache",
+            "emails_per_s": None,
+            "ms": round(bytecode_ms, 3),
+        },
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--emails", type=int, default=2000)
+    parser.add_argument("--json", action="store_true", help="print JSON results")
+    args = parser.parse_args()
+
+    results = run(args.emails)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    main()
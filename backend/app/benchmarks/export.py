@@ -0,0 +1,141 @@
+"""
+Measure the throughput and memory use of the items export.
+
+A benchmark user is given the number of items to export (added with a single
+INSERT ... SELECT, kept between runs unless --cleanup is passed), then its items
+are exported through the real app served by uvicorn:
+
+    python -m app.benchmarks.export --rows 1000000 --format ndjson csv
+
+Run it against a local database (with migrations applied).
+"""
+
+import argparse
+import asyncio
+import json
+import resource
+import time
+import uuid
+from typing import Any
+
+import httpx
+from sqlmodel import Session, delete, func, select, text
+
+from app import crud
+from app.benchmarks.utils import print_table, serve
+from app.core.config import settings
+from app.core.db import engine
+from app.main import app
+from app.models import Item, User, UserCreate
+
+BENCH_EMAIL = "export-bench@example.com"
+BENCH_PASSWORD = "export-bench-password"
+
+
+def seed_items(rows: int) -> uuid.UUID:
+    with Session(engine) as session:
+        user = crud.get_user_by_email(session=session, email=BENCH_EMAIL)
+        if not user:
+            user = crud.create_user(
+                session=session,
+                user_create=UserCreate(email=BENCH_EMAIL, password=BENCH_PASSWORD),
+            )
+        existing = session.exec(
+            select(func.count()).select_from(Item).where(Item.owner_id == user.id)
+        ).one()
+        if existing < rows:
+            session.connection().execute(
+                text(
+                    "INSERT INTO item (id, title, description, owner_id) "
+                    "SELECT gen_random_uuid(), 'Export item ' || i, "
+                    "'Description of export item ' || i, :owner_id "
+                    "FROM generate_series(1, :count) AS i"
+                ).bindparams(owner_id=user.id, count=rows - existing)
+            )
+            session.commit()
+            session.connection().execute(text("ANALYZE item"))
+        return user.id
+
+
+def cleanup(user_id: uuid.UUID) -> None:
+    with Session(engine) as session:
+        session.exec(delete(Item).where(Item.owner_id == user_id))  # type: ignore
+        session.exec(delete(User).where(User.id == user_id))  # type: ignore
+        session.commit()
+        # Don't leave the statistics of the seeded rows to the planner
+        session.connection().execute(text("ANALYZE item"))
+        session.commit()
+
+
+def max_rss_mb() -> float:
+    # Kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run(base_url: str, formats: list[str]) -> list[dict[str, Any]]:
+    results = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        r = await client.post(
+            f"{settings.API_V1_STR}/login/access-token",
+            data={"username": BENCH_EMAIL, "password": BENCH_PASSWORD},
+        )
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        for export_format in formats:
+            rss_before = max_rss_mb()
+            start = time.perf_counter()
+            first_byte = 0.0
+            size = lines = 0
+            async with client.stream(
+                "GET",
+                f"{settings.API_V1_STR}/items/export",
+                headers=headers,
+                params={"format": export_format},
+            ) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes():
+                    if not first_byte:
+                        first_byte = time.perf_counter() - start
+                    size += len(chunk)
+                    lines += chunk.count(b"\n")
+            duration = time.perf_counter() - start
+            rows = lines - 1 if export_format == "csv" else lines
+            results.append(
+                {
+                    "format": export_format,
+                    "rows": rows,
+                    "seconds": round(duration, 2),
+                    "rows_per_s": round(rows / duration),
+                    "mb_per_s": round(size / duration / 2**20, 1),
+                    "first_byte_ms": round(first_byte * 1000, 1),
+                    "max_rss_growth_mb": round(max_rss_mb() - rss_before, 1),
+                }
+            )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument(
+        "--format", nargs="+", choices=["ndjson", "csv"], default=["ndjson", "csv"]
+    )
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cleanup", action="store_true", help="delete the rows after")
+    parser.add_argument("--json", action="store_true", help="print JSON results")
+    args = parser.parse_args()
+
+    user_id = seed_items(args.rows)
+    try:
+        with serve(app, port=args.port) as base_url:
+            results = asyncio.run(run(base_url, args.format))
+    finally:
+        if args.cleanup:
+            cleanup(user_id)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    main()
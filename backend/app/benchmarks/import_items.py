@@ -0,0 +1,117 @@
+"""
+Measure the throughput of the items import.
+
+A file with the given number of rows is generated in a temporary directory,
+then imported for a benchmark user with the same code as the import endpoint
+and CLI (the items are kept between runs unless --cleanup is passed):
+
+    python -m app.benchmarks.import_items --rows 1000000 --format ndjson csv
+
+Run it against a local database (with migrations applied).
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Any
+
+from sqlmodel import Session, delete, text
+
+from app import crud
+from app.benchmarks.utils import print_table
+from app.core.db import engine
+from app.importer import import_file
+from app.models import Item, User, UserCreate
+
+BENCH_EMAIL = "import-bench@example.com"
+
+
+def get_bench_user_id() -> uuid.UUID:
+    with Session(engine) as session:
+        user = crud.get_user_by_email(session=session, email=BENCH_EMAIL)
+        if not user:
+            user = crud.create_user(
+                session=session,
+                user_create=UserCreate(email=BENCH_EMAIL, password=uuid.uuid4().hex),
+            )
+        return user.id
+
+
+def cleanup(user_id: uuid.UUID) -> None:
+    with Session(engine) as session:
+        session.exec(delete(Item).where(Item.owner_id == user_id))  # type: ignore
+        session.exec(delete(User).where(User.id == user_id))  # type: ignore
+        session.commit()
+        # Don't leave the statistics of the imported rows to the planner
+        session.connection().execute(text("ANALYZE item"))
+        session.commit()
+
+
+def write_file(path: Path, file_format: str, rows: int) -> None:
+    with path.open("w", encoding="utf-8", newline="") as file:
+        if file_format == "csv":
+            writer = csv.writer(file)
+            writer.writerow(["title", "description"])
+            for i in range(rows):
+                writer.writerow([f"Imported item {i}", f"Description of item {i}"])
+        else:
+            for i in range(rows):
+                row = {"title": f"Imported item {i}", "description": f"Item {i}"}
+                file.write(json.dumps(row) + "\n")
+
+
+def run(rows: int, formats: list[str]) -> list[dict[str, Any]]:
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for file_format in formats:
+            path = Path(directory) / f"items.{file_format}"
+            write_file(path, file_format, rows)
+            start = time.perf_counter()
+            result = asyncio.run(import_file(str(path), file_format, BENCH_EMAIL))  # type: ignore[arg-type]
+            duration = time.perf_counter() - start
+            results.append(
+                {
+                    "format": file_format,
+                    "rows": result.rows,
+                    "imported": result.imported,
+                    "failed": result.failed,
+                    "seconds": round(duration, 2),
+                    "rows_per_s": round(result.rows / duration),
+                    "mb_per_s": round(path.stat().st_size / duration / 2**20, 1),
+                }
+            )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument(
+        "--format", nargs="+", choices=["ndjson", "csv"], default=["ndjson", "csv"]
+    )
+    parser.add_argument("--cleanup", action="store_true", help="delete the rows after")
+    parser.add_argument("--json", action="store_true", help="print JSON results")
+    args = parser.parse_args()
+    # Only the results, not the progress of each chunk
+    logging.getLogger("app.importer").setLevel(logging.WARNING)
+
+    user_id = get_bench_user_id()
+    try:
+        results = run(args.rows, args.format)
+    finally:
+        if args.cleanup:
+            cleanup(user_id)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Compare the CPU time and memory of building a list page from ORM instances and
+from Core rows.
+
+The ORM path loads Item instances into the session and validates them into
+ItemsPublic, the way read_items did. The Core path is crud.async_read_page and
+rows_page_response, used by read_items now. Both render the page to JSON. The
+items are seeded like in the export benchmark:
+
+    python -m app.benchmarks.list_rows --rows 1000 5000 10000 --iterations 20
+
+Run it against a local database (with migrations applied).
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+import uuid
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud
+from app.api.responses import PydanticJSONResponse, rows_page_response
+from app.benchmarks.export import cleanup, seed_items
+from app.benchmarks.utils import print_table
+from app.core.db import async_engine
+from app.models import Item, ItemPublic, ItemsPublic
+
+
+async def orm_page(owner_id: uuid.UUID, rows: int) -> bytes:
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        statement = (
+            select(Item)
+            .where(col(Item.owner_id) == owner_id)
+            .order_by(col(Item.id))
+            .limit(rows)
+        )
+        items = (await session.exec(statement)).all()
+        page = ItemsPublic.model_validate(
+            {"data": items, "count": None, "count_exact": False}, from_attributes=True
+        )
+        return PydanticJSONResponse(page).body
+
+
+async def core_page(owner_id: uuid.UUID, rows: int) -> bytes:
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        page_rows = await crud.async_read_page(
+            session=session,
+            model=Item,
+            columns=[*ItemPublic.model_fields, "version"],
+            where=col(Item.owner_id) == owner_id,
+            limit=rows,
+        )
+        return rows_page_response(
+            list(ItemPublic.model_fields),
+            page_rows,
+            count=None,
+            count_exact=False,
+            next_cursor=None,
+        ).body
+
+
+async def measure(
+    func: Callable[[], Awaitable[bytes]], iterations: int
+) -> tuple[float, int]:
+    """
+    The mean seconds of a call, and the peak memory allocated by one call.
+    """
+    await func()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await func()
+    elapsed = (time.perf_counter() - start) / iterations
+    tracemalloc.start()
+    await func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+async def run(
+    owner_id: uuid.UUID, page_sizes: list[int], iterations: int
+) -> list[dict[str, Any]]:
+    results = []
+    for rows in page_sizes:
+        orm_body = await orm_page(owner_id, rows)
+        assert orm_body == await core_page(owner_id, rows)
+        for name, page in (("orm", orm_page), ("core", core_page)):
+            elapsed, peak = await measure(
+                lambda page=page, rows=rows: page(owner_id, rows),  # type: ignore[misc]
+                iterations,
+            )
+            results.append(
+                {
+                    "path": name,
+                    "rows": rows,
+                    "ms": round(elapsed * 1000, 2),
+                    "us_per_row": round(elapsed / rows * 1e6, 2),
+                    "peak_kb": round(peak / 1024),
+                    "bytes_per_row": round(peak / rows),
+                }
+            )
+    await async_engine.dispose()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 5000, 10000])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--cleanup", action="store_true", help="delete the items")
+    parser.add_argument("--json", action="store_true", help="print JSON results")
+    args = parser.parse_args()
+
+    owner_id = seed_items(max(args.rows))
+    try:
+        results = asyncio.run(run(owner_id, args.rows, args.iterations))
+    finally:
+        if args.cleanup:
+            cleanup(owner_id)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    main()
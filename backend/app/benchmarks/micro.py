@@ -0,0 +1,284 @@
+"""
+Time the CPU-bound helpers that run on every request, one call at a time.
+
+Tokens (access and password reset), password hashing and the validation of the
+public models are measured with timeit: after a warm-up, each case is called
+enough times to last --min-time seconds, --repeat times, and the median time of
+a call is reported. No database is needed:
+
+    python -m app.benchmarks.micro --history micro-history.jsonl
+
+With --history, the results are appended to a JSON lines file with the package
+versions and the git commit, and compared with the previous run in that file, to
+see the effect of a change or a library upgrade. Compare runs from the same
+machine, with the same settings.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import timeit
+import uuid
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+from importlib import metadata
+from pathlib import Path
+from typing import Any
+
+import jwt
+
+from app.benchmarks.utils import print_table
+from app.core import security
+from app.core.config import settings
+from app.models import Item, ItemPublic, ItemsPublic, User, UserPublic
+from app.utils import generate_password_reset_token, verify_password_reset_token
+
+# Packages whose version changes the results, recorded in the history
+PACKAGES = ["pyjwt", "passlib", "bcrypt", "pydantic", "pydantic-core", "sqlmodel"]
+# Password hashing takes hundreds of milliseconds, fewer repetitions are enough
+SLOW_REPEAT = 3
+
+
+def cases() -> dict[str, tuple[Callable[[], object], bool]]:
+    """
+    The functions to time, by name, and whether they are slow.
+    """
+    user_id = uuid.uuid4()
+    token = security.create_access_token(user_id, timedelta(hours=1))
+    reset_token = generate_password_reset_token("user@example.com")
+    user = User(
+        id=user_id,
+        email="user@example.com",
+        full_name="Benchmark User",
+        hashed_password="hash",
+    )
+    user_data = UserPublic.model_validate(user).model_dump()
+    user_json = UserPublic.model_validate(user).model_dump_json()
+    items = [
+        Item(
+            id=uuid.uuid4(),
+            owner_id=user_id,
+            title=f"Item {i}",
+            description=f"Description of item {i}",
+        )
+        for i in range(100)
+    ]
+    item = items[0]
+    item_data = ItemPublic.model_validate(item).model_dump()
+    item_json = ItemPublic.model_validate(item).model_dump_json()
+
+    def decode_access_token(cached: bool) -> Callable[[], object]:
+        def decode() -> object:
+            security.token_cache.enabled = cached
+            return security.decode_access_token(token)
+
+        return decode
+
+    result: dict[str, tuple[Callable[[], object], bool]] = {
+        "security.create_access_token": (
+            lambda: security.create_access_token(user_id, timedelta(hours=1)),
+            False,
+        ),
+        "jwt.decode": (
+            lambda: jwt.decode(
+                token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
+            ),
+            False,
+        ),
+        "security.decode_access_token": (decode_access_token(False), False),
+        "security.decode_access_token (cached)": (decode_access_token(True), False),
+        "utils.generate_password_reset_token": (
+            lambda: generate_password_reset_token("user@example.com"),
+            False,
+        ),
+        "utils.verify_password_reset_token": (
+            lambda: verify_password_reset_token(reset_token),
+            False,
+        ),
+        "UserPublic.model_validate (dict)": (
+            lambda: UserPublic.model_validate(user_data),
+            False,
+        ),
+        "UserPublic.model_validate (orm)": (
+            lambda: UserPublic.model_validate(user),
+            False,
+        ),
+        "UserPublic.model_validate_json": (
+            lambda: UserPublic.model_validate_json(user_json),
+            False,
+        ),
+        "ItemPublic.model_validate (dict)": (
+            lambda: ItemPublic.model_validate(item_data),
+            False,
+        ),
+        "ItemPublic.model_validate (orm)": (
+            lambda: ItemPublic.model_validate(item),
+            False,
+        ),
+        "ItemPublic.model_validate_json": (
+            lambda: ItemPublic.model_validate_json(item_json),
+            False,
+        ),
+        "ItemsPublic.model_validate (100 orm)": (
+            lambda: ItemsPublic.model_validate(
+                {"data": items, "count": 100, "count_exact": True},
+                from_attributes=True,
+            ),
+            False,
+        ),
+    }
+    # Each scheme at its configured cost, the configured one verifies logins
+    for scheme in security.PASSWORD_HASH_SCHEMES:
+        context = security.create_pwd_context(
+            scheme,
+            bcrypt_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+            pbkdf2_rounds=settings.PASSWORD_PBKDF2_ROUNDS,
+        )
+        hashed = context.hash("benchmark password")
+        result[f"pwd_context.hash ({scheme})"] = (
+            lambda context=context: context.hash("benchmark password"),  # type: ignore[misc]
+            True,
+        )
+        result[f"pwd_context.verify ({scheme})"] = (
+            lambda context=context, hashed=hashed: context.verify(  # type: ignore[misc]
+                "benchmark password", hashed
+            ),
+            True,
+        )
+    return result
+
+
+def measure(
+    name: str, func: Callable[[], object], *, repeat: int, min_time: float
+) -> dict[str, Any]:
+    """
+    Time func: warm it up, find how many calls last at least min_time, then
+    time that many calls repeat times.
+    """
+    timer = timeit.Timer(func)
+    number = 1
+    while (elapsed := timer.timeit(number)) < min_time:
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+    times = [timer.timeit(number) / number for _ in range(repeat)]
+    median = statistics.median(times)
+    return {
+        "name": name,
+        "calls": number * repeat,
+        "median_us": round(median * 1e6, 3),
+        "min_us": round(min(times) * 1e6, 3),
+        "stdev_pct": round(
+            100 * statistics.stdev(times) / median if repeat > 1 else 0.0, 1
+        ),
+        "ops_per_s": round(1 / median),
+    }
+
+
+def run(names: list[str] | None, repeat: int, min_time: float) -> list[dict[str, Any]]:
+    token_cache_enabled = security.token_cache.enabled
+    try:
+        return [
+            measure(
+                name,
+                func,
+                repeat=min(repeat, SLOW_REPEAT) if slow else repeat,
+                min_time=min_time,
+            )
+            for name, (func, slow) in cases().items()
+            if not names or name in names
+        ]
+    finally:
+        security.token_cache.enabled = token_cache_enabled
+
+
+def environment() -> dict[str, Any]:
+    versions: dict[str, str | None] = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": sys.version.split()[0],
+        "packages": versions,
+        "commit": commit,
+        "password_hash_scheme": settings.PASSWORD_HASH_SCHEME,
+    }
+
+
+def compare(
+    results: list[dict[str, Any]], previous: list[dict[str, Any]]
+) -> list[dict[str, Any]]:
+    previous_results = {r["name"]: r for r in previous}
+    rows = []
+    for result in results:
+        before = previous_results.get(result["name"])
+        if before is None:
+            continue
+        rows.append(
+            {
+                "name": result["name"],
+                "previous_us": before["median_us"],
+                "median_us": result["median_us"],
+                "change_pct": round(
+                    100 * (result["median_us"] / before["median_us"] - 1), 1
+                ),
+            }
+        )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cases", nargs="+", help="names of the cases to run")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument(
+        "--min-time", type=float, default=0.2, help="seconds of each repetition"
+    )
+    parser.add_argument("--history", help="JSON lines file of the previous runs")
+    parser.add_argument("--json", action="store_true", help="print JSON results")
+    args = parser.parse_args()
+
+    results = run(args.cases, args.repeat, args.min_time)
+    record: dict[str, Any] = {
+        "time": datetime.now(timezone.utc).isoformat(),
+        "environment": environment(),
+        "results": results,
+    }
+    previous = None
+    if args.history:
+        history = Path(args.history)
+        if history.exists():
+            lines = history.read_text().splitlines()
+            previous = json.loads(lines[-1]) if lines else None
+        with history.open("a") as file:
+            file.write(json.dumps(record) + "\n")
+
+    if args.json:
+        print(json.dumps(record, indent=2))
+        return
+    print_table(results)
+    if previous:
+        print(f"\nCompared with the run of {previous['time']}:")
+        before, after = previous["environment"], record["environment"]
+        for key in ("python", "commit", "password_hash_scheme"):
+            if before.get(key) != after[key]:
+                print(f"{key}: {before.get(key)} -> {after[key]}")
+        for package, version in after["packages"].items():
+            if before["packages"].get(package) != version:
+                print(f"{package}: {before['packages'].get(package)} -> {version}")
+        print_table(compare(results, previous["results"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Measure password hashing latency on this host and recommend a cost.
+
+For each cost of the scheme the median time of a hash is measured, the highest
+cost with a median below the target is recommended, e.g.:
+
+    python -m app.benchmarks.password_hash --target-ms 250
+    python -m app.benchmarks.password_hash --scheme pbkdf2_sha256 --target-ms 100
+
+Run it on the production hardware, with the backend idle.
+"""
+
+import argparse
+import json
+import statistics
+import time
+from typing import Any
+
+from app.benchmarks.utils import print_table
+from app.core.config import settings
+from app.core.security import PASSWORD_HASH_SCHEMES, create_pwd_context
+
+# Setting holding the cost and the costs to try, for each scheme
+COSTS = {
+    "bcrypt": ("PASSWORD_BCRYPT_ROUNDS", range(4, 20)),
+    "pbkdf2_sha256": (
+        "PASSWORD_PBKDF2_ROUNDS",
+        [10_000 * 2**i for i in range(10)],
+    ),
+}
+
+
+def time_hash(scheme: str, cost: int, samples: int) -> float:
+    context = create_pwd_context(scheme, bcrypt_rounds=cost, pbkdf2_rounds=cost)
+    durations = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        context.hash("calibration password")
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def calibrate(
+    scheme: str, target_ms: float, samples: int
+) -> tuple[list[dict[str, Any]], int | None]:
+    setting, costs = COSTS[scheme]
+    rows = []
+    recommended = None
+    for cost in costs:
+        median_ms = time_hash(scheme, cost, samples) * 1000
+        rows.append({setting: cost, "median_ms": round(median_ms, 2)})
+        if median_ms > target_ms:
+            # Higher costs only take longer
+            break
+        recommended = cost
+    return rows, recommended
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--scheme", choices=PASSWORD_HASH_SCHEMES, default=settings.PASSWORD_HASH_SCHEME
+    )
+    parser.add_argument(
+        "--target-ms", type=float, default=250, help="target time of one hash"
+    )
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print JSON results")
+    args = parser.parse_args()
+
+    rows, recommended = calibrate(args.scheme, args.target_ms, args.samples)
+    setting = COSTS[args.scheme][0]
+    if args.json:
+        print(json.dumps({"results": rows, setting: recommended}, indent=2))
+        return
+    print_table(rows)
+    if recommended is None:
+        print(f"Even the lowest cost of {args.scheme} is above {args.target_ms} ms")
+    else:
+        print(f"\nPASSWORD_HASH_SCHEME={args.scheme}\n{setting}={recommended}")
+
+
+if __name__ == "__main__":
+    main()
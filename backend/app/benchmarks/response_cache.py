@@ -0,0 +1,140 @@
+"""
+Load test the cached GET routes with and without the response cache.
+
+A benchmark user with a page of items is created, then the item, items and user
+routes are requested through the real app served by uvicorn:
+
+    python -m app.benchmarks.response_cache --requests 5000 --concurrency 10
+
+Run it against a local database (with migrations applied).
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any
+
+import httpx
+from sqlmodel import Session, delete
+
+from app import crud
+from app.api.response_cache import response_cache
+from app.benchmarks.utils import print_table, run_load, serve
+from app.core.config import settings
+from app.core.db import engine
+from app.main import app
+from app.models import Item, ItemCreate, User, UserCreate
+
+BENCH_EMAIL = "response-cache-bench@example.com"
+BENCH_PASSWORD = "response-cache-bench-password"
+ITEMS = 100
+
+
+def seed() -> tuple[uuid.UUID, uuid.UUID]:
+    """
+    Create the benchmark user and its items, return the ids of the user and of
+    an item.
+    """
+    with Session(engine) as session:
+        user = crud.create_user(
+            session=session,
+            user_create=UserCreate(email=BENCH_EMAIL, password=BENCH_PASSWORD),
+        )
+        for i in range(ITEMS):
+            item = crud.create_item(
+                session=session,
+                item_in=ItemCreate(title=f"Item {i}", description="Description"),
+                owner_id=user.id,
+            )
+        return user.id, item.id
+
+
+def cleanup(user_id: uuid.UUID) -> None:
+    with Session(engine) as session:
+        session.exec(delete(Item).where(Item.owner_id == user_id))  # type: ignore
+        session.exec(delete(User).where(User.id == user_id))  # type: ignore
+        session.commit()
+
+
+async def run(
+    base_url: str,
+    user_id: uuid.UUID,
+    item_id: uuid.UUID,
+    *,
+    total_requests: int,
+    concurrency: int,
+) -> list[dict[str, Any]]:
+    routes = {
+        "items-read_item": f"{settings.API_V1_STR}/items/{item_id}",
+        "items-read_items": f"{settings.API_V1_STR}/items/",
+        "users-read_user_by_id": f"{settings.API_V1_STR}/users/{user_id}",
+    }
+    results = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        r = await client.post(
+            f"{settings.API_V1_STR}/login/access-token",
+            data={"username": BENCH_EMAIL, "password": BENCH_PASSWORD},
+        )
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        for route, url in routes.items():
+            for cached in (False, True):
+                response_cache.routes = {route} if cached else set()
+                response_cache.backend.enabled = cached
+                response_cache.backend.clear()
+                before = response_cache.backend.status()
+                result = await run_load(
+                    client,
+                    f"{route} ({'cached' if cached else 'no cache'})",
+                    "GET",
+                    url,
+                    concurrency=concurrency,
+                    total_requests=total_requests,
+                    headers=headers,
+                )
+                status = response_cache.backend.status()
+                hits = status.hits - before.hits
+                lookups = hits + status.misses - before.misses
+                results.append(
+                    result.summary()
+                    | {
+                        "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+                        "cache_bytes": status.memory_bytes,
+                    }
+                )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", action="store_true", help="print JSON results")
+    args = parser.parse_args()
+    # Don't log every request
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    user_id, item_id = seed()
+    try:
+        with serve(app, port=args.port) as base_url:
+            results = asyncio.run(
+                run(
+                    base_url,
+                    user_id,
+                    item_id,
+                    total_requests=args.requests,
+                    concurrency=args.concurrency,
+                )
+            )
+    finally:
+        cleanup(user_id)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,649 @@
+"""
+Load test every API route and compare the results with a baseline.
+
+Benchmark users and items are seeded, then each route of api_router, by operation
+id, is sent the same number of requests at each concurrency level through the
+real app served by uvicorn. Requests that change or delete data get rows created
+for them before they are timed. The seeded data is deleted at the end:
+
+    python -m app.benchmarks.routes --users 100 --items 100 --concurrency 1 10 \\
+        --requests 200 --output results.json --baseline baseline.json
+
+With --baseline, a route whose requests per second dropped, or whose p95 latency
+grew, by more than --threshold percent, or that now has errors, is reported and
+the command exits with status 1. A baseline is the --output of a previous run.
+
+The routes that send emails are only run with --send-emails, emails are disabled
+otherwise. Run it against a local database (with migrations applied and the
+first superuser created).
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import httpx
+from fastapi.routing import APIRoute
+from sqlmodel import Session, col, delete, select, text
+
+from app.api.main import api_router
+from app.benchmarks.utils import print_table, run_requests, serve
+from app.core import security
+from app.core.config import settings
+from app.core.db import engine
+from app.main import app, custom_generate_unique_id
+from app.models import Item, User
+from app.utils import generate_password_reset_token
+
+BENCH_EMAIL_PREFIX = "routes-bench-"
+BENCH_PASSWORD = "routes-bench-password"
+BENCH_NEW_PASSWORD = "routes-bench-new-password"
+# Items sent in each bulk and import request
+BULK_SIZE = 100
+
+BuildRequest = Callable[[int], httpx.Request]
+
+
+@dataclass
+class BenchData:
+    client: httpx.AsyncClient
+    superuser_headers: dict[str, str]
+    # The seeded users, their auth headers and their items, by user index
+    users: list[uuid.UUID]
+    emails: list[str]
+    headers: list[dict[str, str]]
+    items: list[list[uuid.UUID]]
+    hashed_password: str
+
+    def user(self, i: int) -> int:
+        """
+        The index of the seeded user of the request i, requests in a row come
+        from different users.
+        """
+        return i % len(self.users)
+
+    def item(self, i: int) -> tuple[int, uuid.UUID]:
+        """
+        The user of the request i and one of its items.
+        """
+        user = self.user(i)
+        items = self.items[user]
+        return user, items[i // len(self.users) % len(items)]
+
+    def new_users(self, count: int) -> tuple[list[uuid.UUID], list[str]]:
+        users = insert_users(count, self.hashed_password)
+        return [user_id for user_id, _ in users], [email for _, email in users]
+
+    def new_items(self, owner_id: uuid.UUID, count: int) -> list[uuid.UUID]:
+        return [item_id for item_id, _ in insert_items([owner_id], count)]
+
+    def request(self, method: str, path: str, **kwargs: Any) -> httpx.Request:
+        return self.client.build_request(
+            method, f"{settings.API_V1_STR}{path}", **kwargs
+        )
+
+
+Scenario = Callable[[BenchData, int], BuildRequest]
+
+# The requests of each route, by operation id. A scenario gets the number of
+# requests to send, prepares the data they need and returns their builder
+SCENARIOS: dict[str, Scenario] = {}
+# Routes that fail when emails are not enabled
+REQUIRES_EMAILS = {"login-recover_password", "utils-test_email"}
+
+
+def scenario(operation_id: str) -> Callable[[Scenario], Scenario]:
+    def register(func: Scenario) -> Scenario:
+        SCENARIOS[operation_id] = func
+        return func
+
+    return register
+
+
+def token_headers(user_id: uuid.UUID) -> dict[str, str]:
+    token = security.create_access_token(
+        user_id, timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+def new_email(i: int) -> str:
+    return f"{BENCH_EMAIL_PREFIX}new-{uuid.uuid4().hex[:12]}-{i}@example.com"
+
+
+def ndjson_items(count: int) -> bytes:
+    return b"".join(
+        json.dumps({"title": f"Imported {i}", "description": "Imported"}).encode()
+        + b"\n"
+        for i in range(count)
+    )
+
+
+@scenario("login-login_access_token")
+def login_access_token(data: BenchData, _n: int) -> BuildRequest:
+    return lambda i: data.request(
+        "POST",
+        "/login/access-token",
+        data={"username": data.emails[data.user(i)], "password": BENCH_PASSWORD},
+    )
+
+
+@scenario("login-test_token")
+def test_token(data: BenchData, _n: int) -> BuildRequest:
+    return lambda i: data.request(
+        "POST", "/login/test-token", headers=data.headers[data.user(i)]
+    )
+
+
+@scenario("login-recover_password")
+def recover_password(data: BenchData, _n: int) -> BuildRequest:
+    return lambda i: data.request(
+        "POST", f"/password-recovery/{data.emails[data.user(i)]}"
+    )
+
+
+@scenario("login-reset_password")
+def reset_password(data: BenchData, n: int) -> BuildRequest:
+    tokens = [generate_password_reset_token(email) for email in data.emails[:n]]
+    # The password is set to the same one, the users can still log in
+    return lambda i: data.request(
+        "POST",
+        "/reset-password/",
+        json={"token": tokens[i % len(tokens)], "new_password": BENCH_PASSWORD},
+    )
+
+
+@scenario("login-recover_password_html_content")
+def recover_password_html_content(data: BenchData, _n: int) -> BuildRequest:
+    return lambda i: data.request(
+        "POST",
+        f"/password-recovery-html-content/{data.emails[data.user(i)]}",
+        headers=data.superuser_headers,
+    )
+
+
+@scenario("users-read_users")
+def read_users(data: BenchData, _n: int) -> BuildRequest:
+    return lambda _: data.request(
+        "GET", "/users/", params={"limit": 100}, headers=data.superuser_headers
+    )
+
+
+@scenario("users-create_user")
+def create_user(data: BenchData, _n: int) -> BuildRequest:
+    return lambda i: data.request(
+        "POST",
+        "/users/",
+        json={"email": new_email(i), "password": BENCH_PASSWORD},
+        headers=data.superuser_headers,
+    )
+
+
+@scenario("users-update_user_me")
+def update_user_me(data: BenchData, _n: int) -> BuildRequest:
+    return lambda i: data.request(
+        "PATCH",
+        "/users/me",
+        json={"full_name": f"Bench user {i}"},
+        headers=data.headers[data.user(i)],
+    )
+
+
+@scenario("users-update_password_me")
+def update_password_me(data: BenchData, n: int) -> BuildRequest:
+    user_ids, _ = data.new_users(n)
+    return lambda i: data.request(
+        "PATCH",
+        "/users/me/password",
+        json={
+            "current_password": BENCH_PASSWORD,
+            "new_password": BENCH_NEW_PASSWORD,
+        },
+        headers=token_headers(user_ids[i]),
+    )
+
+
+@scenario("users-read_user_me")
+def read_user_me(data: BenchData, _n: int) -> BuildRequest:
+    return lambda i: data.request(
+        "GET", "/users/me", headers=data.headers[data.user(i)]
+    )
+
+
+@scenario("users-delete_user_me")
+def delete_user_me(data: BenchData, n: int) -> BuildRequest:
+    user_ids, _ = data.new_users(n)
+    return lambda i: data.request(
+        "DELETE", "/users/me", headers=token_headers(user_ids[i])
+    )
+
+
+@scenario("users-register_user")
+def register_user(data: BenchData, _n: int) -> BuildRequest:
+    return lambda i: data.request(
+        "POST",
+        "/users/signup",
+        json={"email": new_email(i), "password": BENCH_PASSWORD},
+    )
+
+
+@scenario("users-read_user_by_id")
+def read_user_by_id(data: BenchData, _n: int) -> BuildRequest:
+    return lambda i: data.request(
+        "GET", f"/users/{data.users[data.user(i)]}", headers=data.superuser_headers
+    )
+
+
+@scenario("users-update_user")
+def update_user(data: BenchData, _n: int) -> BuildRequest:
+    return lambda i: data.request(
+        "PATCH",
+        f"/users/{data.users[data.user(i)]}",
+        json={"full_name": f"Bench user {i}"},
+        headers=data.superuser_headers,
+    )
+
+
+@scenario("users-delete_user")
+def delete_user(data: BenchData, n: int) -> BuildRequest:
+    user_ids, _ = data.new_users(n)
+    return lambda i: data.request(
+        "DELETE", f"/users/{user_ids[i]}", headers=data.superuser_headers
+    )
+
+
+@scenario("utils-test_email")
+def test_email(data: BenchData, _n: int) -> BuildRequest:
+    return lambda i: data.request(
+        "POST",
+        "/utils/test-email/",
+        params={"email_to": data.emails[data.user(i)]},
+        headers=data.superuser_headers,
+    )
+
+
+@scenario("utils-health_check")
+def health_check(data: BenchData, _n: int) -> BuildRequest:
+    return lambda _: data.request("GET", "/utils/health-check/")
+
+
+def superuser_get(path: str) -> Scenario:
+    def get(data: BenchData, _n: int) -> BuildRequest:
+        return lambda _: data.request("GET", path, headers=data.superuser_headers)
+
+    return get
+
+
+for operation_id, path in (
+    ("utils-db_pool_stats", "/utils/db-pool-stats/"),
+    ("utils-password_hash_stats", "/utils/password-hash-stats/"),
+    ("utils-mail_stats", "/utils/mail-stats/"),
+    ("utils-cache_stats", "/utils/cache-stats/"),
+):
+    SCENARIOS[operation_id] = superuser_get(path)
+
+
+@scenario("items-read_items")
+def read_items(data: BenchData, _n: int) -> BuildRequest:
+    return lambda i: data.request("GET", "/items/", headers=data.headers[data.user(i)])
+
+
+@scenario("items-export_items")
+def export_items(data: BenchData, _n: int) -> BuildRequest:
+    return lambda i: data.request(
+        "GET", "/items/export", headers=data.headers[data.user(i)]
+    )
+
+
+@scenario("items-import_items")
+def import_items(data: BenchData, _n: int) -> BuildRequest:
+    content = ndjson_items(BULK_SIZE)
+    return lambda i: data.request(
+        "POST",
+        "/items/import",
+        files={"file": ("items.ndjson", content, "application/x-ndjson")},
+        headers=data.headers[data.user(i)],
+    )
+
+
+@scenario("items-create_items")
+def create_items(data: BenchData, _n: int) -> BuildRequest:
+    body = {
+        "data": [
+            {"title": f"Bulk {i}", "description": "Bulk"} for i in range(BULK_SIZE)
+        ]
+    }
+    return lambda i: data.request(
+        "POST", "/items/bulk", json=body, headers=data.headers[data.user(i)]
+    )
+
+
+@scenario("items-update_items")
+def update_items(data: BenchData, _n: int) -> BuildRequest:
+    def build(i: int) -> httpx.Request:
+        user = data.user(i)
+        body = {
+            "data": [
+                {"id": str(item_id), "title": f"Updated {i}"}
+                for item_id in data.items[user][:BULK_SIZE]
+            ]
+        }
+        return data.request("PUT", "/items/bulk", json=body, headers=data.headers[user])
+
+    return build
+
+
+@scenario("items-delete_items")
+def delete_items(data: BenchData, n: int) -> BuildRequest:
+    item_ids = data.new_items(data.users[0], n * BULK_SIZE)
+    return lambda i: data.request(
+        "DELETE",
+        "/items/bulk",
+        json={
+            "ids": [
+                str(item_id)
+                for item_id in item_ids[i * BULK_SIZE : (i + 1) * BULK_SIZE]
+            ]
+        },
+        headers=data.headers[0],
+    )
+
+
+@scenario("items-read_item")
+def read_item(data: BenchData, _n: int) -> BuildRequest:
+    def build(i: int) -> httpx.Request:
+        user, item_id = data.item(i)
+        return data.request("GET", f"/items/{item_id}", headers=data.headers[user])
+
+    return build
+
+
+@scenario("items-create_item")
+def create_item(data: BenchData, _n: int) -> BuildRequest:
+    return lambda i: data.request(
+        "POST",
+        "/items/",
+        json={"title": f"Item {i}", "description": "Created"},
+        headers=data.headers[data.user(i)],
+    )
+
+
+@scenario("items-update_item")
+def update_item(data: BenchData, _n: int) -> BuildRequest:
+    def build(i: int) -> httpx.Request:
+        user, item_id = data.item(i)
+        return data.request(
+            "PUT",
+            f"/items/{item_id}",
+            json={"title": f"Updated {i}"},
+            headers=data.headers[user],
+        )
+
+    return build
+
+
+@scenario("items-delete_item")
+def delete_item(data: BenchData, n: int) -> BuildRequest:
+    item_ids = data.new_items(data.users[0], n)
+    return lambda i: data.request(
+        "DELETE", f"/items/{item_ids[i]}", headers=data.headers[0]
+    )
+
+
+@scenario("private-create_user")
+def private_create_user(data: BenchData, _n: int) -> BuildRequest:
+    return lambda i: data.request(
+        "POST",
+        "/private/users/",
+        json={
+            "email": new_email(i),
+            "password": BENCH_PASSWORD,
+            "full_name": f"Bench user {i}",
+        },
+    )
+
+
+def operation_ids() -> list[str]:
+    """
+    The operation ids of the routes of api_router, in order.
+    """
+    return [
+        custom_generate_unique_id(route)
+        for route in api_router.routes
+        if isinstance(route, APIRoute)
+    ]
+
+
+def insert_users(count: int, hashed_password: str) -> list[tuple[uuid.UUID, str]]:
+    """
+    Create count benchmark users, all with BENCH_PASSWORD, return their ids and
+    emails.
+    """
+    with Session(engine) as session:
+        rows = session.connection().execute(
+            text(
+                'INSERT INTO "user" '
+                "(id, email, is_active, is_superuser, full_name, hashed_password) "
+                "SELECT gen_random_uuid(), :prefix || i || '@example.com', true, "
+                "false, 'Bench user ' || i, :hashed_password "
+                "FROM generate_series(1, :count) AS i RETURNING id, email"
+            ).bindparams(
+                prefix=f"{BENCH_EMAIL_PREFIX}{uuid.uuid4().hex[:12]}-",
+                hashed_password=hashed_password,
+                count=count,
+            )
+        )
+        users = [(row.id, row.email) for row in rows]
+        session.commit()
+        return users
+
+
+def insert_items(
+    owner_ids: list[uuid.UUID], count: int
+) -> list[tuple[uuid.UUID, uuid.UUID]]:
+    """
+    Create count items for each owner, return their ids and owner ids.
+    """
+    with Session(engine) as session:
+        rows = session.connection().execute(
+            text(
+                "INSERT INTO item (id, title, description, owner_id) "
+                "SELECT gen_random_uuid(), 'Bench item ' || i, "
+                "'Description of bench item ' || i, owner.id "
+                "FROM unnest(CAST(:owner_ids AS uuid[])) AS owner(id), "
+                "generate_series(1, :count) AS i RETURNING id, owner_id"
+            ).bindparams(owner_ids=owner_ids, count=count)
+        )
+        items = [(row.id, row.owner_id) for row in rows]
+        session.commit()
+        return items
+
+
+def seed(client: httpx.AsyncClient, users: int, items: int) -> BenchData:
+    hashed_password = security.get_password_hash(BENCH_PASSWORD)
+    seeded_users = insert_users(users, hashed_password)
+    user_ids = [user_id for user_id, _ in seeded_users]
+    items_by_user: dict[uuid.UUID, list[uuid.UUID]] = {id: [] for id in user_ids}
+    for item_id, owner_id in insert_items(user_ids, items):
+        items_by_user[owner_id].append(item_id)
+    with Session(engine) as session:
+        session.connection().execute(text('ANALYZE "user", item'))
+        superuser = session.exec(
+            select(User).where(User.email == settings.FIRST_SUPERUSER)
+        ).one()
+    return BenchData(
+        client=client,
+        superuser_headers=token_headers(superuser.id),
+        users=user_ids,
+        emails=[email for _, email in seeded_users],
+        headers=[token_headers(user_id) for user_id in user_ids],
+        items=[items_by_user[user_id] for user_id in user_ids],
+        hashed_password=hashed_password,
+    )
+
+
+def cleanup() -> None:
+    with Session(engine) as session:
+        bench_users = select(User.id).where(
+            col(User.email).startswith(BENCH_EMAIL_PREFIX)
+        )
+        session.exec(delete(Item).where(col(Item.owner_id).in_(bench_users)))  # type: ignore
+        session.exec(delete(User).where(col(User.id).in_(bench_users)))  # type: ignore
+        session.commit()
+
+
+async def run(
+    base_url: str,
+    routes: list[str],
+    *,
+    users: int,
+    items: int,
+    concurrency_levels: list[int],
+    total_requests: int,
+) -> list[dict[str, Any]]:
+    results = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        data = seed(client, users, items)
+        for operation_id in routes:
+            for concurrency in concurrency_levels:
+                build_request = SCENARIOS[operation_id](data, total_requests)
+                result = await run_requests(
+                    client,
+                    operation_id,
+                    build_request,
+                    concurrency=concurrency,
+                    total_requests=total_requests,
+                )
+                results.append(result.summary())
+    return results
+
+
+def compare(
+    results: list[dict[str, Any]], baseline: list[dict[str, Any]], threshold: float
+) -> list[dict[str, Any]]:
+    """
+    The results slower than their baseline result by more than threshold percent
+    in requests per second or p95 latency, or with errors the baseline didn't have.
+    """
+    baseline_results = {(r["name"], r["concurrency"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        base = baseline_results.get((result["name"], result["concurrency"]))
+        if base is None:
+            continue
+        rps_change = 100 * (result["rps"] / base["rps"] - 1) if base["rps"] else 0.0
+        p95_change = (
+            100 * (result["p95_ms"] / base["p95_ms"] - 1) if base["p95_ms"] else 0.0
+        )
+        if (
+            rps_change < -threshold
+            or p95_change > threshold
+            or (result["errors"] and not base["errors"])
+        ):
+            regressions.append(
+                {
+                    "name": result["name"],
+                    "concurrency": result["concurrency"],
+                    "rps": result["rps"],
+                    "baseline_rps": base["rps"],
+                    "rps_change_pct": round(rps_change, 1),
+                    "p95_ms": result["p95_ms"],
+                    "baseline_p95_ms": base["p95_ms"],
+                    "p95_change_pct": round(p95_change, 1),
+                    "errors": result["errors"],
+                }
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=100, help="seeded users")
+    parser.add_argument("--items", type=int, default=100, help="items per user")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10])
+    parser.add_argument(
+        "--requests", type=int, default=200, help="requests per route and level"
+    )
+    parser.add_argument(
+        "--routes", nargs="+", help="operation ids of the routes, all by default"
+    )
+    parser.add_argument("--send-emails", action="store_true")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument(
+        "--threshold", type=float, default=20.0, help="regression percent"
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON results")
+    args = parser.parse_args()
+    # Don't log every request
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("app.importer").setLevel(logging.WARNING)
+
+    all_routes = operation_ids()
+    missing = [route for route in all_routes if route not in SCENARIOS]
+    if missing:
+        parser.error(f"No benchmark scenario for the routes: {', '.join(missing)}")
+    unknown = set(args.routes or []) - set(all_routes)
+    if unknown:
+        parser.error(f"Unknown routes: {', '.join(sorted(unknown))}")
+    routes = [route for route in all_routes if not args.routes or route in args.routes]
+    if args.send_emails:
+        if not settings.emails_enabled:
+            parser.error("--send-emails needs SMTP_HOST and EMAILS_FROM_EMAIL")
+    else:
+        settings.SMTP_HOST = None
+        routes = [route for route in routes if route not in REQUIRES_EMAILS]
+
+    cleanup()
+    try:
+        with serve(app, port=args.port) as base_url:
+            results = asyncio.run(
+                run(
+                    base_url,
+                    routes,
+                    users=args.users,
+                    items=args.items,
+                    concurrency_levels=args.concurrency,
+                    total_requests=args.requests,
+                )
+            )
+    finally:
+        cleanup()
+
+    if args.output:
+        output = {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "options": {
+                "users": args.users,
+                "items": args.items,
+                "requests": args.requests,
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as file:
+            json.dump(output, file, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nRegressions of more than {args.threshold}%:")
+            print_table(regressions)
+            raise SystemExit(1)
+        print(f"\nNo regressions of more than {args.threshold}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Compare FastAPI's default response serialization with PydanticJSONResponse.
+
+Both routes return the same prebuilt ItemsPublic page, one through
+response_model validation and json.dumps, the other rendered straight to bytes.
+The responses are checked to be byte-for-byte equal. No database is needed:
+
+    python -m app.benchmarks.serialization --sizes 100 1000 10000
+"""
+
+import argparse
+import asyncio
+import json
+import uuid
+from typing import Any
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from app.api.responses import PydanticJSONResponse
+from app.benchmarks.utils import print_table, time_calls
+from app.models import Item, ItemsPublic
+
+bench_app = FastAPI()
+pages: dict[int, ItemsPublic] = {}
+
+
+@bench_app.get(
+    "/default/items", response_model=ItemsPublic, response_class=JSONResponse
+)
+async def read_items_default(size: int) -> Any:
+    return pages[size]
+
+
+@bench_app.get("/fast/items", response_model=ItemsPublic)
+async def read_items_fast(size: int) -> Any:
+    return PydanticJSONResponse(pages[size])
+
+
+def make_items(size: int) -> list[Item]:
+    owner_id = uuid.uuid4()
+    return [
+        Item(
+            id=uuid.uuid4(),
+            title=f"Item {i} ✓",
+            description=f"Description of item {i}" if i % 2 else None,
+            owner_id=owner_id,
+        )
+        for i in range(size)
+    ]
+
+
+async def run(sizes: list[int], iterations: int) -> list[dict[str, Any]]:
+    results = []
+    transport = httpx.ASGITransport(app=bench_app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        for size in sizes:
+            pages[size] = ItemsPublic(data=make_items(size), count=size)
+            params = {"size": size}
+            default = await client.get("/default/items", params=params)
+            fast = await client.get("/fast/items", params=params)
+            assert default.content == fast.content, "responses differ"
+            # Fewer iterations for big pages, keep each run a similar length
+            count = max(iterations * 100 // size, 5)
+            for variant in ("default", "fast"):
+                url = f"/{variant}/items"
+                result = await time_calls(
+                    f"{variant} {size}",
+                    lambda url=url, params=params: client.get(url, params=params),  # type: ignore[misc]
+                    iterations=count,
+                )
+                summary = result.summary()
+                summary["bytes"] = len(default.content)
+                results.append(summary)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument(
+        "--iterations", type=int, default=200, help="iterations for 100 items"
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON results")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.sizes, args.iterations))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    main()
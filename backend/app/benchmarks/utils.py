@@ -0,0 +1,155 @@
+import asyncio
+import math
+import statistics
+import threading
+import time
+from collections.abc import Awaitable, Callable, Generator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+import httpx
+import uvicorn
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+@dataclass
+class LoadResult:
+    name: str
+    concurrency: int
+    duration: float
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+
+    @property
+    def requests(self) -> int:
+        return len(self.latencies) + self.errors
+
+    @property
+    def rps(self) -> float:
+        return self.requests / self.duration if self.duration else 0.0
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "concurrency": self.concurrency,
+            "requests": self.requests,
+            "errors": self.errors,
+            "rps": round(self.rps, 1),
+            "p50_ms": round(percentile(self.latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(self.latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(self.latencies, 99) * 1000, 2),
+            "mean_ms": round(statistics.fmean(self.latencies) * 1000, 2)
+            if self.latencies
+            else 0.0,
+        }
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    name: str,
+    method: str,
+    url: str,
+    *,
+    concurrency: int,
+    total_requests: int,
+    **request_kwargs: Any,
+) -> LoadResult:
+    """
+    Send total_requests requests with at most concurrency of them in flight.
+    """
+    return await run_requests(
+        client,
+        name,
+        lambda _: client.build_request(method, url, **request_kwargs),
+        concurrency=concurrency,
+        total_requests=total_requests,
+    )
+
+
+async def run_requests(
+    client: httpx.AsyncClient,
+    name: str,
+    build_request: Callable[[int], httpx.Request],
+    *,
+    concurrency: int,
+    total_requests: int,
+) -> LoadResult:
+    """
+    Send build_request(i) for i in range(total_requests), with at most
+    concurrency of them in flight.
+    """
+    next_index = 0
+    result = LoadResult(name=name, concurrency=concurrency, duration=0.0)
+
+    async def worker() -> None:
+        nonlocal next_index
+        while next_index < total_requests:
+            request = build_request(next_index)
+            next_index += 1
+            start = time.perf_counter()
+            try:
+                response = await client.send(request)
+            except httpx.HTTPError:
+                result.errors += 1
+                continue
+            if response.is_error:
+                result.errors += 1
+            else:
+                result.latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.duration = time.perf_counter() - start
+    return result
+
+
+async def time_calls(
+    name: str, func: Callable[[], Awaitable[Any]], *, iterations: int
+) -> LoadResult:
+    """
+    Await func() iterations times in a row, timing each call.
+    """
+    result = LoadResult(name=name, concurrency=1, duration=0.0)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        call_start = time.perf_counter()
+        await func()
+        result.latencies.append(time.perf_counter() - call_start)
+    result.duration = time.perf_counter() - start
+    return result
+
+
+@contextmanager
+def serve(app: Any, *, port: int) -> Generator[str, None, None]:
+    """
+    Run an ASGI app with uvicorn in a background thread, yield its base URL.
+    """
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def print_table(rows: list[dict[str, Any]]) -> None:
+    if not rows:
+        return
+    columns = list(rows[0])
+    widths = {c: max(len(c), *(len(str(row[c])) for row in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row[c]).ljust(widths[c]) for c in columns))
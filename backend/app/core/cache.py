@@ -0,0 +1,248 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Generic, Protocol, TypeVar
+
+from app.models import CacheStatus
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """
+    Thread safe LRU cache, entries expire ttl seconds after they are set.
+
+    The cache is per worker process, entries invalidated in one worker can still
+    be used by the others until they expire.
+    """
+
+    def __init__(self, *, name: str, maxsize: int, ttl: float, enabled: bool = True):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def get(self, key: K) -> V | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: K, value: V, *, ttl: float | None = None) -> None:
+        if not self.enabled:
+            return
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: K) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def status(self) -> CacheStatus:
+        lookups = self.hits + self.misses
+        return CacheStatus(
+            name=self.name,
+            enabled=self.enabled,
+            size=len(self._data),
+            maxsize=self.maxsize,
+            ttl=self.ttl,
+            hits=self.hits,
+            misses=self.misses,
+            hit_ratio=self.hits / lookups if lookups else 0.0,
+        )
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    headers: dict[str, str]
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers.items())
+
+
+class ResponseCacheBackend(Protocol):
+    """
+    Storage of cached responses, entries are invalidated by the tags they were set
+    with.
+
+    Each invalidation starts a new generation. A response read from the database
+    during generation g isn't stored when one of its tags was invalidated after g:
+    it can have been read before the write that invalidated it was committed.
+    """
+
+    enabled: bool
+
+    def get(self, key: str) -> CachedResponse | None: ...
+
+    def generation(self) -> int: ...
+
+    def set(
+        self,
+        key: str,
+        value: CachedResponse,
+        *,
+        tags: Iterable[str],
+        generation: int | None = None,
+    ) -> None: ...
+
+    def invalidate(self, tags: Iterable[str]) -> None: ...
+
+    def clear(self) -> None: ...
+
+    def status(self) -> CacheStatus: ...
+
+
+class MemoryResponseCache:
+    """
+    In-process LRU response cache backend, bounded by the number of entries and
+    the bytes of the responses. Entries expire ttl seconds after they are set.
+    """
+
+    def __init__(
+        self,
+        *,
+        name: str,
+        maxsize: int,
+        max_bytes: int,
+        ttl: float,
+        enabled: bool = True,
+    ):
+        self.name = name
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.memory_bytes = 0
+        self._lock = threading.Lock()
+        self._data: OrderedDict[str, tuple[float, CachedResponse, tuple[str, ...]]] = (
+            OrderedDict()
+        )
+        self._keys_by_tag: dict[str, set[str]] = {}
+        # The generation of the last invalidation of each tag, for the maxsize
+        # last invalidated tags. Responses of a generation before the ones
+        # forgotten aren't stored
+        self._generation = 0
+        self._tag_generations: OrderedDict[str, int] = OrderedDict()
+        self._forgotten_generation = 0
+
+    def get(self, key: str) -> CachedResponse | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self) -> int:
+        return self._generation
+
+    def set(
+        self,
+        key: str,
+        value: CachedResponse,
+        *,
+        tags: Iterable[str],
+        generation: int | None = None,
+    ) -> None:
+        if not self.enabled or value.size > self.max_bytes:
+            return
+        expires = time.monotonic() + self.ttl
+        tags = tuple(tags)
+        with self._lock:
+            if generation is not None and self._invalidated_since(tags, generation):
+                return
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (expires, value, tags)
+            self.memory_bytes += value.size
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self._data) > self.maxsize or self.memory_bytes > self.max_bytes:
+                self._remove(next(iter(self._data)))
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                self._tag_generations[tag] = self._generation
+                self._tag_generations.move_to_end(tag)
+                for key in self._keys_by_tag.get(tag, set()).copy():
+                    self._remove(key)
+            while len(self._tag_generations) > self.maxsize:
+                _, self._forgotten_generation = self._tag_generations.popitem(
+                    last=False
+                )
+
+    def _invalidated_since(self, tags: tuple[str, ...], generation: int) -> bool:
+        if generation < self._forgotten_generation:
+            return True
+        return any(self._tag_generations.get(tag, 0) > generation for tag in tags)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._keys_by_tag.clear()
+            self.memory_bytes = 0
+
+    def _remove(self, key: str) -> None:
+        _, value, tags = self._data.pop(key)
+        self.memory_bytes -= value.size
+        for tag in tags:
+            keys = self._keys_by_tag[tag]
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_tag[tag]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def status(self) -> CacheStatus:
+        lookups = self.hits + self.misses
+        return CacheStatus(
+            name=self.name,
+            enabled=self.enabled,
+            size=len(self._data),
+            maxsize=self.maxsize,
+            ttl=self.ttl,
+            hits=self.hits,
+            misses=self.misses,
+            hit_ratio=self.hits / lookups if lookups else 0.0,
+            memory_bytes=self.memory_bytes,
+            max_memory_bytes=self.max_bytes,
+        )
@@ -0,0 +1,263 @@
+"""
+Response compression negotiated with Accept-Encoding: zstd, br and gzip.
+"""
+
+import re
+import zlib
+from collections.abc import Callable, Sequence
+from typing import Any, Protocol
+
+import brotli  # type: ignore[import-untyped]
+import zstandard
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.timing import timed
+
+
+class Compressor(Protocol):
+    def compress(self, data: bytes) -> bytes:
+        """
+        Compress data, the output can be held back until flush or finish.
+        """
+        ...
+
+    def flush(self) -> bytes:
+        """
+        Output all the data compressed so far, to send it before the next chunk.
+        """
+        ...
+
+    def finish(self) -> bytes:
+        """
+        Output the rest of the data and end the stream.
+        """
+        ...
+
+
+class GzipCompressor:
+    def __init__(self, level: int):
+        # wbits 31: deflate with a gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return bytes(self._compressor.process(data))
+
+    def flush(self) -> bytes:
+        return bytes(self._compressor.flush())
+
+    def finish(self) -> bytes:
+        return bytes(self._compressor.finish())
+
+
+class ZstdCompressor:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+# By Content-Encoding token
+COMPRESSORS: dict[str, Callable[[int], Compressor]] = {
+    "gzip": GzipCompressor,
+    "br": BrotliCompressor,
+    "zstd": ZstdCompressor,
+}
+
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    compressor = COMPRESSORS[encoding](level)
+    return compressor.compress(data) + compressor.finish()
+
+
+# The suffix of the ETags of compressed representations, see encoded_etag
+ENCODED_ETAG = re.compile(r'-(gzip|br|zstd)"$')
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """
+    The ETag of the representation compressed with encoding. A strong ETag
+    identifies the exact bytes, so the compressed ones get their own, the ETag
+    with the encoding appended. Weak ETags are kept.
+    """
+    if etag.startswith("W/") or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def decoded_etag(etag: str) -> str:
+    """
+    The ETag of the uncompressed representation, from the ETag of any of its
+    encodings.
+    """
+    return ENCODED_ETAG.sub('"', etag)
+
+
+def negotiate_encoding(accept_encoding: str, encodings: Sequence[str]) -> str | None:
+    """
+    The encoding in Accept-Encoding with the highest q value, ties go to the
+    first one in encodings (the server preference). None if none is accepted.
+    """
+    qualities: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            qualities[name] = quality
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Compress the responses with an allowed content type, whole responses when
+    they have at least minimum_size bytes, streaming responses chunk by chunk.
+
+    levels maps the encodings to use to their compression level, in order of
+    preference.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        levels: dict[str, int],
+        minimum_size: int,
+        content_types: Sequence[str],
+    ):
+        self.app = app
+        self.levels = levels
+        self.minimum_size = minimum_size
+        self.content_types = frozenset(content_types)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+            encoding = negotiate_encoding(accept_encoding, list(self.levels))
+            if encoding:
+                if_none_match = Headers(scope=scope).get("if-none-match", "")
+                responder = CompressionResponder(self, encoding, if_none_match)
+                await self.app(scope, receive, responder.wrap(send))
+                return
+        await self.app(scope, receive, send)
+
+
+class CompressionResponder:
+    def __init__(
+        self, middleware: CompressionMiddleware, encoding: str, if_none_match: str
+    ):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.if_none_match = if_none_match
+        self.start_message: Message = {}
+        # None until the first body message decides if the response is compressed
+        self.compressor: Compressor | None = None
+        self.passthrough = False
+
+    def wrap(self, send: Send) -> Send:
+        async def send_compressed(message: Message) -> None:
+            await self.send(message, send)
+
+        return send_compressed
+
+    def compressible(self, headers: Headers) -> bool:
+        media_type = headers.get("content-type", "").partition(";")[0].strip()
+        return (
+            "content-encoding" not in headers
+            and media_type.lower() in self.middleware.content_types
+        )
+
+    async def send(self, message: Message, send: Send) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            # Held until the first body message, to know the size
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            if message["status"] == 304:
+                self.not_modified_etag(message)
+            self.passthrough = not self.compressible(headers)
+            if self.passthrough:
+                await send(message)
+            return
+        if message_type != "http.response.body" or self.passthrough:
+            await send(message)
+            return
+
+        body: bytes = message.get("body", b"")
+        more_body: bool = message.get("more_body", False)
+        if self.compressor is None:
+            if not more_body and len(body) < self.middleware.minimum_size:
+                self.passthrough = True
+                await send(self.start_message)
+                await send(message)
+                return
+            level = self.middleware.levels[self.encoding]
+            self.compressor = COMPRESSORS[self.encoding](level)
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if "etag" in headers:
+                headers["ETag"] = encoded_etag(headers["etag"], self.encoding)
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                with timed("compress"):
+                    body = self.compressor.compress(body) + self.compressor.finish()
+                headers["Content-Length"] = str(len(body))
+                await send(self.start_message)
+                await send(body_message(message, body))
+                return
+            await send(self.start_message)
+
+        # Streaming: send each chunk as soon as it's compressed
+        with timed("compress"):
+            output = self.compressor.compress(body)
+            output += self.compressor.flush() if more_body else self.compressor.finish()
+        await send(body_message(message, output))
+
+    def not_modified_etag(self, message: Message) -> None:
+        """
+        A 304 has no body to compress, its ETag is the one of the representation
+        the client has: the compressed one's when If-None-Match has it.
+        """
+        headers = MutableHeaders(raw=message["headers"])
+        etag = headers.get("etag")
+        if etag and encoded_etag(etag, self.encoding) in self.if_none_match:
+            headers["ETag"] = encoded_etag(etag, self.encoding)
+
+
+def body_message(message: Message, body: bytes) -> dict[str, Any]:
+    return {**message, "body": body}
@@ -37,6 +37,18 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8
     FRONTEND_HOST: str = "http://localhost:5173"
     ENVIRONMENT: Literal["local", "staging", "production"] = "local"
+    # Larger limit values in list endpoints are lowered to this
+    MAX_PAGE_LIMIT: int = 1000
+    # List endpoints with count_mode=capped stop counting after this many rows
+    MAX_EXACT_COUNT: int = 10_000
+    # Maximum number of items in a single bulk create, update or delete request
+    MAX_BULK_ITEMS: int = 5000
+    # Rows read from the database at a time by the items export
+    EXPORT_BATCH_SIZE: int = 1000
+    # Rows of an items import validated and copied to the database at a time
+    IMPORT_CHUNK_SIZE: int = 10_000
+    # Row errors returned by an items import, the others are only counted
+    MAX_IMPORT_ERRORS: int = 1000
 
     BACKEND_CORS_ORIGINS: Annotated[
         list[AnyUrl] | str, BeforeValidator(parse_cors)
@@ -69,6 +81,128 @@ class Settings(BaseSettings):
             path=self.POSTGRES_DB,
         )
 
+    # Number of worker processes, read by uvicorn / fastapi run for --workers
+    WEB_CONCURRENCY: int = 1
+    # Connections all the workers can open together, keep it below the Postgres
+    # max_connections, leaving room for migrations and admin connections
+    DB_MAX_CONNECTIONS: int = 60
+    # Per worker pool sizes, derived from DB_MAX_CONNECTIONS when not set
+    DB_POOL_SIZE: int | None = None
+    DB_MAX_OVERFLOW: int | None = None
+    DB_POOL_TIMEOUT: float = 30.0
+    # Seconds after which a connection is replaced, -1 to disable
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Per worker pool of the sync engine, only used at startup, by scripts and
+    # the local-only private route, taken from the worker's share of
+    # DB_MAX_CONNECTIONS before the async engine's pool
+    DB_SYNC_POOL_SIZE: int = 1
+    DB_SYNC_MAX_OVERFLOW: int = 2
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def db_worker_connections(self) -> int:
+        """
+        Connections of the async engine's pool of each worker.
+        """
+        share = self.DB_MAX_CONNECTIONS // max(self.WEB_CONCURRENCY, 1)
+        return max(share - self.DB_SYNC_POOL_SIZE - self.DB_SYNC_MAX_OVERFLOW, 1)
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def db_pool_size(self) -> int:
+        if self.DB_POOL_SIZE is not None:
+            return self.DB_POOL_SIZE
+        return max(self.db_worker_connections // 2, 1)
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def db_max_overflow(self) -> int:
+        if self.DB_MAX_OVERFLOW is not None:
+            return self.DB_MAX_OVERFLOW
+        return max(self.db_worker_connections - self.db_pool_size, 0)
+
+    # Cache of the fields used for auth checks (is_active, is_superuser) of the
+    # current user, a change made in another worker is seen after the TTL
+    AUTH_USER_CACHE_ENABLED: bool = True
+    AUTH_USER_CACHE_TTL: float = 30.0
+    AUTH_USER_CACHE_SIZE: int = 10_000
+    # Cache of verified access tokens, each one is kept until it expires
+    TOKEN_CACHE_ENABLED: bool = True
+    TOKEN_CACHE_SIZE: int = 10_000
+    # Cache of the responses of these routes (by operation id) for each caller,
+    # invalidated by the writes of the same worker only: the other workers serve
+    # their stale responses until the TTL. Off by default, enable it with a
+    # single worker (WEB_CONCURRENCY=1) or where responses up to the TTL old are
+    # fine
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_ROUTES: list[str] = [
+        "items-read_item",
+        "items-read_items",
+        "users-read_user_by_id",
+    ]
+    RESPONSE_CACHE_TTL: float = 30.0
+    RESPONSE_CACHE_SIZE: int = 10_000
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # Compress responses for clients that accept it, with the first encoding of
+    # this list they accept. Compare the levels with python -m app.benchmarks.compression
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_ENCODINGS: list[Literal["zstd", "br", "gzip"]] = ["zstd", "br", "gzip"]
+    COMPRESSION_ZSTD_LEVEL: int = 3
+    COMPRESSION_BROTLI_LEVEL: int = 4
+    COMPRESSION_GZIP_LEVEL: int = 6
+    # Smaller responses are sent as they are, streaming ones are always compressed
+    COMPRESSION_MIN_SIZE: int = 1000
+    COMPRESSION_CONTENT_TYPES: list[str] = [
+        "application/json",
+        "application/x-ndjson",
+        "text/csv",
+        "text/html",
+        "text/plain",
+    ]
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def compression_levels(self) -> dict[str, int]:
+        levels = {
+            "zstd": self.COMPRESSION_ZSTD_LEVEL,
+            "br": self.COMPRESSION_BROTLI_LEVEL,
+            "gzip": self.COMPRESSION_GZIP_LEVEL,
+        }
+        return {encoding: levels[encoding] for encoding in self.COMPRESSION_ENCODINGS}
+
+    # Send the time spent in each phase of a request (auth, db, hash, render,
+    # compress) in a Server-Timing header, and log it as a JSON line
+    SERVER_TIMING_ENABLED: bool = False
+
+    # Serve Prometheus metrics at /metrics (request latency and status codes by
+    # operation id, connection pools, thread pool, password hashing). With
+    # METRICS_TOKEN, scrapes need it as a bearer token
+    METRICS_ENABLED: bool = False
+    METRICS_TOKEN: str | None = None
+
+    # Log a warning with the statements of the requests that run more SQL
+    # queries than the budget of their route, by operation id in QUERY_BUDGETS,
+    # QUERY_BUDGET_DEFAULT for the others. The queries of each chunk of an import
+    # are counted apart, with QUERY_BUDGET_IMPORT_CHUNK
+    QUERY_BUDGET_ENABLED: bool = True
+    QUERY_BUDGET_DEFAULT: int = 10
+    QUERY_BUDGETS: dict[str, int] = {}
+    QUERY_BUDGET_IMPORT_CHUNK: int = 1
+
+    # Scheme of new password hashes, hashes with the other scheme or a different
+    # cost are rehashed on the next login
+    PASSWORD_HASH_SCHEME: Literal["bcrypt", "pbkdf2_sha256"] = "bcrypt"
+    # Cost of each scheme, find values for this host with
+    # python -m app.benchmarks.password_hash
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    PASSWORD_PBKDF2_ROUNDS: int = 29_000
+    # Processes per worker used to hash and verify passwords, 0 to use threads
+    PASSWORD_HASH_WORKERS: int = 2
+    # Hashing requests waiting for a process before new ones are rejected (503)
+    PASSWORD_HASH_QUEUE_LIMIT: int = 64
+
     SMTP_TLS: bool = True
     SMTP_SSL: bool = False
     SMTP_PORT: int = 587
@@ -77,6 +211,25 @@ class Settings(BaseSettings):
     SMTP_PASSWORD: str | None = None
     EMAILS_FROM_EMAIL: EmailStr | None = None
     EMAILS_FROM_NAME: EmailStr | None = None
+    SMTP_TIMEOUT: float = 10.0
+    # Emails are sent by a background thread of each worker over one SMTP
+    # connection, closed when no email was sent for SMTP_IDLE_TIMEOUT seconds
+    SMTP_IDLE_TIMEOUT: float = 30.0
+    # Emails waiting to be sent before new ones are rejected (503)
+    EMAILS_QUEUE_SIZE: int = 1000
+    # Emails sent in a row before checking the retries and the idle connection
+    EMAILS_BATCH_SIZE: int = 50
+    # A failed email is sent again after EMAILS_RETRY_DELAY seconds, doubled on
+    # each attempt up to EMAILS_RETRY_MAX_DELAY, and dropped after
+    # EMAILS_MAX_RETRIES retries or on a permanent (5xx) error
+    EMAILS_MAX_RETRIES: int = 5
+    EMAILS_RETRY_DELAY: float = 2.0
+    EMAILS_RETRY_MAX_DELAY: float = 300.0
+    # JSON lines file where the dropped emails are written, with their content
+    # to send them again, they are only logged without it
+    EMAILS_DEAD_LETTER_PATH: str | None = None
+    # Seconds to send the queued emails when a worker stops
+    EMAILS_SHUTDOWN_TIMEOUT: float = 10.0
 
     @model_validator(mode="after")
     def _set_default_emails_from(self) -> Self:
@@ -85,6 +238,18 @@ class Settings(BaseSettings):
         return self
 
     EMAIL_RESET_TOKEN_EXPIRE_HOURS: int = 48
+    # Check if the email templates changed before using them, to edit them
+    # without restarting, by default only when ENVIRONMENT is local
+    EMAIL_TEMPLATES_RELOAD: bool | None = None
+    # Directory of the compiled email templates, shared by the workers and kept
+    # between restarts, a directory in the system temp directory by default
+    EMAIL_TEMPLATES_CACHE_DIR: str | None = None
+
+    @model_validator(mode="after")
+    def _set_default_email_templates_reload(self) -> Self:
+        if self.EMAIL_TEMPLATES_RELOAD is None:
+            self.EMAIL_TEMPLATES_RELOAD = self.ENVIRONMENT == "local"
+        return self
 
     @computed_field  # type: ignore[prop-decorator]
     @property
@@ -116,5 +281,22 @@ class Settings(BaseSettings):
 
         return self
 
+    @model_validator(mode="after")
+    def _check_db_connection_budget(self) -> Self:
+        per_worker = (
+            self.db_pool_size
+            + self.db_max_overflow
+            + self.DB_SYNC_POOL_SIZE
+            + self.DB_SYNC_MAX_OVERFLOW
+        )
+        if per_worker * self.WEB_CONCURRENCY > self.DB_MAX_CONNECTIONS:
+            warnings.warn(
+                f"The connections of the async and sync pools ({per_worker}) times "
+                f"WEB_CONCURRENCY ({self.WEB_CONCURRENCY}) is more than "
+                f"DB_MAX_CONNECTIONS ({self.DB_MAX_CONNECTIONS})",
+                stacklevel=1,
+            )
+        return self
+
 
 settings = Settings()  # type: ignore
@@ -1,10 +1,47 @@
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import Session, create_engine, select
 
 from app import crud
 from app.core.config import settings
+from app.core.pool import TimedAsyncAdaptedQueuePool, TimedQueuePool
+from app.core.queries import count_engine_queries
+from app.core.timing import instrument_engine
 from app.models import User, UserCreate
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+# Pool limits are per worker process, both engines together stay within the
+# worker's share of DB_MAX_CONNECTIONS. The API routes use the async engine, the
+# sync one is mostly idle (startup, scripts, tests) and gets a small fixed pool
+pool_options = {
+    "pool_timeout": settings.DB_POOL_TIMEOUT,
+    "pool_recycle": settings.DB_POOL_RECYCLE,
+    "pool_pre_ping": settings.DB_POOL_PRE_PING,
+}
+
+engine = create_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    poolclass=TimedQueuePool,
+    pool_size=settings.DB_SYNC_POOL_SIZE,
+    max_overflow=settings.DB_SYNC_MAX_OVERFLOW,
+    **pool_options,
+)
+
+# The "postgresql+psycopg" dialect picks psycopg3's async driver when it's used
+# through create_async_engine, so both engines share the same URI
+async_engine = create_async_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    poolclass=TimedAsyncAdaptedQueuePool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    **pool_options,
+)
+
+if settings.SERVER_TIMING_ENABLED:
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
+
+if settings.QUERY_BUDGET_ENABLED:
+    count_engine_queries(engine)
+    count_engine_queries(async_engine.sync_engine)
 
 
 # make sure all SQLModel models are imported (app.models) before initializing DB
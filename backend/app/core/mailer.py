@@ -0,0 +1,336 @@
+"""
+Background email delivery.
+
+The routes queue emails and return, a thread of each worker process sends them
+in batches over an SMTP connection kept open between messages. Failed sends are
+retried with exponential backoff, emails that can't be sent are logged as dead
+letters.
+"""
+
+import heapq
+import itertools
+import json
+import logging
+import queue
+import smtplib
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from email.message import EmailMessage
+from email.utils import formataddr
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.models import MailerStatus
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class OutgoingEmail:
+    email_to: str
+    subject: str
+    html_content: str
+    attempts: int = 0
+
+
+def build_message(email: OutgoingEmail) -> EmailMessage:
+    message = EmailMessage()
+    message["Subject"] = email.subject
+    message["From"] = formataddr(
+        (settings.EMAILS_FROM_NAME or "", settings.EMAILS_FROM_EMAIL or "")
+    )
+    message["To"] = email.email_to
+    message.set_content(email.html_content, subtype="html")
+    return message
+
+
+def smtp_connect() -> smtplib.SMTP:
+    """
+    Open an SMTP connection with the settings, logged in if there's a user.
+    """
+    if not settings.emails_enabled:
+        raise RuntimeError("No provided configuration for email variables")
+    assert settings.SMTP_HOST
+    smtp: smtplib.SMTP
+    if settings.SMTP_SSL and not settings.SMTP_TLS:
+        smtp = smtplib.SMTP_SSL(
+            settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT
+        )
+    else:
+        smtp = smtplib.SMTP(
+            settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT
+        )
+        if settings.SMTP_TLS:
+            smtp.starttls()
+    if settings.SMTP_USER:
+        smtp.login(settings.SMTP_USER, settings.SMTP_PASSWORD or "")
+    return smtp
+
+
+def is_permanent_error(error: Exception) -> bool:
+    """
+    Whether sending again can't work: a 5xx reply of the server, or an error
+    that isn't from SMTP or the network, like missing settings.
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    # SMTPException is an OSError
+    return not isinstance(error, OSError)
+
+
+class Mailer:
+    """
+    Queue of emails sent by a background thread, started on the first email.
+
+    The counters are only updated by the sender thread, except rejected.
+    """
+
+    def __init__(
+        self,
+        *,
+        connect: Callable[[], smtplib.SMTP],
+        queue_size: int,
+        batch_size: int,
+        max_retries: int,
+        retry_delay: float,
+        retry_max_delay: float,
+        idle_timeout: float,
+        dead_letter_path: str | None = None,
+    ) -> None:
+        self.connect = connect
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.retry_max_delay = retry_max_delay
+        self.idle_timeout = idle_timeout
+        self.dead_letter_path = dead_letter_path
+        self.sent = 0
+        self.failed_attempts = 0
+        self.dead_letters = 0
+        self.rejected = 0
+        self.connections = 0
+        # None wakes up the sender thread to stop
+        self._queue: queue.Queue[OutgoingEmail | None] = queue.Queue(maxsize=queue_size)
+        # Emails to send again, by monotonic time of the next attempt
+        self._retries: list[tuple[float, int, OutgoingEmail]] = []
+        self._retry_order = itertools.count()
+        self._smtp: smtplib.SMTP | None = None
+        self._last_sent = 0.0
+        self._thread: threading.Thread | None = None
+        self._stopping = threading.Event()
+        # Emails queued and not sent or dead-lettered yet
+        self._pending = 0
+        self._idle = threading.Condition()
+
+    def send(self, email: OutgoingEmail) -> None:
+        """
+        Queue an email, 503 if the queue is full.
+        """
+        self._start()
+        with self._idle:
+            try:
+                self._queue.put_nowait(email)
+            except queue.Full:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503, detail="Too many emails queued, try again later"
+                )
+            self._pending += 1
+
+    def _start(self) -> None:
+        with self._idle:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="mailer", daemon=True
+                )
+                self._thread.start()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Wait until all the queued emails are sent or dead-lettered.
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def stop(self, timeout: float | None = None) -> None:
+        """
+        Send the queued emails, without waiting for the retry delays, and stop
+        the sender thread.
+        """
+        self._stopping.set()
+        thread = self._thread
+        if thread is None:
+            return
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            # The thread is sending, it checks _stopping before waiting again
+            pass
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning("%s emails not sent before stopping", self._pending)
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            for email in batch:
+                self._deliver(email)
+            if (
+                not batch
+                and self._smtp
+                and (time.monotonic() - self._last_sent > self.idle_timeout)
+            ):
+                self._close()
+        self._close()
+
+    def _next_batch(self) -> list[OutgoingEmail] | None:
+        """
+        The retries that are due and the queued emails, up to batch_size. Waits
+        up to a second for an email, None when stopping with nothing left.
+        """
+        stopping = self._stopping.is_set()
+        now = time.monotonic()
+        batch: list[OutgoingEmail] = []
+        while (
+            self._retries
+            and len(batch) < self.batch_size
+            and (stopping or self._retries[0][0] <= now)
+        ):
+            batch.append(heapq.heappop(self._retries)[2])
+        wait = 1.0
+        if self._retries:
+            wait = min(wait, max(self._retries[0][0] - now, 0.0))
+        while len(batch) < self.batch_size:
+            try:
+                if batch or stopping:
+                    email = self._queue.get_nowait()
+                else:
+                    email = self._queue.get(timeout=wait)
+            except queue.Empty:
+                break
+            if email is None:
+                stopping = True
+            else:
+                batch.append(email)
+        if not batch and stopping:
+            return None
+        return batch
+
+    def _deliver(self, email: OutgoingEmail) -> None:
+        email.attempts += 1
+        try:
+            self._send_message(build_message(email))
+        except Exception as e:
+            self.failed_attempts += 1
+            if (
+                is_permanent_error(e)
+                or email.attempts > self.max_retries
+                or self._stopping.is_set()
+            ):
+                self._dead_letter(email, e)
+                self._done()
+                return
+            delay = min(
+                self.retry_delay * 2 ** (email.attempts - 1), self.retry_max_delay
+            )
+            logger.warning(
+                "Email to %s failed (attempt %s), retrying in %ss: %r",
+                email.email_to,
+                email.attempts,
+                delay,
+                e,
+            )
+            heapq.heappush(
+                self._retries,
+                (time.monotonic() + delay, next(self._retry_order), email),
+            )
+        else:
+            self.sent += 1
+            self._done()
+
+    def _send_message(self, message: EmailMessage) -> None:
+        if self._smtp is not None:
+            try:
+                self._send_on_connection(message)
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                # The server closed the idle connection, send on a new one
+                pass
+        self._smtp = self.connect()
+        self.connections += 1
+        self._send_on_connection(message)
+
+    def _send_on_connection(self, message: EmailMessage) -> None:
+        assert self._smtp
+        try:
+            self._smtp.send_message(message)
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            # Refused by the server, the connection can still be used
+            raise
+        except OSError:
+            self._close()
+            raise
+        self._last_sent = time.monotonic()
+
+    def _close(self) -> None:
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (OSError, smtplib.SMTPException):
+                self._smtp.close()
+            self._smtp = None
+
+    def _done(self) -> None:
+        with self._idle:
+            self._pending -= 1
+            self._idle.notify_all()
+
+    def _dead_letter(self, email: OutgoingEmail, error: Exception) -> None:
+        self.dead_letters += 1
+        logger.error(
+            "Email to %s not sent after %s attempts: %r",
+            email.email_to,
+            email.attempts,
+            error,
+        )
+        if self.dead_letter_path:
+            record = asdict(email) | {
+                "error": repr(error),
+                "time": datetime.now(timezone.utc).isoformat(),
+            }
+            with open(self.dead_letter_path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(record) + "\n")
+
+    def status(self) -> MailerStatus:
+        return MailerStatus(
+            queue_size=self.queue_size,
+            queued=self._queue.qsize(),
+            retrying=len(self._retries),
+            sent=self.sent,
+            failed_attempts=self.failed_attempts,
+            dead_letters=self.dead_letters,
+            rejected=self.rejected,
+            connections=self.connections,
+        )
+
+
+mailer = Mailer(
+    connect=smtp_connect,
+    queue_size=settings.EMAILS_QUEUE_SIZE,
+    batch_size=settings.EMAILS_BATCH_SIZE,
+    max_retries=settings.EMAILS_MAX_RETRIES,
+    retry_delay=settings.EMAILS_RETRY_DELAY,
+    retry_max_delay=settings.EMAILS_RETRY_MAX_DELAY,
+    idle_timeout=settings.SMTP_IDLE_TIMEOUT,
+    dead_letter_path=settings.EMAILS_DEAD_LETTER_PATH,
+)
@@ -0,0 +1,171 @@
+"""
+Prometheus metrics of the backend, served at /metrics when METRICS_ENABLED is set.
+
+With several worker processes, set the PROMETHEUS_MULTIPROC_DIR environment
+variable to an empty directory before they start: each worker writes its
+metrics to files there, and a scrape of any worker returns the totals of all of
+them. The gauges are summed over the live workers.
+"""
+
+import os
+import time
+
+from anyio import to_thread
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy.pool import Pool, QueuePool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+HASH_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+http_requests = Counter(
+    "http_requests_total",
+    "Requests by operation id and status code, errors are the 4xx and 5xx ones",
+    ["operation_id", "method", "status_code"],
+)
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by operation id, until the response is complete",
+    ["operation_id", "method"],
+    buckets=REQUEST_BUCKETS,
+)
+http_requests_in_progress = Gauge(
+    "http_requests_in_progress",
+    "Requests being served",
+    multiprocess_mode="livesum",
+)
+
+db_pool_connections = Gauge(
+    "db_pool_connections",
+    "Connections of the pool, checked out (in use) or checked in (idle)",
+    ["engine", "state"],
+    multiprocess_mode="livesum",
+)
+db_pool_size = Gauge(
+    "db_pool_size",
+    "Connections kept open by the pool, without the overflow ones",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+db_pool_overflow = Gauge(
+    "db_pool_overflow",
+    "Overflow connections open beyond the pool size",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+
+threadpool_threads_busy = Gauge(
+    "threadpool_threads_busy",
+    "Threads of the thread pool running sync routes and dependencies",
+    multiprocess_mode="livesum",
+)
+threadpool_threads_limit = Gauge(
+    "threadpool_threads_limit",
+    "Maximum threads of the thread pool",
+    multiprocess_mode="livesum",
+)
+
+password_hash_duration = Histogram(
+    "password_hash_duration_seconds",
+    "Time spent hashing or verifying a password",
+    buckets=HASH_BUCKETS,
+)
+password_hash_wait = Histogram(
+    "password_hash_wait_seconds",
+    "Time a password hash waited for a free hashing process",
+    buckets=HASH_BUCKETS,
+)
+password_hash_rejected = Counter(
+    "password_hash_rejected_total",
+    "Password hashes refused because the hashing queue was full",
+)
+
+
+def update_runtime_gauges(pools: dict[str, Pool]) -> None:
+    """
+    Set the connection pool and thread pool gauges of this worker process,
+    must be called from the event loop.
+    """
+    for name, pool in pools.items():
+        if isinstance(pool, QueuePool):
+            db_pool_connections.labels(name, "checked_out").set(pool.checkedout())
+            db_pool_connections.labels(name, "checked_in").set(pool.checkedin())
+            db_pool_size.labels(name).set(pool.size())
+            db_pool_overflow.labels(name).set(max(pool.overflow(), 0))
+    limiter = to_thread.current_default_thread_limiter()
+    threadpool_threads_busy.set(limiter.borrowed_tokens)
+    threadpool_threads_limit.set(limiter.total_tokens)
+
+
+def generate_metrics() -> tuple[bytes, str]:
+    """
+    The metrics in the Prometheus text format, of all the workers with
+    PROMETHEUS_MULTIPROC_DIR, and their content type.
+    """
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)  # type: ignore[no-untyped-call]
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead() -> None:
+    """
+    Remove the gauges of this worker process when it exits.
+    """
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())  # type: ignore[no-untyped-call]
+
+
+class MetricsMiddleware:
+    """
+    Count the requests and time them by operation id (or "unmatched" when no
+    route matched, so unknown paths don't add labels), and update the pool
+    and thread pool gauges after each request.
+    """
+
+    def __init__(self, app: ASGIApp, *, pools: dict[str, Pool]) -> None:
+        self.app = app
+        self.pools = pools
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_progress.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_progress.dec()
+            route = scope.get("route")
+            operation_id = getattr(route, "unique_id", None) or "unmatched"
+            method = scope["method"]
+            http_requests.labels(operation_id, method, str(status_code)).inc()
+            http_request_duration.labels(operation_id, method).observe(
+                time.perf_counter() - start
+            )
+            update_runtime_gauges(self.pools)
@@ -0,0 +1,82 @@
+import threading
+import time
+from typing import Any
+
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry, Pool, QueuePool
+
+from app.models import PoolStatus
+
+
+class PoolStats:
+    """
+    Checkout counters for a connection pool, per worker process.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.overflow_max = 0
+
+    def record(self, *, wait: float, overflow: int, timed_out: bool) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.overflow_max = max(self.overflow_max, overflow)
+
+
+class _TimedPoolMixin:
+    # SQLAlchemy has no event before a checkout starts waiting, so time _do_get,
+    # which blocks on the queue (or opens an overflow connection)
+    stats: PoolStats
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        start = time.perf_counter()
+        timed_out = True
+        try:
+            entry: ConnectionPoolEntry = super()._do_get()  # type: ignore[misc]
+            timed_out = False
+            return entry
+        finally:
+            self.stats.record(
+                wait=time.perf_counter() - start,
+                overflow=max(self.overflow(), 0),  # type: ignore[attr-defined]
+                timed_out=timed_out,
+            )
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def get_pool_status(name: str, pool: Pool) -> PoolStatus:
+    assert isinstance(pool, QueuePool) and isinstance(pool, _TimedPoolMixin)
+    stats = pool.stats
+    return PoolStatus(
+        name=name,
+        pool_size=pool.size(),
+        max_overflow=pool._max_overflow,
+        checked_out=pool.checkedout(),
+        checked_in=pool.checkedin(),
+        overflow=max(pool.overflow(), 0),
+        overflow_max=stats.overflow_max,
+        checkouts=stats.checkouts,
+        checkout_timeouts=stats.timeouts,
+        checkout_wait_mean_ms=stats.wait_total * 1000 / max(stats.checkouts, 1),
+        checkout_wait_total_ms=stats.wait_total * 1000,
+        checkout_wait_max_ms=stats.wait_max * 1000,
+    )
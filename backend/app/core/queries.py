@@ -0,0 +1,146 @@
+"""
+Count the SQL queries of each request, to catch the routes that run more than
+they should, e.g. lazy loading a relationship for each row of a list.
+
+QueryCountMiddleware, added when QUERY_BUDGET_ENABLED is set, logs a warning
+with the statements of the requests over the query budget of their route. The
+tests pin the number of queries of every route with the same counts.
+"""
+
+import logging
+from collections import Counter
+from collections.abc import Callable, Generator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+from sqlalchemy import Engine, event
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+
+class QueryLog:
+    """
+    The SQL statements run in a request, or in a capture_queries() block. An
+    executemany (e.g. an ORM flush of several rows) is one statement.
+    """
+
+    __slots__ = ("statements",)
+
+    def __init__(self) -> None:
+        self.statements: list[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def summary(self, limit: int = 10) -> str:
+        """
+        The statements with the number of times they ran, most repeated first.
+        """
+        counts = Counter(self.statements)
+        lines = [
+            f"{times} x {' '.join(statement.split())}"
+            for statement, times in counts.most_common(limit)
+        ]
+        if len(counts) > limit:
+            lines.append(f"... and {len(counts) - limit} other statements")
+        return "\n".join(lines)
+
+
+_query_log: ContextVar[QueryLog | None] = ContextVar("query_log", default=None)
+
+# Called with the operation id (or "unmatched") and the queries of each request
+request_listeners: list[Callable[[str, QueryLog], None]] = []
+
+
+def _before_cursor_execute(
+    _conn: Any, _cursor: Any, statement: str, *_args: Any
+) -> None:
+    log = _query_log.get()
+    if log is not None:
+        log.statements.append(statement)
+
+
+def count_engine_queries(engine: Engine) -> None:
+    """
+    Count the SQL statements run by engine (the sync_engine of an async engine).
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+
+
+@contextmanager
+def capture_queries() -> Generator[QueryLog, None, None]:
+    """
+    Collect the SQL statements run in the block, in the same context (the
+    queries of a request are collected by QueryCountMiddleware).
+    """
+    log = QueryLog()
+    token = _query_log.set(log)
+    try:
+        yield log
+    finally:
+        _query_log.reset(token)
+
+
+@contextmanager
+def chunk_queries(name: str, budget: int) -> Generator[QueryLog, None, None]:
+    """
+    Count the queries of one chunk of a request that works in chunks, e.g. an
+    import, apart from the request's: they grow with the size of its input, so
+    each chunk gets its own budget, the route's budget is for the rest.
+    """
+    with capture_queries() as log:
+        yield log
+    if log.count > budget:
+        logger.warning(
+            "%s chunk ran %d SQL queries, its budget is %d:\n%s",
+            name,
+            log.count,
+            budget,
+            log.summary(),
+        )
+
+
+class QueryCountMiddleware:
+    """
+    Count the SQL queries of each request and log a warning, with the
+    statements, when there are more than the budget of the route's operation id.
+    """
+
+    def __init__(
+        self, app: ASGIApp, *, budgets: dict[str, int], default_budget: int
+    ) -> None:
+        self.app = app
+        self.budgets = budgets
+        self.default_budget = default_budget
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        log = QueryLog()
+        token = _query_log.set(log)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _query_log.reset(token)
+            self.check(scope, log)
+
+    def check(self, scope: Scope, log: QueryLog) -> None:
+        route = scope.get("route")
+        operation_id = getattr(route, "unique_id", None) or "unmatched"
+        for listener in request_listeners:
+            listener(operation_id, log)
+        budget = self.budgets.get(operation_id, self.default_budget)
+        if log.count > budget:
+            logger.warning(
+                "%s %s (%s) ran %d SQL queries, its budget is %d:\n%s",
+                scope["method"],
+                scope["path"],
+                operation_id,
+                log.count,
+                budget,
+                log.summary(),
+            )
@@ -1,16 +1,61 @@
+import asyncio
+import functools
+import hashlib
+import multiprocessing
+import time
+import uuid
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Any
+from typing import Any, TypeVar
 
 import jwt
+from fastapi import HTTPException
 from passlib.context import CryptContext
 
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.core.metrics import (
+    password_hash_duration,
+    password_hash_rejected,
+    password_hash_wait,
+)
+from app.core.timing import add_timing
+from app.models import PasswordHashStatus, TokenPayload
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+PASSWORD_HASH_SCHEMES = ("bcrypt", "pbkdf2_sha256")
+
+
+def create_pwd_context(
+    scheme: str, *, bcrypt_rounds: int, pbkdf2_rounds: int
+) -> CryptContext:
+    # The other schemes are deprecated, they can still verify old hashes. The
+    # min and max rounds make needs_update() true for hashes with another cost
+    return CryptContext(
+        schemes=[scheme, *(s for s in PASSWORD_HASH_SCHEMES if s != scheme)],
+        deprecated="auto",
+        bcrypt__rounds=bcrypt_rounds,
+        bcrypt__min_rounds=bcrypt_rounds,
+        bcrypt__max_rounds=bcrypt_rounds,
+        pbkdf2_sha256__rounds=pbkdf2_rounds,
+        pbkdf2_sha256__min_rounds=pbkdf2_rounds,
+        pbkdf2_sha256__max_rounds=pbkdf2_rounds,
+    )
+
+
+pwd_context = create_pwd_context(
+    settings.PASSWORD_HASH_SCHEME,
+    bcrypt_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    pbkdf2_rounds=settings.PASSWORD_PBKDF2_ROUNDS,
+)
 
 
 ALGORITHM = "HS256"
 
+T = TypeVar("T")
+
 
 def create_access_token(subject: str | Any, expires_delta: timedelta) -> str:
     expire = datetime.now(timezone.utc) + expires_delta
@@ -19,9 +64,203 @@ def create_access_token(subject: str | Any, expires_delta: timedelta) -> str:
     return encoded_jwt
 
 
+@functools.lru_cache(maxsize=4)
+def _key_fingerprint(secret_key: str) -> bytes:
+    return hashlib.sha256(secret_key.encode()).digest()
+
+
+def _token_cache_key(token: str) -> bytes:
+    # The key fingerprint is part of the cache key, so tokens verified with a
+    # previous SECRET_KEY are never found after it changes
+    return hashlib.sha256(
+        _key_fingerprint(settings.SECRET_KEY) + token.encode()
+    ).digest()
+
+
+token_cache: TTLCache[bytes, str] = TTLCache(
+    name="token",
+    maxsize=settings.TOKEN_CACHE_SIZE,
+    ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    enabled=settings.TOKEN_CACHE_ENABLED,
+)
+
+
+def decode_access_token(token: str) -> str | None:
+    """
+    Return the subject of a valid access token, raise InvalidTokenError (or
+    ValidationError for a malformed payload) otherwise.
+    """
+    cache_key = _token_cache_key(token)
+    subject = token_cache.get(cache_key)
+    if subject is not None:
+        return subject
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
+    token_data = TokenPayload(**payload)
+    # Keep it only until the token expires, so an expired token is rejected
+    expires = payload.get("exp")
+    if token_data.sub is not None and isinstance(expires, int | float):
+        ttl = min(expires - time.time(), token_cache.ttl)
+        if ttl > 0:
+            token_cache.set(cache_key, token_data.sub, ttl=ttl)
+    return token_data.sub
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    """
+    Verify a password, also return a new hash when the stored one uses an
+    outdated scheme or cost.
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def _timed_call(func: Callable[..., T], *args: Any) -> tuple[T, float]:
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+class PasswordHashExecutor:
+    """
+    Run password hashing in a pool of processes, so it doesn't hold the GIL of
+    the worker process serving requests.
+
+    All the methods are called from the event loop, so the counters don't need
+    a lock.
+    """
+
+    def __init__(self, *, workers: int, queue_limit: int) -> None:
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor: Executor | None = None
+        self.in_flight = 0
+        self.queued_max = 0
+        self.calls = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.hash_total = 0.0
+
+    def _get_executor(self) -> Executor | None:
+        # Created on first use, in the worker process. Use spawn, forking a
+        # process with an event loop and threads running is not safe
+        if self._executor is None and self.workers > 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    @property
+    def queued(self) -> int:
+        return max(self.in_flight - self.workers, 0)
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        if self.in_flight >= self.workers + self.queue_limit:
+            self.rejected += 1
+            password_hash_rejected.inc()
+            raise HTTPException(
+                status_code=503,
+                detail="Too many password hashing requests, try again later",
+            )
+        loop = asyncio.get_running_loop()
+        # With no processes, run in the default thread pool
+        executor = self._get_executor()
+        self.in_flight += 1
+        self.queued_max = max(self.queued_max, self.queued)
+        start = time.perf_counter()
+        try:
+            result, duration = await loop.run_in_executor(
+                executor, _timed_call, func, *args
+            )
+        except BrokenProcessPool:
+            # A process died, start a new pool for the next calls
+            self._executor = None
+            raise
+        finally:
+            self.in_flight -= 1
+        wait = time.perf_counter() - start - duration
+        add_timing("hash", duration)
+        add_timing("hash_wait", wait)
+        password_hash_duration.observe(duration)
+        password_hash_wait.observe(wait)
+        self.calls += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.hash_total += duration
+        return result
+
+    def status(self) -> PasswordHashStatus:
+        calls = max(self.calls, 1)
+        return PasswordHashStatus(
+            workers=self.workers,
+            queue_limit=self.queue_limit,
+            in_flight=self.in_flight,
+            queued=self.queued,
+            queued_max=self.queued_max,
+            calls=self.calls,
+            rejected=self.rejected,
+            wait_mean_ms=self.wait_total * 1000 / calls,
+            wait_max_ms=self.wait_max * 1000,
+            hash_mean_ms=self.hash_total * 1000 / calls,
+        )
+
+    def shutdown(self) -> None:
+        """
+        Stop the processes once the running hashes are done, at worker exit.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+password_hash_executor = PasswordHashExecutor(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    queue_limit=settings.PASSWORD_HASH_QUEUE_LIMIT,
+)
+
+
+async def async_verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hash_executor.run(
+        verify_password, plain_password, hashed_password
+    )
+
+
+async def async_get_password_hash(password: str) -> str:
+    return await password_hash_executor.run(get_password_hash, password)
+
+
+async def async_verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    return await password_hash_executor.run(
+        verify_and_update_password, plain_password, hashed_password
+    )
+
+
+@dataclass(frozen=True)
+class AuthUser:
+    """
+    The fields of the current user needed for auth decisions.
+    """
+
+    id: uuid.UUID
+    is_active: bool
+    is_superuser: bool
+
+
+auth_user_cache: TTLCache[uuid.UUID, AuthUser] = TTLCache(
+    name="auth_user",
+    maxsize=settings.AUTH_USER_CACHE_SIZE,
+    ttl=settings.AUTH_USER_CACHE_TTL,
+    enabled=settings.AUTH_USER_CACHE_ENABLED,
+)
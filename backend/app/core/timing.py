@@ -0,0 +1,156 @@
+"""
+Time spent in each phase of a request (auth, SQL, password hashing, rendering),
+sent in a Server-Timing header and logged as a JSON line.
+
+The phases are timed with timed(), or add_timing() when the duration is already
+known, they only record something inside a request served by
+ServerTimingMiddleware, added when SERVER_TIMING_ENABLED is set.
+"""
+
+import json
+import logging
+import time
+from contextvars import ContextVar
+from types import TracebackType
+from typing import Any
+
+from sqlalchemy import Engine, event
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTimings:
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        # Seconds and number of timed calls, by phase
+        self.phases: dict[str, list[float]] = {}
+
+    def add(self, phase: str, seconds: float) -> None:
+        totals = self.phases.get(phase)
+        if totals is None:
+            self.phases[phase] = [seconds, 1]
+        else:
+            totals[0] += seconds
+            totals[1] += 1
+
+    def header(self, total: float) -> str:
+        """
+        The Server-Timing header value, durations in milliseconds.
+        """
+        metrics = [
+            f'{phase};dur={seconds * 1000:.2f};desc="{int(count)}"'
+            for phase, (seconds, count) in self.phases.items()
+        ]
+        metrics.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(metrics)
+
+
+_request_timings: ContextVar[RequestTimings | None] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def add_timing(phase: str, seconds: float) -> None:
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+class timed:
+    """
+    Context manager adding the time spent in its block to a phase.
+    """
+
+    __slots__ = ("phase", "timings", "start")
+
+    def __init__(self, phase: str) -> None:
+        self.phase = phase
+
+    def __enter__(self) -> None:
+        self.timings = _request_timings.get()
+        if self.timings is not None:
+            self.start = time.perf_counter()
+
+    def __exit__(
+        self,
+        _exc_type: type[BaseException] | None,
+        _exc: BaseException | None,
+        _tb: TracebackType | None,
+    ) -> None:
+        if self.timings is not None:
+            self.timings.add(self.phase, time.perf_counter() - self.start)
+
+
+def _before_cursor_execute(conn: Any, *_args: Any) -> None:
+    if _request_timings.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn: Any, *_args: Any) -> None:
+    starts = conn.info.get("query_start")
+    if starts:
+        add_timing("db", time.perf_counter() - starts.pop())
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Time the SQL statements run by engine (the sync_engine of an async engine),
+    as the db phase.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class ServerTimingMiddleware:
+    """
+    Collect the phase timings of each request, send them in a Server-Timing
+    header and log them when the response is complete.
+
+    Responses streamed after their headers (like the export) only have the
+    timings up to the first body chunk in the header, the log line has them all.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        status_code = 500
+
+        async def send_with_timings(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    timings.header(time.perf_counter() - timings.start),
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            _request_timings.reset(token)
+            log_timings(scope, status_code, timings)
+
+
+def log_timings(scope: Scope, status_code: int, timings: RequestTimings) -> None:
+    route = scope.get("route")
+    record = {
+        "method": scope["method"],
+        "path": scope["path"],
+        "operation_id": getattr(route, "unique_id", None),
+        "status_code": status_code,
+        "total_ms": round((time.perf_counter() - timings.start) * 1000, 2),
+    }
+    for phase, (seconds, count) in timings.phases.items():
+        record[f"{phase}_ms"] = round(seconds * 1000, 2)
+        record[f"{phase}_count"] = int(count)
+    logger.info(json.dumps(record))
@@ -1,10 +1,49 @@
 import uuid
+from collections.abc import AsyncIterator, Sequence
 from typing import Any
 
-from sqlmodel import Session, select
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    ColumnElement,
+    Row,
+    RowMapping,
+    Select,
+    Update,
+    case,
+    cast,
+    column,
+    delete,
+    insert,
+    inspect,
+    literal,
+    table,
+    update,
+    values,
+)
+from sqlmodel import Session, SQLModel, col, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.core.security import get_password_hash, verify_password
-from app.models import Item, ItemCreate, User, UserCreate, UserUpdate
+from app.core.config import settings
+from app.core.security import (
+    async_get_password_hash,
+    async_verify_and_update_password,
+    auth_user_cache,
+    get_password_hash,
+    verify_and_update_password,
+)
+from app.models import (
+    CountMode,
+    Item,
+    ItemBulkUpdate,
+    ItemCreate,
+    ItemUpdate,
+    User,
+    UserCreate,
+    UserUpdate,
+)
+
+pg_class = table("pg_class", column("oid"), column("reltuples"))
 
 
 def create_user(*, session: Session, user_create: UserCreate) -> User:
@@ -28,6 +67,7 @@ def update_user(*, session: Session, db_user: User, user_in: UserUpdate) -> Any:
     session.add(db_user)
     session.commit()
     session.refresh(db_user)
+    auth_user_cache.delete(db_user.id)
     return db_user
 
 
@@ -37,12 +77,28 @@ def get_user_by_email(*, session: Session, email: str) -> User | None:
     return session_user
 
 
+def rehash_statement(db_user: User, new_hash: str) -> Update:
+    """
+    Store the new hash of a password verified at login. A Core UPDATE, without
+    the row version check and increment of the ORM: concurrent logins can all
+    rehash the same user, and a new hash of the same password doesn't change
+    the user's ETag.
+    """
+    return (
+        update(User).where(col(User.id) == db_user.id).values(hashed_password=new_hash)
+    )
+
+
 def authenticate(*, session: Session, email: str, password: str) -> User | None:
     db_user = get_user_by_email(session=session, email=email)
     if not db_user:
         return None
-    if not verify_password(password, db_user.hashed_password):
+    verified, new_hash = verify_and_update_password(password, db_user.hashed_password)
+    if not verified:
         return None
+    if new_hash:
+        session.exec(rehash_statement(db_user, new_hash))  # type: ignore
+        session.commit()
     return db_user
 
 
@@ -52,3 +108,293 @@ def create_item(*, session: Session, item_in: ItemCreate, owner_id: uuid.UUID) -
     session.commit()
     session.refresh(db_item)
     return db_item
+
+
+# Async versions of the functions above, used by the API routes.
+# Password hashing is CPU bound, it runs in the password hashing process pool
+
+
+async def async_create_user(*, session: AsyncSession, user_create: UserCreate) -> User:
+    hashed_password = await async_get_password_hash(user_create.password)
+    db_obj = User.model_validate(
+        user_create, update={"hashed_password": hashed_password}
+    )
+    session.add(db_obj)
+    await session.commit()
+    await session.refresh(db_obj)
+    return db_obj
+
+
+async def async_update_user(
+    *, session: AsyncSession, db_user: User, user_in: UserUpdate
+) -> Any:
+    user_data = user_in.model_dump(exclude_unset=True)
+    extra_data = {}
+    if "password" in user_data:
+        password = user_data["password"]
+        hashed_password = await async_get_password_hash(password)
+        extra_data["hashed_password"] = hashed_password
+    db_user.sqlmodel_update(user_data, update=extra_data)
+    session.add(db_user)
+    await session.commit()
+    await session.refresh(db_user)
+    auth_user_cache.delete(db_user.id)
+    return db_user
+
+
+async def async_get_user_by_email(*, session: AsyncSession, email: str) -> User | None:
+    statement = select(User).where(User.email == email)
+    session_user = (await session.exec(statement)).first()
+    return session_user
+
+
+async def async_authenticate(
+    *, session: AsyncSession, email: str, password: str
+) -> User | None:
+    db_user = await async_get_user_by_email(session=session, email=email)
+    if not db_user:
+        return None
+    verified, new_hash = await async_verify_and_update_password(
+        password, db_user.hashed_password
+    )
+    if not verified:
+        return None
+    if new_hash:
+        await session.exec(rehash_statement(db_user, new_hash))  # type: ignore
+        await session.commit()
+    return db_user
+
+
+async def async_create_item(
+    *, session: AsyncSession, item_in: ItemCreate, owner_id: uuid.UUID
+) -> Item:
+    db_item = Item.model_validate(item_in, update={"owner_id": owner_id})
+    session.add(db_item)
+    await session.commit()
+    await session.refresh(db_item)
+    return db_item
+
+
+async def async_create_items(
+    *, session: AsyncSession, items_in: list[ItemCreate], owner_id: uuid.UUID
+) -> list[Item]:
+    rows = [
+        Item.model_validate(item_in, update={"owner_id": owner_id}).model_dump()
+        for item_in in items_in
+    ]
+    # A multi-row INSERT ... RETURNING, in the same order as the rows
+    statement = insert(Item).returning(Item, sort_by_parameter_order=True)
+    result = await session.exec(statement, params=rows)  # type: ignore
+    await session.commit()
+    return list(result.scalars().all())
+
+
+async def async_update_items(
+    *, session: AsyncSession, items_in: list[ItemBulkUpdate]
+) -> list[Item]:
+    # Update all the rows in a single UPDATE ... FROM (VALUES ...), each field
+    # has a flag column to only update the fields set in each item
+    fields = list(ItemUpdate.model_fields)
+    item_columns = inspect(Item).columns
+    columns = [column("id", item_columns["id"].type)]
+    for field in fields:
+        columns += [
+            column(field, item_columns[field].type),
+            column(f"set_{field}", Boolean()),
+        ]
+    rows = []
+    for item_in in items_in:
+        row: list[Any] = [item_in.id]
+        for field in fields:
+            row += [getattr(item_in, field), field in item_in.model_fields_set]
+        rows.append(tuple(row))
+    item_values = values(*columns, name="item_values").data(rows)
+    statement = (
+        update(Item)
+        .where(col(Item.id) == item_values.c.id)
+        .values(
+            {
+                field: case(
+                    (item_values.c[f"set_{field}"], item_values.c[field]),
+                    else_=getattr(Item, field),
+                )
+                for field in fields
+            }
+            # Bulk UPDATE statements don't go through the ORM version counter
+            | {"version": col(Item.version) + 1}
+        )
+        .returning(Item)
+        .execution_options(synchronize_session=False)
+    )
+    result = await session.exec(statement)  # type: ignore
+    await session.commit()
+    return list(result.scalars().all())
+
+
+async def async_delete_items(
+    *, session: AsyncSession, ids: list[uuid.UUID]
+) -> dict[uuid.UUID, uuid.UUID]:
+    """
+    Delete the items, return the owner id of each deleted one by item id.
+    """
+    statement = (
+        delete(Item)
+        .where(col(Item.id).in_(ids))
+        .returning(col(Item.id), col(Item.owner_id))
+        .execution_options(synchronize_session=False)
+    )
+    result = await session.exec(statement)  # type: ignore
+    await session.commit()
+    return dict(result.tuples().all())
+
+
+async def async_count(
+    *,
+    session: AsyncSession,
+    model: type[SQLModel],
+    where: ColumnElement[bool] | None = None,
+    mode: CountMode = "exact",
+) -> tuple[int, bool]:
+    """
+    Count the rows of a table, return the count and whether it's exact.
+    """
+    if mode == "exact":
+        statement = select(func.count()).select_from(model)
+        if where is not None:
+            statement = statement.where(where)
+        return (await session.exec(statement)).one(), True
+    cap = settings.MAX_EXACT_COUNT
+    if mode == "estimated" and where is None:
+        # reltuples is updated by VACUUM and ANALYZE, it's -1 before the first
+        # one, fall back to the capped count for small or unanalyzed tables
+        estimate_statement = select(cast(pg_class.c.reltuples, BigInteger)).where(
+            pg_class.c.oid == func.to_regclass(f'"{model.__tablename__}"')
+        )
+        estimate = (await session.exec(estimate_statement)).one()
+        if estimate > cap:
+            return estimate, False
+    rows = select(literal(1)).select_from(model)
+    if where is not None:
+        rows = rows.where(where)
+    rows_subquery = rows.limit(cap + 1).subquery()
+    count = (await session.exec(select(func.count()).select_from(rows_subquery))).one()
+    if count > cap:
+        return cap, False
+    return count, True
+
+
+# Read-only queries of the GET routes: Core selects of the needed columns run on
+# the session's connection, the rows aren't turned into ORM instances or added
+# to the identity map
+
+
+async def async_read_rows(
+    *, session: AsyncSession, statement: Select[Any]
+) -> Sequence[RowMapping]:
+    connection = await session.connection()
+    return (await connection.execute(statement)).mappings().all()
+
+
+async def async_read_page(
+    *,
+    session: AsyncSession,
+    model: type[SQLModel],
+    columns: Sequence[str],
+    where: ColumnElement[bool] | None = None,
+    after_id: uuid.UUID | None = None,
+    skip: int = 0,
+    limit: int,
+) -> Sequence[RowMapping]:
+    """
+    Read the columns of a page of rows ordered by id, the rows after after_id
+    (a cursor) if given, otherwise after skipping skip rows.
+    """
+    model_columns = inspect(model, raiseerr=True).columns
+    statement = select(*(model_columns[name] for name in columns))
+    if where is not None:
+        statement = statement.where(where)
+    if after_id:
+        statement = statement.where(model_columns["id"] > after_id)
+    else:
+        statement = statement.offset(skip)
+    statement = statement.order_by(model_columns["id"]).limit(limit)
+    return await async_read_rows(session=session, statement=statement)
+
+
+async def async_read_by_id(
+    *,
+    session: AsyncSession,
+    model: type[SQLModel],
+    columns: Sequence[str],
+    id: uuid.UUID,
+) -> RowMapping | None:
+    model_columns = inspect(model, raiseerr=True).columns
+    statement = select(*(model_columns[name] for name in columns)).where(
+        model_columns["id"] == id
+    )
+    rows = await async_read_rows(session=session, statement=statement)
+    return rows[0] if rows else None
+
+
+async def async_stream_items(
+    *, session: AsyncSession, owner_id: uuid.UUID | None, batch_size: int
+) -> AsyncIterator[Sequence[Row[Any]]]:
+    """
+    Yield the public columns of the items (of an owner if given) ordered by id,
+    in batches of batch_size rows read from a server side cursor.
+    """
+    statement = select(
+        col(Item.title), col(Item.description), col(Item.id), col(Item.owner_id)
+    ).order_by(col(Item.id))
+    if owner_id is not None:
+        statement = statement.where(col(Item.owner_id) == owner_id)
+    result = await session.stream(statement.execution_options(yield_per=batch_size))
+    async for partition in result.partitions():
+        yield partition
+
+
+item_import = table("item_import", column("title"), column("description"))
+
+
+async def async_copy_items(
+    *,
+    session: AsyncSession,
+    owner_id: uuid.UUID,
+    rows: Sequence[tuple[str, str | None]],
+) -> int:
+    """
+    Create items from (title, description) rows, commits.
+
+    The rows are written with COPY into a temporary staging table, then added to
+    the item table with a single INSERT ... SELECT.
+    """
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    # The psycopg AsyncConnection, in the session's transaction
+    driver_connection = raw_connection.driver_connection
+    assert driver_connection is not None
+    async with driver_connection.cursor() as cursor:
+        # Emptied on each commit, and kept for the next imports on the connection
+        await cursor.execute(
+            "CREATE TEMPORARY TABLE IF NOT EXISTS item_import "
+            "(title VARCHAR(255), description VARCHAR(255)) ON COMMIT DELETE ROWS"
+        )
+        async with cursor.copy(
+            "COPY item_import (title, description) FROM STDIN"
+        ) as copy:
+            for row in rows:
+                await copy.write_row(row)
+    owner_type = inspect(Item).columns["owner_id"].type
+    statement = insert(Item).from_select(
+        ["id", "title", "description", "owner_id"],
+        select(
+            func.gen_random_uuid(),
+            item_import.c.title,
+            item_import.c.description,
+            literal(owner_id, type_=owner_type),
+        ),
+    )
+    await connection.execute(statement)
+    await session.commit()
+    # Every staged row is inserted, or the statement fails
+    return len(rows)
@@ -0,0 +1,168 @@
+"""
+Import items from an NDJSON or CSV file, the same formats as the items export.
+
+Rows are validated against ItemCreate in chunks of IMPORT_CHUNK_SIZE, the valid
+ones are copied to the database and committed chunk by chunk:
+
+    python -m app.importer items.ndjson --owner-email user@example.com
+    python -m app.importer items.csv --format csv --owner-email user@example.com
+"""
+
+import argparse
+import asyncio
+import csv
+import logging
+import uuid
+from collections.abc import Callable, Iterator
+from itertools import islice
+from typing import IO, Any
+
+from pydantic import ValidationError
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app import crud
+from app.core.config import settings
+from app.core.db import async_engine
+from app.core.queries import chunk_queries
+from app.models import ItemCreate, ItemImportError, ItemsFileFormat, ItemsImportResult
+
+logger = logging.getLogger(__name__)
+
+ItemRow = tuple[str, str | None]
+# Rows read, valid rows and errors of a chunk
+ValidatedChunk = tuple[int, list[ItemRow], list[ItemImportError]]
+
+
+def read_records(
+    file: IO[str], file_format: ItemsFileFormat
+) -> Iterator[tuple[int, str | dict[str, Any]]]:
+    """
+    Yield the line number and the record (a JSON line or a CSV row) of each row.
+    """
+    if file_format == "csv":
+        reader = csv.DictReader(file)
+        for record in reader:
+            # The export writes None as an empty value
+            yield reader.line_num, {k: v or None for k, v in record.items()}
+    else:
+        for line_number, line in enumerate(file, start=1):
+            if line.strip():
+                yield line_number, line
+
+
+def format_validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(map(str, e['loc']))}: {e['msg']}" if e["loc"] else e["msg"]
+        for e in error.errors()
+    )
+
+
+def validate_chunk(
+    records: Iterator[tuple[int, str | dict[str, Any]]], size: int
+) -> ValidatedChunk:
+    """
+    Validate the next size records.
+    """
+    count = 0
+    rows: list[ItemRow] = []
+    errors: list[ItemImportError] = []
+    for line, record in islice(records, size):
+        count += 1
+        try:
+            if isinstance(record, str):
+                item = ItemCreate.model_validate_json(record)
+            else:
+                item = ItemCreate.model_validate(record)
+        except ValidationError as e:
+            errors.append(ItemImportError(line=line, detail=format_validation_error(e)))
+        else:
+            rows.append((item.title, item.description))
+    return count, rows, errors
+
+
+async def import_items(
+    *,
+    session: AsyncSession,
+    owner_id: uuid.UUID,
+    file: IO[str],
+    file_format: ItemsFileFormat,
+    on_progress: Callable[[ItemsImportResult], None] | None = None,
+) -> ItemsImportResult:
+    result = ItemsImportResult()
+    records = read_records(file, file_format)
+
+    def validate_next_chunk() -> asyncio.Future[ValidatedChunk]:
+        # Reading and validating is blocking, keep it out of the event loop
+        return asyncio.ensure_future(
+            run_in_threadpool(validate_chunk, records, settings.IMPORT_CHUNK_SIZE)
+        )
+
+    pending = validate_next_chunk()
+    try:
+        while True:
+            count, rows, errors = await pending
+            if not count:
+                break
+            # Validate the next chunk while this one is written to the database
+            pending = validate_next_chunk()
+            if rows:
+                with chunk_queries("Items import", settings.QUERY_BUDGET_IMPORT_CHUNK):
+                    result.imported += await crud.async_copy_items(
+                        session=session, owner_id=owner_id, rows=rows
+                    )
+            update_result(result, count, errors)
+            if on_progress:
+                on_progress(result)
+    finally:
+        # A chunk being validated in a thread can't be cancelled: wait for it,
+        # so the file isn't read anymore once this returns, and drop its result
+        await asyncio.gather(pending, return_exceptions=True)
+    return result
+
+
+def update_result(
+    result: ItemsImportResult, count: int, errors: list[ItemImportError]
+) -> None:
+    result.rows += count
+    result.failed += len(errors)
+    result.errors.extend(errors[: settings.MAX_IMPORT_ERRORS - len(result.errors)])
+    logger.info(
+        "Items import: %s rows read, %s imported, %s failed",
+        result.rows,
+        result.imported,
+        result.failed,
+    )
+
+
+async def import_file(
+    path: str, file_format: ItemsFileFormat, owner_email: str
+) -> ItemsImportResult:
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        owner = await crud.async_get_user_by_email(session=session, email=owner_email)
+        if not owner:
+            raise SystemExit(f"User {owner_email} not found")
+        with open(path, encoding="utf-8", newline="") as file:
+            return await import_items(
+                session=session, owner_id=owner.id, file=file, file_format=file_format
+            )
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--owner-email", required=True)
+    args = parser.parse_args()
+
+    result = asyncio.run(import_file(args.path, args.format, args.owner_email))
+    for error in result.errors:
+        logger.error("Line %s: %s", error.line, error.detail)
+    logger.info(
+        "Imported %s of %s rows, %s failed", result.imported, result.rows, result.failed
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,26 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 import sentry_sdk
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from fastapi.routing import APIRoute
+from sqlalchemy.orm.exc import StaleDataError
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
+from app.api.responses import TimedJSONResponse
+from app.api.routes import metrics
+from app.core.compression import CompressionMiddleware
 from app.core.config import settings
+from app.core.db import async_engine, engine
+from app.core.mailer import mailer
+from app.core.metrics import MetricsMiddleware, mark_process_dead
+from app.core.queries import QueryCountMiddleware
+from app.core.security import password_hash_executor
+from app.core.timing import ServerTimingMiddleware
+from app.utils import load_email_templates
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -14,12 +30,55 @@ def custom_generate_unique_id(route: APIRoute) -> str:
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    await run_in_threadpool(load_email_templates)
+    yield
+    # Send the queued emails before the worker exits
+    await run_in_threadpool(mailer.stop, settings.EMAILS_SHUTDOWN_TIMEOUT)
+    await run_in_threadpool(password_hash_executor.shutdown)
+    mark_process_dead()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
+    default_response_class=TimedJSONResponse,
+    lifespan=lifespan,
 )
 
+
+@app.exception_handler(StaleDataError)
+async def stale_data_error_handler(
+    _request: Request, _exc: StaleDataError
+) -> JSONResponse:
+    # A row was updated by another request between reading and updating it
+    return JSONResponse(
+        status_code=409,
+        content={"detail": "The resource was modified by another request, try again"},
+    )
+
+
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        levels=settings.compression_levels,
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        content_types=settings.COMPRESSION_CONTENT_TYPES,
+    )
+
+if settings.SERVER_TIMING_ENABLED:
+    app.add_middleware(ServerTimingMiddleware)
+
+if settings.QUERY_BUDGET_ENABLED:
+    app.add_middleware(
+        QueryCountMiddleware,
+        budgets=settings.QUERY_BUDGETS,
+        default_budget=settings.QUERY_BUDGET_DEFAULT,
+    )
+
 # Set all CORS enabled origins
 if settings.all_cors_origins:
     app.add_middleware(
@@ -28,6 +87,15 @@ if settings.all_cors_origins:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        # Let the frontend read the ETag to send it back in If-Match
+        expose_headers=["ETag"],
+    )
+
+# Outermost, to time the whole request
+if settings.METRICS_ENABLED:
+    app.add_middleware(
+        MetricsMiddleware, pools={"sync": engine.pool, "async": async_engine.pool}
     )
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
+app.include_router(metrics.router)
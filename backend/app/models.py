@@ -1,7 +1,9 @@
 import uuid
+from typing import Any, Literal
 
 from pydantic import EmailStr
-from sqlmodel import Field, Relationship, SQLModel
+from sqlalchemy.orm import declared_attr
+from sqlmodel import Field, Index, Relationship, SQLModel
 
 
 # Shared properties
@@ -43,7 +45,19 @@ class UpdatePassword(SQLModel):
 class User(UserBase, table=True):
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     hashed_password: str
-    items: list["Item"] = Relationship(back_populates="owner", cascade_delete=True)
+    # Row version, incremented by each ORM update, used for the ETag
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
+    # The database deletes the items of a deleted user (ON DELETE CASCADE), the
+    # ORM doesn't load them to delete them one by one
+    items: list["Item"] = Relationship(
+        back_populates="owner", cascade_delete=True, passive_deletes=True
+    )
+
+    # Updates check the version they read is still the current one, and raise
+    # StaleDataError otherwise
+    @declared_attr.directive
+    def __mapper_args__(cls) -> dict[str, Any]:
+        return {"version_id_col": cls.__table__.c.version}  # type: ignore[attr-defined]
 
 
 # Properties to return via API, id is always required
@@ -53,7 +67,9 @@ class UserPublic(UserBase):
 
 class UsersPublic(SQLModel):
     data: list[UserPublic]
-    count: int
+    count: int | None
+    count_exact: bool = True
+    next_cursor: str | None = None
 
 
 # Shared properties
@@ -72,14 +88,40 @@ class ItemUpdate(ItemBase):
     title: str | None = Field(default=None, min_length=1, max_length=255)  # type: ignore
 
 
+# Properties to receive on bulk item update, fields not set are not updated
+class ItemBulkUpdate(ItemUpdate):
+    id: uuid.UUID
+
+
+class ItemsBulkCreate(SQLModel):
+    data: list[ItemCreate] = Field(min_length=1)
+
+
+class ItemsBulkUpdate(SQLModel):
+    data: list[ItemBulkUpdate]
+
+
+class ItemsBulkDelete(SQLModel):
+    ids: list[uuid.UUID]
+
+
 # Database model, database table inferred from class name
 class Item(ItemBase, table=True):
+    # Serves the owner scoped listing (ordered by id, keyset pagination) and count
+    __table_args__ = (Index("ix_item_owner_id_id", "owner_id", "id"),)
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     owner_id: uuid.UUID = Field(
         foreign_key="user.id", nullable=False, ondelete="CASCADE"
     )
+    # Row version, incremented by each update, used for the ETag
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
     owner: User | None = Relationship(back_populates="items")
 
+    @declared_attr.directive
+    def __mapper_args__(cls) -> dict[str, Any]:
+        return {"version_id_col": cls.__table__.c.version}  # type: ignore[attr-defined]
+
 
 # Properties to return via API, id is always required
 class ItemPublic(ItemBase):
@@ -89,7 +131,104 @@ class ItemPublic(ItemBase):
 
 class ItemsPublic(SQLModel):
     data: list[ItemPublic]
-    count: int
+    count: int | None
+    count_exact: bool = True
+    next_cursor: str | None = None
+
+
+# Connection pool statistics of the current worker process
+class PoolStatus(SQLModel):
+    name: str
+    pool_size: int
+    max_overflow: int
+    checked_out: int
+    checked_in: int
+    overflow: int
+    overflow_max: int
+    checkouts: int
+    checkout_timeouts: int
+    checkout_wait_mean_ms: float
+    checkout_wait_total_ms: float
+    checkout_wait_max_ms: float
+
+
+# Result of each item in a bulk operation, status_code and detail are the ones
+# the single item endpoint would return
+class ItemBulkResult(SQLModel):
+    id: uuid.UUID
+    status_code: int
+    detail: str | None = None
+    item: ItemPublic | None = None
+
+
+class ItemsBulkResults(SQLModel):
+    data: list[ItemBulkResult]
+
+
+# A row of an items import that was not imported, line is the line number in the file
+class ItemImportError(SQLModel):
+    line: int
+    detail: str
+
+
+class ItemsImportResult(SQLModel):
+    rows: int = 0
+    imported: int = 0
+    failed: int = 0
+    # Only the first MAX_IMPORT_ERRORS errors
+    errors: list[ItemImportError] = []
+
+
+# Password hashing executor statistics of the current worker process
+class PasswordHashStatus(SQLModel):
+    workers: int
+    queue_limit: int
+    in_flight: int
+    queued: int
+    queued_max: int
+    calls: int
+    rejected: int
+    wait_mean_ms: float
+    wait_max_ms: float
+    hash_mean_ms: float
+
+
+# Email queue statistics of the current worker process
+class MailerStatus(SQLModel):
+    queue_size: int
+    queued: int
+    retrying: int
+    sent: int
+    failed_attempts: int
+    dead_letters: int
+    rejected: int
+    connections: int
+
+
+# In process cache statistics of the current worker process
+class CacheStatus(SQLModel):
+    name: str
+    enabled: bool
+    size: int
+    maxsize: int
+    ttl: float
+    hits: int
+    misses: int
+    hit_ratio: float
+    # Size of the cached values, for the caches that track it
+    memory_bytes: int | None = None
+    max_memory_bytes: int | None = None
+
+
+# How list endpoints count the total rows:
+# exact: count all the rows
+# capped: count up to MAX_EXACT_COUNT rows, the count is not exact above that
+# estimated: use the table statistics, only when not filtering and the table
+# is bigger than MAX_EXACT_COUNT rows, capped otherwise
+CountMode = Literal["exact", "capped", "estimated"]
+
+# Formats of the items export and import files, newline delimited JSON or CSV
+ItemsFileFormat = Literal["ndjson", "csv"]
 
 
 # Generic message
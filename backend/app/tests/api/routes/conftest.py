@@ -0,0 +1,68 @@
+from collections.abc import Generator
+from pathlib import Path
+
+import pytest
+
+from app.core.security import auth_user_cache
+from app.tests.utils.queries import (
+    RequestQueries,
+    assert_exact_query_counts,
+    assert_pinned_query_counts,
+    record_request_queries,
+    update_query_maxima,
+)
+
+ROUTE_TESTS_DIR = Path(__file__).parent
+deselected_tests = False
+
+
+def pytest_deselected(items: list[pytest.Item]) -> None:
+    global deselected_tests
+    deselected_tests = deselected_tests or bool(items)
+
+
+def ran_all_route_tests(session: pytest.Session) -> bool:
+    """
+    Whether all the route tests ran and passed, so the most queries run by each
+    route are the ones of the full tests.
+    """
+    modules = {
+        item.path for item in session.items if item.path.parent == ROUTE_TESTS_DIR
+    }
+    return (
+        not deselected_tests
+        and session.testsfailed == 0
+        and modules == set(ROUTE_TESTS_DIR.glob("test_*.py"))
+    )
+
+
+@pytest.fixture(scope="session")
+def route_query_maxima(
+    request: pytest.FixtureRequest,
+) -> Generator[dict[str, int], None, None]:
+    maxima: dict[str, int] = {}
+    yield maxima
+    if ran_all_route_tests(request.session):
+        assert_exact_query_counts(maxima)
+
+
+@pytest.fixture
+def request_queries() -> Generator[RequestQueries, None, None]:
+    with record_request_queries() as requests:
+        yield requests
+
+
+@pytest.fixture(autouse=True)
+def pinned_query_counts(
+    request_queries: RequestQueries, route_query_maxima: dict[str, int]
+) -> Generator[None, None, None]:
+    """
+    Fail the route tests whose requests run more SQL queries than pinned in
+    ROUTE_QUERY_COUNTS, and a full run of them when a route never runs as many.
+    Each test starts with an empty auth user cache, so that the counts don't
+    depend on the tests run before.
+    """
+    auth_user_cache.clear()
+    yield
+    assert_pinned_query_counts(request_queries)
+    update_query_maxima(route_query_maxima, request_queries)
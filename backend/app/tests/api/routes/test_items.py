@@ -1,10 +1,18 @@
+import csv
+import json
 import uuid
+from unittest.mock import patch
 
+import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session
 
+from app import crud
 from app.core.config import settings
+from app.models import ItemCreate
 from app.tests.utils.item import create_random_item
+from app.tests.utils.user import create_user_with_headers
+from app.tests.utils.utils import random_lower_string
 
 
 def test_create_item(
@@ -40,6 +48,77 @@ def test_read_item(
     assert content["owner_id"] == str(item.owner_id)
 
 
+def test_read_item_etag(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    url = f"{settings.API_V1_STR}/items/{item.id}"
+    response = client.get(url, headers=superuser_token_headers)
+    etag = response.headers["etag"]
+
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        response = client.get(
+            url, headers={**superuser_token_headers, "If-None-Match": if_none_match}
+        )
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        assert response.content == b""
+
+    client.put(url, headers=superuser_token_headers, json={"title": "Updated"})
+    response = client.get(
+        url, headers={**superuser_token_headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["title"] == "Updated"
+
+
+@pytest.mark.usefixtures("enable_response_cache")
+def test_read_item_cached(client: TestClient, db: Session) -> None:
+    user, headers = create_user_with_headers(client, db)
+    item = crud.create_item(
+        session=db, item_in=ItemCreate(title="Cached"), owner_id=user.id
+    )
+    url = f"{settings.API_V1_STR}/items/{item.id}"
+    items_url = f"{settings.API_V1_STR}/items/"
+    response = client.get(url, headers=headers)
+    assert response.json()["title"] == "Cached"
+    assert client.get(items_url, headers=headers).json()["count"] == 1
+
+    # Changes that skip the API aren't seen until the entries expire
+    item.title = "Changed"
+    db.add(item)
+    db.commit()
+    cached = client.get(url, headers=headers)
+    assert cached.json()["title"] == "Cached"
+    assert cached.headers["etag"] == response.headers["etag"]
+
+    # Writes through the API invalidate the item and the lists
+    client.put(url, headers=headers, json={"description": "Updated"})
+    content = client.get(url, headers=headers).json()
+    assert content["title"] == "Changed"
+    assert content["description"] == "Updated"
+    client.post(items_url, headers=headers, json={"title": "New"})
+    assert client.get(items_url, headers=headers).json()["count"] == 2
+    client.delete(url, headers=headers)
+    assert client.get(url, headers=headers).status_code == 404
+
+
+@pytest.mark.usefixtures("enable_response_cache")
+def test_read_item_cached_per_caller(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    normal_user_token_headers: dict[str, str],
+    db: Session,
+) -> None:
+    item = create_random_item(db)
+    url = f"{settings.API_V1_STR}/items/{item.id}"
+    assert client.get(url, headers=superuser_token_headers).status_code == 200
+    # The response cached for the superuser isn't used for other users
+    response = client.get(url, headers=normal_user_token_headers)
+    assert response.status_code == 400
+
+
 def test_read_item_not_found(
     client: TestClient, superuser_token_headers: dict[str, str]
 ) -> None:
@@ -79,6 +158,268 @@ def test_read_items(
     assert len(content["data"]) >= 2
 
 
+def test_read_items_etag(client: TestClient, db: Session) -> None:
+    user, headers = create_user_with_headers(client, db)
+    item = crud.create_item(
+        session=db, item_in=ItemCreate(title="First"), owner_id=user.id
+    )
+    url = f"{settings.API_V1_STR}/items/"
+    etag = client.get(url, headers=headers).headers["etag"]
+
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+
+    # Updating an item on the page changes its ETag
+    client.put(f"{url}{item.id}", headers=headers, json={"title": "Updated"})
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    updated_etag = response.headers["etag"]
+    assert updated_etag != etag
+
+    # So does a new item
+    client.post(url, headers=headers, json={"title": "Second"})
+    response = client.get(url, headers={**headers, "If-None-Match": updated_etag})
+    assert response.status_code == 200
+    assert len(response.json()["data"]) == 2
+
+
+def test_read_items_cursor(client: TestClient, db: Session) -> None:
+    user, headers = create_user_with_headers(client, db)
+    for _ in range(3):
+        item_in = ItemCreate(title=random_lower_string())
+        crud.create_item(session=db, item_in=item_in, owner_id=user.id)
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/", headers=headers, params={"limit": 2}
+    )
+    first_page = response.json()
+    assert len(first_page["data"]) == 2
+    assert first_page["count"] == 3
+    assert first_page["next_cursor"]
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=headers,
+        params={"limit": 2, "cursor": first_page["next_cursor"]},
+    )
+    second_page = response.json()
+    assert len(second_page["data"]) == 1
+    assert second_page["next_cursor"] is None
+    ids = [item["id"] for item in first_page["data"] + second_page["data"]]
+    assert ids == sorted(ids, key=uuid.UUID)
+    assert len(set(ids)) == 3
+
+
+def test_read_items_count_modes(client: TestClient, db: Session) -> None:
+    user, headers = create_user_with_headers(client, db)
+    for _ in range(3):
+        item_in = ItemCreate(title=random_lower_string())
+        crud.create_item(session=db, item_in=item_in, owner_id=user.id)
+    url = f"{settings.API_V1_STR}/items/"
+
+    content = client.get(url, headers=headers, params={"include_count": False}).json()
+    assert content["count"] is None
+    assert len(content["data"]) == 3
+
+    content = client.get(url, headers=headers, params={"count_mode": "capped"}).json()
+    assert content["count"] == 3
+    assert content["count_exact"] is True
+
+    with patch("app.core.config.settings.MAX_EXACT_COUNT", 2):
+        for count_mode in ("capped", "estimated"):
+            content = client.get(
+                url, headers=headers, params={"count_mode": count_mode}
+            ).json()
+            assert content["count"] == 2
+            assert content["count_exact"] is False
+
+
+def test_read_items_estimated_count(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    create_random_item(db)
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=superuser_token_headers,
+        params={"count_mode": "estimated"},
+    )
+    content = response.json()
+    # Small tables are counted, capped at MAX_EXACT_COUNT
+    assert response.status_code == 200
+    assert content["count"] >= 1
+    assert content["count_exact"] is True
+
+
+def test_read_items_invalid_cursor(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=superuser_token_headers,
+        params={"cursor": "invalid"},
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_read_items_invalid_limit(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    # A page needs at least one row to build its next_cursor from
+    for params in ({"limit": 0}, {"limit": -1}, {"skip": -1}):
+        response = client.get(
+            f"{settings.API_V1_STR}/items/",
+            headers=superuser_token_headers,
+            params=params,
+        )
+        assert response.status_code == 422
+
+
+def test_read_items_max_limit(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    create_random_item(db)
+    create_random_item(db)
+    with patch("app.core.config.settings.MAX_PAGE_LIMIT", 1):
+        response = client.get(
+            f"{settings.API_V1_STR}/items/",
+            headers=superuser_token_headers,
+            params={"limit": 1000},
+        )
+    assert response.status_code == 200
+    assert len(response.json()["data"]) == 1
+
+
+def test_read_items_fields(client: TestClient, db: Session) -> None:
+    user, headers = create_user_with_headers(client, db)
+    item = crud.create_item(
+        session=db, item_in=ItemCreate(title="Sparse"), owner_id=user.id
+    )
+    url = f"{settings.API_V1_STR}/items/"
+    full = client.get(url, headers=headers)
+    assert full.json()["data"] == [
+        {
+            "title": "Sparse",
+            "description": None,
+            "id": str(item.id),
+            "owner_id": str(user.id),
+        }
+    ]
+
+    sparse = client.get(url, headers=headers, params={"fields": "title, id"})
+    assert sparse.status_code == 200
+    assert sparse.json()["data"] == [{"title": "Sparse", "id": str(item.id)}]
+    assert sparse.json()["count"] == 1
+    assert sparse.headers["etag"] != full.headers["etag"]
+
+    for fields in ("title,hashed_password", "version", ","):
+        r = client.get(url, headers=headers, params={"fields": fields})
+        assert r.status_code == 400
+        assert r.json()["detail"].startswith("Invalid fields")
+
+
+def test_export_items_ndjson(client: TestClient, db: Session) -> None:
+    user, headers = create_user_with_headers(client, db)
+    for _ in range(5):
+        item_in = ItemCreate(title=random_lower_string(), description='a, "b"')
+        crud.create_item(session=db, item_in=item_in, owner_id=user.id)
+    create_random_item(db)
+
+    with patch.object(settings, "EXPORT_BATCH_SIZE", 2):
+        response = client.get(f"{settings.API_V1_STR}/items/export", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    page = client.get(f"{settings.API_V1_STR}/items/", headers=headers).json()
+    assert exported == page["data"]
+    assert len(exported) == 5
+
+
+def test_export_items_csv(client: TestClient, db: Session) -> None:
+    user, headers = create_user_with_headers(client, db)
+    item_in = ItemCreate(title="Title, with comma", description=None)
+    item = crud.create_item(session=db, item_in=item_in, owner_id=user.id)
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/export",
+        headers=headers,
+        params={"format": "csv"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(response.text.splitlines()))
+    assert rows == [
+        ["title", "description", "id", "owner_id"],
+        ["Title, with comma", "", str(item.id), str(user.id)],
+    ]
+
+
+def test_import_items_ndjson(client: TestClient, db: Session) -> None:
+    _, headers = create_user_with_headers(client, db)
+    lines = [
+        json.dumps({"title": "First", "description": "Imported"}),
+        "",
+        json.dumps({"title": ""}),
+        "not json",
+        json.dumps({"title": "Second", "id": str(uuid.uuid4())}),
+        json.dumps({"title": "Third"}),
+    ]
+
+    with patch.object(settings, "IMPORT_CHUNK_SIZE", 2):
+        response = client.post(
+            f"{settings.API_V1_STR}/items/import",
+            headers=headers,
+            files={"file": ("items.ndjson", "\n".join(lines))},
+        )
+    assert response.status_code == 200
+    result = response.json()
+    assert result["rows"] == 5
+    assert result["imported"] == 3
+    assert result["failed"] == 2
+    assert [error["line"] for error in result["errors"]] == [3, 4]
+    assert result["errors"][0]["detail"].startswith("title:")
+
+    items = client.get(f"{settings.API_V1_STR}/items/", headers=headers).json()
+    assert sorted(item["title"] for item in items["data"]) == [
+        "First",
+        "Second",
+        "Third",
+    ]
+
+
+def test_import_items_csv_export_round_trip(client: TestClient, db: Session) -> None:
+    _, source_headers = create_user_with_headers(client, db)
+    _, target_headers = create_user_with_headers(client, db)
+    for description in ("Line, with comma\nand newline", None, '"Quoted"'):
+        client.post(
+            f"{settings.API_V1_STR}/items/",
+            headers=source_headers,
+            json={"title": random_lower_string(), "description": description},
+        )
+    url = f"{settings.API_V1_STR}/items/export"
+    exported = client.get(url, headers=source_headers, params={"format": "csv"})
+
+    response = client.post(
+        f"{settings.API_V1_STR}/items/import",
+        headers=target_headers,
+        params={"format": "csv"},
+        files={"file": ("items.csv", exported.content)},
+    )
+    assert response.status_code == 200
+    assert response.json() == {"rows": 3, "imported": 3, "failed": 0, "errors": []}
+
+    def titles_and_descriptions(headers: dict[str, str]) -> list[tuple[str, str]]:
+        r = client.get(url, headers=headers)
+        return sorted(
+            (item["title"], item["description"])
+            for item in map(json.loads, r.text.splitlines())
+        )
+
+    assert titles_and_descriptions(target_headers) == titles_and_descriptions(
+        source_headers
+    )
+
+
 def test_update_item(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -97,6 +438,61 @@ def test_update_item(
     assert content["owner_id"] == str(item.owner_id)
 
 
+def test_update_item_if_match(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    url = f"{settings.API_V1_STR}/items/{item.id}"
+    etag = client.get(url, headers=superuser_token_headers).headers["etag"]
+
+    response = client.put(
+        url,
+        headers={**superuser_token_headers, "If-Match": etag},
+        json={"title": "First update"},
+    )
+    assert response.status_code == 200
+    new_etag = response.headers["etag"]
+    assert new_etag != etag
+    assert client.get(url, headers=superuser_token_headers).headers["etag"] == new_etag
+
+    # The item changed since etag was read
+    response = client.put(
+        url,
+        headers={**superuser_token_headers, "If-Match": etag},
+        json={"title": "Second update"},
+    )
+    assert response.status_code == 412
+    response = client.get(url, headers=superuser_token_headers)
+    assert response.json()["title"] == "First update"
+
+
+def test_compressed_item_etags(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    for _ in range(10):
+        item = create_random_item(db)
+    url = f"{settings.API_V1_STR}/items/"
+    headers = {**superuser_token_headers, "Accept-Encoding": "gzip"}
+    response = client.get(url, headers=headers)
+    assert response.headers["content-encoding"] == "gzip"
+    etag = response.headers["etag"]
+    assert etag.endswith('-gzip"')
+
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+    # The ETag of the item, as the one of a compressed response of it
+    item_url = f"{settings.API_V1_STR}/items/{item.id}"
+    item_etag = client.get(item_url, headers=headers).headers["etag"]
+    response = client.put(
+        item_url,
+        headers={**headers, "If-Match": f'{item_etag[:-1]}-gzip"'},
+        json={"title": "Updated"},
+    )
+    assert response.status_code == 200
+
+
 def test_update_item_not_found(
     client: TestClient, superuser_token_headers: dict[str, str]
 ) -> None:
@@ -162,3 +558,116 @@ def test_delete_item_not_enough_permissions(
     assert response.status_code == 400
     content = response.json()
     assert content["detail"] == "Not enough permissions"
+
+
+def test_create_items_bulk(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    data = {"data": [{"title": f"Bulk {i}", "description": "Bulk"} for i in range(3)]}
+    response = client.post(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=normal_user_token_headers,
+        json=data,
+    )
+    assert response.status_code == 200
+    results = response.json()["data"]
+    assert [result["status_code"] for result in results] == [200, 200, 200]
+    assert [result["item"]["title"] for result in results] == [
+        "Bulk 0",
+        "Bulk 1",
+        "Bulk 2",
+    ]
+    assert all(result["id"] == result["item"]["id"] for result in results)
+
+
+def test_create_items_bulk_too_many(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    data = {"data": [{"title": "Bulk"}, {"title": "Bulk"}]}
+    with patch("app.core.config.settings.MAX_BULK_ITEMS", 1):
+        response = client.post(
+            f"{settings.API_V1_STR}/items/bulk",
+            headers=normal_user_token_headers,
+            json=data,
+        )
+    assert response.status_code == 413
+
+
+def test_create_items_bulk_empty(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    response = client.post(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=normal_user_token_headers,
+        json={"data": []},
+    )
+    assert response.status_code == 422
+
+
+def test_update_items_bulk(client: TestClient, db: Session) -> None:
+    user, headers = create_user_with_headers(client, db)
+    own_items = [
+        crud.create_item(
+            session=db,
+            item_in=ItemCreate(title="Title", description="Description"),
+            owner_id=user.id,
+        )
+        for _ in range(2)
+    ]
+    other_item = create_random_item(db)
+    missing_id = uuid.uuid4()
+    data = {
+        "data": [
+            {"id": str(own_items[0].id), "title": "Updated title"},
+            {"id": str(own_items[1].id), "description": None},
+            {"id": str(other_item.id), "title": "Updated title"},
+            {"id": str(missing_id), "title": "Updated title"},
+        ]
+    }
+    response = client.put(
+        f"{settings.API_V1_STR}/items/bulk", headers=headers, json=data
+    )
+    assert response.status_code == 200
+    results = response.json()["data"]
+    assert [result["status_code"] for result in results] == [200, 200, 400, 404]
+    assert results[0]["item"]["title"] == "Updated title"
+    assert results[0]["item"]["description"] == "Description"
+    assert results[1]["item"]["title"] == "Title"
+    assert results[1]["item"]["description"] is None
+    assert results[2]["detail"] == "Not enough permissions"
+    assert results[3]["detail"] == "Item not found"
+    db.refresh(other_item)
+    assert other_item.title != "Updated title"
+
+
+def test_update_items_bulk_duplicate_ids(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    data = {"data": [{"id": str(item.id)}, {"id": str(item.id)}]}
+    response = client.put(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=superuser_token_headers,
+        json=data,
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Duplicate item ids"
+
+
+def test_delete_items_bulk(client: TestClient, db: Session) -> None:
+    user, headers = create_user_with_headers(client, db)
+    own_item = crud.create_item(
+        session=db, item_in=ItemCreate(title="Title"), owner_id=user.id
+    )
+    other_item = create_random_item(db)
+    response = client.request(
+        "DELETE",
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=headers,
+        json={"ids": [str(own_item.id), str(other_item.id), str(uuid.uuid4())]},
+    )
+    assert response.status_code == 200
+    results = response.json()["data"]
+    assert [result["status_code"] for result in results] == [200, 400, 404]
+    response = client.get(f"{settings.API_V1_STR}/items/{own_item.id}", headers=headers)
+    assert response.status_code == 404
@@ -1,10 +1,11 @@
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch
 
 from fastapi.testclient import TestClient
 from sqlmodel import Session
 
 from app.core.config import settings
-from app.core.security import verify_password
+from app.core.security import create_pwd_context, pwd_context, verify_password
 from app.crud import create_user
 from app.models import UserCreate
 from app.tests.utils.user import user_authentication_headers
@@ -49,6 +50,7 @@ def test_recovery_password(
     client: TestClient, normal_user_token_headers: dict[str, str]
 ) -> None:
     with (
+        patch("app.core.mailer.mailer.send", return_value=None) as send,
         patch("app.core.config.settings.SMTP_HOST", "smtp.example.com"),
         patch("app.core.config.settings.SMTP_USER", "admin@example.com"),
     ):
@@ -59,6 +61,7 @@ def test_recovery_password(
         )
         assert r.status_code == 200
         assert r.json() == {"message": "Password recovery email sent"}
+        send.assert_called_once()
 
 
 def test_recovery_password_user_not_exits(
@@ -116,3 +119,61 @@ def test_reset_password_invalid_token(
     assert "detail" in response
     assert r.status_code == 400
     assert response["detail"] == "Invalid token"
+
+
+def test_login_rehash_outdated_password_hash(client: TestClient, db: Session) -> None:
+    email = random_email()
+    password = random_lower_string()
+    user = create_user(
+        session=db, user_create=UserCreate(email=email, password=password)
+    )
+    old_context = create_pwd_context(
+        "pbkdf2_sha256", bcrypt_rounds=4, pbkdf2_rounds=1000
+    )
+    user.hashed_password = old_context.hash(password)
+    db.add(user)
+    db.commit()
+
+    r = client.post(
+        f"{settings.API_V1_STR}/login/access-token",
+        data={"username": email, "password": password},
+    )
+    assert r.status_code == 200
+    db.refresh(user)
+    assert not pwd_context.needs_update(user.hashed_password)
+    assert verify_password(password, user.hashed_password)
+
+
+def test_concurrent_logins_rehash_outdated_password_hash(
+    client: TestClient, db: Session
+) -> None:
+    email = random_email()
+    password = random_lower_string()
+    user = create_user(
+        session=db, user_create=UserCreate(email=email, password=password)
+    )
+    old_context = create_pwd_context(
+        "pbkdf2_sha256", bcrypt_rounds=4, pbkdf2_rounds=1000
+    )
+    user.hashed_password = old_context.hash(password)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    version = user.version
+
+    def login() -> int:
+        r = client.post(
+            f"{settings.API_V1_STR}/login/access-token",
+            data={"username": email, "password": password},
+        )
+        return r.status_code
+
+    # All of them read the outdated hash and store a new one
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        status_codes = list(executor.map(lambda _: login(), range(4)))
+    assert status_codes == [200] * 4
+    db.refresh(user)
+    assert not pwd_context.needs_update(user.hashed_password)
+    assert verify_password(password, user.hashed_password)
+    # A new hash of the same password isn't a change of the user (its ETag)
+    assert user.version == version
@@ -0,0 +1,35 @@
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+
+
+def test_metrics_disabled(client: TestClient) -> None:
+    with patch("app.core.config.settings.METRICS_ENABLED", False):
+        r = client.get("/metrics")
+    assert r.status_code == 404
+
+
+def test_metrics(client: TestClient) -> None:
+    client.get(f"{settings.API_V1_STR}/utils/health-check/")
+    with patch("app.core.config.settings.METRICS_ENABLED", True):
+        r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    assert 'db_pool_size{engine="async"}' in r.text
+    assert "threadpool_threads_limit" in r.text
+    assert "password_hash_duration_seconds_bucket" in r.text
+
+
+def test_metrics_token(client: TestClient) -> None:
+    with (
+        patch("app.core.config.settings.METRICS_ENABLED", True),
+        patch("app.core.config.settings.METRICS_TOKEN", "metrics-token"),
+    ):
+        r = client.get("/metrics")
+        assert r.status_code == 401
+        r = client.get("/metrics", headers={"Authorization": "Bearer wrong"})
+        assert r.status_code == 401
+        r = client.get("/metrics", headers={"Authorization": "Bearer metrics-token"})
+        assert r.status_code == 200
@@ -0,0 +1,123 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app import crud
+from app.core.config import settings
+from app.main import app
+from app.models import Item, ItemCreate
+from app.tests.utils.queries import (
+    ROUTE_QUERY_COUNTS,
+    RequestQueries,
+    assert_exact_query_counts,
+    assert_query_count,
+)
+from app.tests.utils.user import create_user_with_headers
+
+
+def test_every_route_has_a_query_count() -> None:
+    operation_ids = {
+        route.unique_id for route in app.routes if isinstance(route, APIRoute)
+    }
+    assert operation_ids - ROUTE_QUERY_COUNTS.keys() == set()
+    assert ROUTE_QUERY_COUNTS.keys() - operation_ids == {"unmatched"}
+
+
+def test_stale_query_count_is_reported() -> None:
+    pinned = ROUTE_QUERY_COUNTS["items-read_item"]
+    assert_exact_query_counts({"items-read_item": pinned})
+    # A route that runs fewer queries than pinned
+    with pytest.raises(
+        AssertionError, match=f"items-read_item: 1 \\(pinned {pinned}\\)"
+    ):
+        assert_exact_query_counts({"items-read_item": 1})
+
+
+def test_read_items_queries_dont_grow_with_items(
+    client: TestClient, db: Session, request_queries: RequestQueries
+) -> None:
+    user, headers = create_user_with_headers(client, db)
+    url = f"{settings.API_V1_STR}/items/"
+    crud.create_item(session=db, item_in=ItemCreate(title="First"), owner_id=user.id)
+    # The first request also reads the user for the auth checks
+    client.get(url, headers=headers)
+    request_queries.clear()
+    r = client.get(url, headers=headers, params={"limit": 50})
+    assert len(r.json()["data"]) == 1
+
+    for i in range(5):
+        crud.create_item(
+            session=db, item_in=ItemCreate(title=f"Item {i}"), owner_id=user.id
+        )
+    # Another limit, not to get the cached response
+    r = client.get(url, headers=headers, params={"limit": 51})
+    assert len(r.json()["data"]) == 6
+
+    (_, one_item), (_, six_items) = request_queries
+    assert_query_count(six_items, one_item.count)
+
+
+def test_import_items_queries_dont_grow_with_chunks(
+    client: TestClient, db: Session, request_queries: RequestQueries
+) -> None:
+    _, headers = create_user_with_headers(client, db)
+    url = f"{settings.API_V1_STR}/items/import"
+
+    def import_rows(rows: int) -> None:
+        content = "\n".join(json.dumps({"title": f"Item {i}"}) for i in range(rows))
+        with patch.object(settings, "IMPORT_CHUNK_SIZE", 1):
+            r = client.post(
+                url, headers=headers, files={"file": ("items.ndjson", content)}
+            )
+        assert r.json()["imported"] == rows
+
+    # The first request also reads the user for the auth checks
+    import_rows(1)
+    request_queries.clear()
+    import_rows(1)
+    import_rows(5)
+
+    # The queries of each chunk have their own budget
+    (_, one_chunk), (_, five_chunks) = request_queries
+    assert_query_count(five_chunks, one_chunk.count)
+
+
+def test_delete_user_me_with_items(
+    client: TestClient, db: Session, request_queries: RequestQueries
+) -> None:
+    user, headers = create_user_with_headers(client, db)
+    user_id = user.id
+    for i in range(3):
+        crud.create_item(
+            session=db, item_in=ItemCreate(title=f"Item {i}"), owner_id=user_id
+        )
+    request_queries.clear()
+
+    r = client.delete(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.status_code == 200
+    # The user is read and deleted, the database deletes the items
+    [(operation_id, log)] = request_queries
+    assert operation_id == "users-delete_user_me"
+    assert_query_count(log, 2)
+    assert db.exec(select(Item).where(Item.owner_id == user_id)).first() is None
+
+
+def test_recover_password_html_content(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    request_queries: RequestQueries,
+) -> None:
+    r = client.post(
+        f"{settings.API_V1_STR}/password-recovery-html-content/"
+        f"{settings.FIRST_SUPERUSER}",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 200
+    assert settings.FIRST_SUPERUSER in r.text
+    [(operation_id, log)] = request_queries
+    assert operation_id == "login-recover_password_html_content"
+    assert log.count <= ROUTE_QUERY_COUNTS[operation_id]
@@ -1,6 +1,7 @@
 import uuid
 from unittest.mock import patch
 
+import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session, select
 
@@ -8,6 +9,7 @@ from app import crud
 from app.core.config import settings
 from app.core.security import verify_password
 from app.models import User, UserCreate
+from app.tests.utils.user import create_random_user
 from app.tests.utils.utils import random_email, random_lower_string
 
 
@@ -22,6 +24,21 @@ def test_get_users_superuser_me(
     assert current_user["email"] == settings.FIRST_SUPERUSER
 
 
+def test_get_users_me_etag(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    url = f"{settings.API_V1_STR}/users/me"
+    etag = client.get(url, headers=normal_user_token_headers).headers["etag"]
+    r = client.get(url, headers={**normal_user_token_headers, "If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.headers["etag"] == etag
+
+    client.patch(url, headers=normal_user_token_headers, json={"full_name": "New"})
+    r = client.get(url, headers={**normal_user_token_headers, "If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.json()["full_name"] == "New"
+
+
 def test_get_users_normal_user_me(
     client: TestClient, normal_user_token_headers: dict[str, str]
 ) -> None:
@@ -37,7 +54,7 @@ def test_create_user_new_email(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
     with (
-        patch("app.utils.send_email", return_value=None),
+        patch("app.core.mailer.mailer.send", return_value=None) as send,
         patch("app.core.config.settings.SMTP_HOST", "smtp.example.com"),
         patch("app.core.config.settings.SMTP_USER", "admin@example.com"),
     ):
@@ -54,6 +71,8 @@ def test_create_user_new_email(
         user = crud.get_user_by_email(session=db, email=username)
         assert user
         assert user.email == created_user["email"]
+        send.assert_called_once()
+        assert send.call_args.args[0].email_to == username
 
 
 def test_get_existing_user(
@@ -102,6 +121,27 @@ def test_get_existing_user_current_user(client: TestClient, db: Session) -> None
     assert existing_user.email == api_user["email"]
 
 
+@pytest.mark.usefixtures("enable_response_cache")
+def test_get_existing_user_cached(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    user = create_random_user(db)
+    url = f"{settings.API_V1_STR}/users/{user.id}"
+    email = client.get(url, headers=superuser_token_headers).json()["email"]
+
+    user.full_name = "Changed"
+    db.add(user)
+    db.commit()
+    r = client.get(url, headers=superuser_token_headers)
+    assert r.json()["email"] == email
+    assert r.json()["full_name"] is None
+
+    # Updating the user through the API invalidates the cached response
+    client.patch(url, headers=superuser_token_headers, json={"is_active": True})
+    r = client.get(url, headers=superuser_token_headers)
+    assert r.json()["full_name"] == "Changed"
+
+
 def test_get_existing_user_permissions_error(
     client: TestClient, normal_user_token_headers: dict[str, str]
 ) -> None:
@@ -168,6 +208,81 @@ def test_retrieve_users(
         assert "email" in item
 
 
+def test_retrieve_users_fields(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"fields": "email,id"},
+    )
+    assert r.status_code == 200
+    users = r.json()["data"]
+    assert users
+    assert all(set(user) == {"id", "email"} for user in users)
+
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"fields": "hashed_password"},
+    )
+    assert r.status_code == 400
+
+
+def test_retrieve_users_cursor(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    for _ in range(3):
+        user_in = UserCreate(email=random_email(), password=random_lower_string())
+        crud.create_user(session=db, user_create=user_in)
+
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"limit": 2},
+    )
+    first_page = r.json()
+    assert len(first_page["data"]) == 2
+    assert first_page["next_cursor"]
+
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"limit": 2, "cursor": first_page["next_cursor"]},
+    )
+    second_page = r.json()
+    assert r.status_code == 200
+    assert len(second_page["data"]) >= 1
+    ids = [user["id"] for user in first_page["data"] + second_page["data"]]
+    assert ids == sorted(ids, key=uuid.UUID)
+    assert len(set(ids)) == len(ids)
+
+
+def test_retrieve_users_invalid_cursor(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"cursor": "invalid"},
+    )
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Invalid cursor"
+
+
+def test_retrieve_users_invalid_limit(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    # A page needs at least one row to build its next_cursor from
+    for params in ({"limit": 0}, {"limit": -1}, {"skip": -1}):
+        r = client.get(
+            f"{settings.API_V1_STR}/users/",
+            headers=superuser_token_headers,
+            params=params,
+        )
+        assert r.status_code == 422
+
+
 def test_update_user_me(
     client: TestClient, normal_user_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -346,6 +461,60 @@ def test_update_user(
     assert user_db.full_name == "Updated_full_name"
 
 
+def test_update_user_deactivate_invalidates_auth_cache(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    username = random_email()
+    password = random_lower_string()
+    user_in = UserCreate(email=username, password=password)
+    user = crud.create_user(session=db, user_create=user_in)
+    r = client.post(
+        f"{settings.API_V1_STR}/login/access-token",
+        data={"username": username, "password": password},
+    )
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    # Cache the user's auth fields
+    r = client.get(f"{settings.API_V1_STR}/items/", headers=headers)
+    assert r.status_code == 200
+
+    r = client.patch(
+        f"{settings.API_V1_STR}/users/{user.id}",
+        headers=superuser_token_headers,
+        json={"is_active": False},
+    )
+    assert r.status_code == 200
+
+    r = client.get(f"{settings.API_V1_STR}/items/", headers=headers)
+    assert r.status_code == 400
+    assert r.json() == {"detail": "Inactive user"}
+
+
+def test_update_user_if_match(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    user = create_random_user(db)
+    url = f"{settings.API_V1_STR}/users/{user.id}"
+    r = client.patch(url, headers=superuser_token_headers, json={"full_name": "First"})
+    etag = r.headers["etag"]
+
+    r = client.patch(
+        url,
+        headers={**superuser_token_headers, "If-Match": etag},
+        json={"full_name": "Second"},
+    )
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+
+    r = client.patch(
+        url,
+        headers={**superuser_token_headers, "If-Match": etag},
+        json={"full_name": "Third"},
+    )
+    assert r.status_code == 412
+    db.refresh(user)
+    assert user.full_name == "Second"
+
+
 def test_update_user_not_exists(
     client: TestClient, superuser_token_headers: dict[str, str]
 ) -> None:
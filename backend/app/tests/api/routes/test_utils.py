@@ -0,0 +1,64 @@
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+
+
+def test_db_pool_stats(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/db-pool-stats/",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 200
+    pools = {pool["name"]: pool for pool in r.json()}
+    assert set(pools) == {"sync", "async"}
+    assert pools["async"]["pool_size"] == settings.db_pool_size
+    assert pools["async"]["max_overflow"] == settings.db_max_overflow
+    assert pools["sync"]["pool_size"] == settings.DB_SYNC_POOL_SIZE
+    assert pools["sync"]["max_overflow"] == settings.DB_SYNC_MAX_OVERFLOW
+    # Logging in the superuser checked out a connection
+    assert pools["async"]["checkouts"] >= 1
+    assert pools["async"]["checked_out"] >= 0
+
+
+def test_db_pool_stats_normal_user(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/db-pool-stats/",
+        headers=normal_user_token_headers,
+    )
+    assert r.status_code == 403
+
+
+def test_password_hash_stats(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/password-hash-stats/",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 200
+    stats = r.json()
+    assert stats["workers"] == settings.PASSWORD_HASH_WORKERS
+    assert stats["queue_limit"] == settings.PASSWORD_HASH_QUEUE_LIMIT
+    # The superuser logged in to get the token
+    assert stats["calls"] >= 1
+
+
+def test_cache_stats(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/cache-stats/",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 200
+    caches = {cache["name"]: cache for cache in r.json()}
+    assert caches["auth_user"]["enabled"] == settings.AUTH_USER_CACHE_ENABLED
+    assert caches["auth_user"]["maxsize"] == settings.AUTH_USER_CACHE_SIZE
+    assert 0 <= caches["auth_user"]["hit_ratio"] <= 1
+    assert caches["response"]["enabled"] == settings.RESPONSE_CACHE_ENABLED
+    assert caches["response"]["max_memory_bytes"] == settings.RESPONSE_CACHE_MAX_BYTES
+    assert caches["response"]["memory_bytes"] >= 0
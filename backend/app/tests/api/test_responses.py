@@ -0,0 +1,39 @@
+import uuid
+
+from fastapi.responses import JSONResponse
+
+from app.api.responses import PydanticJSONResponse, rows_page_response
+from app.models import Item, ItemPublic, ItemsPublic
+
+
+def test_pydantic_json_response_same_bytes() -> None:
+    owner_id = uuid.uuid4()
+    items = [
+        Item(title='Ünïcode ✓ "quoted"\n', description=None, owner_id=owner_id),
+        Item(title="b", description="\\ / \t", owner_id=owner_id),
+    ]
+    page = ItemsPublic(data=items, count=2, count_exact=False)
+    response = PydanticJSONResponse(page)
+    assert response.body == JSONResponse(page.model_dump(mode="json")).body
+
+
+def test_pydantic_json_response_other_content() -> None:
+    content = {"value": 1e16, "items": [1, None, True]}
+    assert PydanticJSONResponse(content).body == JSONResponse(content).body
+
+
+def test_rows_page_response_same_bytes() -> None:
+    owner_id = uuid.uuid4()
+    items = [
+        Item(title='Ünïcode ✓ "quoted"\n', description=None, owner_id=owner_id),
+        Item(title="b", description="\\ / \t", owner_id=owner_id),
+    ]
+    page = ItemsPublic(data=items, count=2, count_exact=False, next_cursor="abc")
+    fields = list(ItemPublic.model_fields)
+    # Other columns are left out
+    rows = [item.model_dump() for item in items]
+    response = rows_page_response(
+        fields, rows, count=2, count_exact=False, next_cursor="abc"
+    )
+    assert response.body == PydanticJSONResponse(page).body
+    assert response.media_type == "application/json"
@@ -4,6 +4,7 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session, delete
 
+from app.api.response_cache import response_cache
 from app.core.config import settings
 from app.core.db import engine, init_db
 from app.main import app
@@ -40,3 +41,16 @@ def normal_user_token_headers(client: TestClient, db: Session) -> dict[str, str]
     return authentication_token_from_email(
         client=client, email=settings.EMAIL_TEST_USER, db=db
     )
+
+
+@pytest.fixture
+def enable_response_cache() -> Generator[None, None, None]:
+    """
+    Cache the responses of the RESPONSE_CACHE_ROUTES, disabled by default.
+    """
+    routes, enabled = response_cache.routes, response_cache.backend.enabled
+    response_cache.routes = set(settings.RESPONSE_CACHE_ROUTES)
+    response_cache.backend.enabled = True
+    yield
+    response_cache.routes, response_cache.backend.enabled = routes, enabled
+    response_cache.backend.clear()
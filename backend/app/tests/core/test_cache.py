@@ -0,0 +1,101 @@
+import time
+
+from app.core.cache import CachedResponse, MemoryResponseCache, TTLCache
+
+
+def test_ttl_cache_get_set() -> None:
+    cache: TTLCache[str, int] = TTLCache(name="test", maxsize=10, ttl=60)
+    assert cache.get("a") is None
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    cache.delete("a")
+    assert cache.get("a") is None
+    status = cache.status()
+    assert status.hits == 1
+    assert status.misses == 2
+    assert status.hit_ratio == 1 / 3
+
+
+def test_ttl_cache_expiry() -> None:
+    cache: TTLCache[str, int] = TTLCache(name="test", maxsize=10, ttl=60)
+    cache.set("a", 1, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_lru_eviction() -> None:
+    cache: TTLCache[str, int] = TTLCache(name="test", maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_disabled() -> None:
+    cache: TTLCache[str, int] = TTLCache(name="test", maxsize=10, ttl=60, enabled=False)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_memory_response_cache_invalidate_tags() -> None:
+    cache = MemoryResponseCache(name="test", maxsize=10, max_bytes=1000, ttl=60)
+    response = CachedResponse(body=b"{}", headers={"etag": '"a"'})
+    cache.set("a", response, tags=["item:1", "items:all"])
+    cache.set("b", response, tags=["item:2", "items:all"])
+    assert cache.get("a") == response
+    cache.invalidate(["item:1"])
+    assert cache.get("a") is None
+    assert cache.get("b") == response
+    cache.invalidate(["items:all"])
+    assert cache.get("b") is None
+    assert len(cache) == 0
+    assert cache.status().memory_bytes == 0
+
+
+def test_memory_response_cache_max_bytes() -> None:
+    cache = MemoryResponseCache(name="test", maxsize=10, max_bytes=25, ttl=60)
+    cache.set("a", CachedResponse(body=b"a" * 10, headers={}), tags=[])
+    cache.set("b", CachedResponse(body=b"b" * 10, headers={}), tags=[])
+    assert cache.status().memory_bytes == 20
+    # The least recently used entry is evicted to make room
+    cache.set("c", CachedResponse(body=b"c" * 10, headers={}), tags=[])
+    assert cache.get("a") is None
+    assert cache.get("c") is not None
+    assert cache.status().memory_bytes == 20
+    # Bigger than the whole cache, not stored
+    cache.set("d", CachedResponse(body=b"d" * 30, headers={}), tags=[])
+    assert cache.get("d") is None
+
+
+def test_memory_response_cache_invalidated_during_read() -> None:
+    cache = MemoryResponseCache(name="test", maxsize=10, max_bytes=1000, ttl=60)
+    response = CachedResponse(body=b"{}", headers={"etag": '"a"'})
+    # Read before a write to item 1 is committed, set after its invalidation
+    generation = cache.generation()
+    cache.invalidate(["item:1"])
+    cache.set("a", response, tags=["item:1", "items:all"], generation=generation)
+    assert cache.get("a") is None
+    # Other tags weren't invalidated, responses read after the write are fresh
+    cache.set("b", response, tags=["item:2"], generation=generation)
+    assert cache.get("b") == response
+    cache.set("a", response, tags=["item:1"], generation=cache.generation())
+    assert cache.get("a") == response
+
+
+def test_memory_response_cache_forgotten_generations() -> None:
+    cache = MemoryResponseCache(name="test", maxsize=2, max_bytes=1000, ttl=60)
+    response = CachedResponse(body=b"{}", headers={})
+    generation = cache.generation()
+    cache.invalidate(["item:1"])
+    cache.invalidate(["item:2"])
+    cache.invalidate(["item:3"])
+    # Whether item:1 was invalidated after the read isn't known anymore
+    cache.set("a", response, tags=["item:1"], generation=generation)
+    assert cache.get("a") is None
+    cache.set("a", response, tags=["item:1"], generation=cache.generation())
+    assert cache.get("a") == response
@@ -0,0 +1,167 @@
+import asyncio
+import gzip
+import json
+import zlib
+
+import brotli  # type: ignore[import-untyped]
+import zstandard
+from fastapi.testclient import TestClient
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.compression import (
+    CompressionMiddleware,
+    decoded_etag,
+    encoded_etag,
+    negotiate_encoding,
+)
+from app.core.config import settings
+
+ENCODINGS = ["zstd", "br", "gzip"]
+
+
+def test_negotiate_encoding() -> None:
+    assert negotiate_encoding("gzip, deflate, br, zstd", ENCODINGS) == "zstd"
+    assert negotiate_encoding("gzip, br;q=0.8", ENCODINGS) == "gzip"
+    assert negotiate_encoding("br;q=0.5, gzip;q=0.5", ENCODINGS) == "br"
+    assert negotiate_encoding("*", ENCODINGS) == "zstd"
+    assert negotiate_encoding("*, zstd;q=0", ENCODINGS) == "br"
+    assert negotiate_encoding("identity", ENCODINGS) is None
+    assert negotiate_encoding("gzip;q=0", ENCODINGS) is None
+    assert negotiate_encoding("GZIP;q=invalid, br", ENCODINGS) == "br"
+    assert negotiate_encoding("", ENCODINGS) is None
+
+
+def make_app(
+    chunks: list[bytes],
+    content_type: str = "application/json",
+    *,
+    status: int = 200,
+    etag: str | None = None,
+) -> ASGIApp:
+    async def app(_scope: Scope, _receive: Receive, send: Send) -> None:
+        headers = [(b"content-type", content_type.encode())]
+        if len(chunks) == 1:
+            headers.append((b"content-length", str(len(chunks[0])).encode()))
+        if etag:
+            headers.append((b"etag", etag.encode()))
+        await send(
+            {"type": "http.response.start", "status": status, "headers": headers}
+        )
+        for i, chunk in enumerate(chunks):
+            more_body = i < len(chunks) - 1
+            await send(
+                {"type": "http.response.body", "body": chunk, "more_body": more_body}
+            )
+
+    return app
+
+
+def call(app: ASGIApp, accept_encoding: str, if_none_match: str = "") -> list[Message]:
+    middleware = CompressionMiddleware(
+        app,
+        levels={"zstd": 3, "br": 4, "gzip": 6},
+        minimum_size=100,
+        content_types=["application/json", "application/x-ndjson"],
+    )
+    scope = {
+        "type": "http",
+        "headers": [
+            (b"accept-encoding", accept_encoding.encode()),
+            (b"if-none-match", if_none_match.encode()),
+        ],
+    }
+    messages: list[Message] = []
+
+    async def receive() -> Message:
+        return {"type": "http.request"}
+
+    async def send(message: Message) -> None:
+        messages.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    return messages
+
+
+def decompress(encoding: str, data: bytes) -> bytes:
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    if encoding == "br":
+        return bytes(brotli.decompress(data))
+    return bytes(zstandard.ZstdDecompressor().decompressobj().decompress(data))
+
+
+def test_compress_response() -> None:
+    body = json.dumps([{"title": f"Item {i}"} for i in range(100)]).encode()
+    for encoding in ENCODINGS:
+        start, message = call(make_app([body]), encoding)
+        headers = dict(start["headers"])
+        assert headers[b"content-encoding"] == encoding.encode()
+        assert headers[b"vary"] == b"Accept-Encoding"
+        assert int(headers[b"content-length"]) == len(message["body"])
+        assert len(message["body"]) < len(body)
+        assert decompress(encoding, message["body"]) == body
+
+
+def test_compress_response_etag() -> None:
+    body = b"x" * 1000
+    for encoding in ENCODINGS:
+        start, _ = call(make_app([body], etag='"abc"'), encoding)
+        # Another ETag for other bytes, the uncompressed one's can be found back
+        etag = dict(start["headers"])[b"etag"].decode()
+        assert etag == f'"abc-{encoding}"'
+        assert decoded_etag(etag) == '"abc"'
+    assert encoded_etag('W/"abc"', "gzip") == 'W/"abc"'
+    # Not compressed, kept
+    start, _ = call(make_app([b"{}"], etag='"abc"'), "gzip")
+    assert dict(start["headers"])[b"etag"] == b'"abc"'
+
+
+def test_not_modified_etag() -> None:
+    # The 304 has the ETag the client sent, of the compressed or plain response
+    for if_none_match, expected in (('"abc-gzip"', b'"abc-gzip"'), ('"abc"', b'"abc"')):
+        start, _ = call(
+            make_app([b""], status=304, etag='"abc"'), "gzip", if_none_match
+        )
+        assert dict(start["headers"])[b"etag"] == expected
+
+
+def test_compress_response_skipped() -> None:
+    body = b"x" * 1000
+    # Small, not an allowed content type, or not accepted by the client
+    for app, accept_encoding in (
+        (make_app([b"{}"]), "gzip"),
+        (make_app([body], content_type="image/png"), "gzip"),
+        (make_app([body]), "identity"),
+    ):
+        start, message = call(app, accept_encoding)
+        assert b"content-encoding" not in dict(start["headers"])
+        assert message["body"] in (body, b"{}")
+
+
+def test_compress_streaming_response() -> None:
+    chunks = [b'{"title": "Item %d"}\n' % i for i in range(3)]
+    for encoding in ENCODINGS:
+        start, *messages = call(
+            make_app(chunks, content_type="application/x-ndjson"), encoding
+        )
+        headers = dict(start["headers"])
+        assert headers[b"content-encoding"] == encoding.encode()
+        assert b"content-length" not in headers
+        assert len(messages) == len(chunks)
+        # Each chunk is flushed, the data so far can be decoded before the end
+        if encoding == "gzip":
+            decoder = zlib.decompressobj(31)
+            assert decoder.decompress(messages[0]["body"]) == chunks[0]
+        output = b"".join(message["body"] for message in messages)
+        assert decompress(encoding, output) == b"".join(chunks)
+
+
+def test_compress_api_response(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/openapi.json",
+        headers={**superuser_token_headers, "Accept-Encoding": "gzip"},
+    )
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.json()["openapi"]
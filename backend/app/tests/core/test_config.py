@@ -0,0 +1,18 @@
+import warnings
+
+import pytest
+
+from app.core.config import Settings
+
+
+def test_db_pools_share_max_connections() -> None:
+    with warnings.catch_warnings():
+        warnings.filterwarnings("error", message=".*DB_MAX_CONNECTIONS")
+        settings = Settings(WEB_CONCURRENCY=4, DB_MAX_CONNECTIONS=40)  # type: ignore[call-arg]
+    # 10 connections per worker, 3 of them for the sync engine
+    assert settings.db_pool_size + settings.db_max_overflow == 7
+
+
+def test_db_pools_over_max_connections() -> None:
+    with pytest.warns(UserWarning, match=r"async and sync pools \(13\) times"):
+        Settings(WEB_CONCURRENCY=4, DB_MAX_CONNECTIONS=40, DB_POOL_SIZE=10)  # type: ignore[call-arg]
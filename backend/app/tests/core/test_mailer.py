@@ -0,0 +1,176 @@
+import json
+import smtplib
+import threading
+import time
+from collections.abc import Generator
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.mailer import Mailer, OutgoingEmail, mailer
+from app.tests.utils.smtp import SMTPServer, smtp_server
+
+
+@pytest.fixture
+def server() -> Generator[SMTPServer, None, None]:
+    with smtp_server() as s:
+        yield s
+
+
+def make_mailer(server: SMTPServer, **kwargs: object) -> Mailer:
+    options: dict[str, object] = {
+        "connect": lambda: smtplib.SMTP("127.0.0.1", server.port, timeout=5),
+        "queue_size": 100,
+        "batch_size": 10,
+        "max_retries": 2,
+        "retry_delay": 0.01,
+        "retry_max_delay": 0.05,
+        "idle_timeout": 30,
+    }
+    return Mailer(**(options | kwargs))  # type: ignore[arg-type]
+
+
+def email(i: int = 0) -> OutgoingEmail:
+    return OutgoingEmail(
+        email_to=f"user{i}@example.com",
+        subject=f"Subject {i}",
+        html_content="<p>Hi</p>",
+    )
+
+
+def test_mailer_reuses_connection(server: SMTPServer) -> None:
+    test_mailer = make_mailer(server)
+    for i in range(5):
+        test_mailer.send(email(i))
+    assert test_mailer.wait(timeout=10)
+    test_mailer.stop(timeout=10)
+    assert [m["To"] for m in server.messages] == [
+        f"user{i}@example.com" for i in range(5)
+    ]
+    assert server.messages[0]["Subject"] == "Subject 0"
+    status = test_mailer.status()
+    assert status.sent == 5
+    assert status.connections == 1
+    assert server.connections == 1
+
+
+def test_mailer_reconnects_when_closed_by_server(server: SMTPServer) -> None:
+    server.close_after_message = True
+    test_mailer = make_mailer(server)
+    for i in range(3):
+        test_mailer.send(email(i))
+        assert test_mailer.wait(timeout=10)
+    test_mailer.stop(timeout=10)
+    assert len(server.messages) == 3
+    status = test_mailer.status()
+    assert status.connections == 3
+    assert status.failed_attempts == 0
+
+
+def test_mailer_retries_temporary_error(server: SMTPServer) -> None:
+    server.fail_codes = [451, 451]
+    test_mailer = make_mailer(server)
+    test_mailer.send(email())
+    assert test_mailer.wait(timeout=10)
+    test_mailer.stop(timeout=10)
+    assert len(server.messages) == 1
+    status = test_mailer.status()
+    assert status.sent == 1
+    assert status.failed_attempts == 2
+    assert status.dead_letters == 0
+
+
+def test_mailer_dead_letters(server: SMTPServer, tmp_path: Path) -> None:
+    dead_letter_path = tmp_path / "dead-letters.jsonl"
+    # A permanent error, then a temporary one on all the attempts
+    server.fail_codes = [550, 451, 451, 451]
+    test_mailer = make_mailer(server, dead_letter_path=str(dead_letter_path))
+    test_mailer.send(email(0))
+    assert test_mailer.wait(timeout=10)
+    test_mailer.send(email(1))
+    assert test_mailer.wait(timeout=10)
+    test_mailer.stop(timeout=10)
+    assert server.messages == []
+    records = [json.loads(line) for line in dead_letter_path.read_text().splitlines()]
+    assert [(r["email_to"], r["attempts"]) for r in records] == [
+        ("user0@example.com", 1),
+        ("user1@example.com", 3),
+    ]
+    assert records[0]["html_content"] == "<p>Hi</p>"
+    assert "550" in records[0]["error"]
+    assert test_mailer.status().dead_letters == 2
+
+
+def test_mailer_queue_full(server: SMTPServer) -> None:
+    connecting = threading.Event()
+    release = threading.Event()
+
+    def connect() -> smtplib.SMTP:
+        connecting.set()
+        release.wait(timeout=10)
+        return smtplib.SMTP("127.0.0.1", server.port, timeout=5)
+
+    test_mailer = make_mailer(server, connect=connect, queue_size=1)
+    test_mailer.send(email(0))
+    # The first email is being sent, the second one fills the queue
+    assert connecting.wait(timeout=10)
+    test_mailer.send(email(1))
+    with pytest.raises(HTTPException) as e:
+        test_mailer.send(email(2))
+    assert e.value.status_code == 503
+    release.set()
+    assert test_mailer.wait(timeout=10)
+    test_mailer.stop(timeout=10)
+    assert len(server.messages) == 2
+    assert test_mailer.status().rejected == 1
+
+
+def test_mailer_stop_sends_queued_emails(server: SMTPServer) -> None:
+    test_mailer = make_mailer(server, retry_delay=60)
+    server.fail_codes = [451]
+    test_mailer.send(email(0))
+    deadline = time.monotonic() + 10
+    while not test_mailer.status().retrying and time.monotonic() < deadline:
+        time.sleep(0.01)
+    test_mailer.send(email(1))
+    # The retry of the first email isn't delayed when stopping
+    test_mailer.stop(timeout=10)
+    assert {m["To"] for m in server.messages} == {
+        "user0@example.com",
+        "user1@example.com",
+    }
+    status = test_mailer.status()
+    assert status.queued == status.retrying == 0
+
+
+def test_test_email_queued(
+    client: TestClient, superuser_token_headers: dict[str, str], server: SMTPServer
+) -> None:
+    with (
+        patch("app.core.config.settings.SMTP_HOST", "127.0.0.1"),
+        patch("app.core.config.settings.SMTP_PORT", server.port),
+        patch("app.core.config.settings.SMTP_TLS", False),
+        patch("app.core.config.settings.SMTP_USER", None),
+    ):
+        r = client.post(
+            f"{settings.API_V1_STR}/utils/test-email/",
+            headers=superuser_token_headers,
+            params={"email_to": "test@example.com"},
+        )
+        assert r.status_code == 201
+        assert mailer.wait(timeout=10)
+        mailer.stop(timeout=10)
+    assert server.messages[-1]["To"] == "test@example.com"
+    assert server.messages[-1]["From"] == (
+        f"{settings.EMAILS_FROM_NAME} <{settings.EMAILS_FROM_EMAIL}>"
+    )
+
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/mail-stats/", headers=superuser_token_headers
+    )
+    assert r.status_code == 200
+    assert r.json()["sent"] >= 1
@@ -0,0 +1,112 @@
+import os
+import subprocess
+import sys
+from collections.abc import Generator
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app.core.config import settings
+from app.core.db import async_engine, engine
+from app.core.metrics import MetricsMiddleware
+from app.main import app
+
+BACKEND_DIR = Path(__file__).parents[3]
+
+
+@pytest.fixture
+def metrics_client() -> Generator[TestClient, None, None]:
+    pools = {"sync": engine.pool, "async": async_engine.pool}
+    with TestClient(MetricsMiddleware(app, pools=pools)) as client:
+        yield client
+
+
+def sample(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_requests_by_operation_id(
+    metrics_client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    ok = {"operation_id": "users-read_user_me", "method": "GET", "status_code": "200"}
+    unauthorized = {**ok, "status_code": "401"}
+    unmatched = {"operation_id": "unmatched", "method": "GET", "status_code": "404"}
+    duration = {"operation_id": "users-read_user_me", "method": "GET"}
+    before = {
+        "ok": sample("http_requests_total", **ok),
+        "unauthorized": sample("http_requests_total", **unauthorized),
+        "unmatched": sample("http_requests_total", **unmatched),
+        "duration": sample("http_request_duration_seconds_count", **duration),
+    }
+
+    url = f"{settings.API_V1_STR}/users/me"
+    assert metrics_client.get(url, headers=superuser_token_headers).status_code == 200
+    assert metrics_client.get(url).status_code == 401
+    assert metrics_client.get("/not-a-route").status_code == 404
+
+    assert sample("http_requests_total", **ok) == before["ok"] + 1
+    assert sample("http_requests_total", **unauthorized) == before["unauthorized"] + 1
+    assert sample("http_requests_total", **unmatched) == before["unmatched"] + 1
+    assert (
+        sample("http_request_duration_seconds_count", **duration)
+        == before["duration"] + 2
+    )
+    assert sample("http_requests_in_progress") == 0
+    assert sample("db_pool_size", engine="async") == async_engine.pool.size()  # type: ignore[attr-defined]
+
+
+def test_password_hash_metrics(metrics_client: TestClient) -> None:
+    before = sample("password_hash_duration_seconds_count")
+    r = metrics_client.post(
+        f"{settings.API_V1_STR}/login/access-token",
+        data={
+            "username": settings.FIRST_SUPERUSER,
+            "password": settings.FIRST_SUPERUSER_PASSWORD,
+        },
+    )
+    assert r.status_code == 200
+    assert sample("password_hash_duration_seconds_count") == before + 1
+    assert sample("password_hash_wait_seconds_count") >= 1
+
+
+WORKER = """
+from app.core.metrics import http_requests, http_requests_in_progress
+http_requests.labels("items-read_items", "GET", "200").inc({count})
+http_requests_in_progress.set(1)
+"""
+
+SCRAPE = """
+import sys
+from app.core.metrics import generate_metrics
+sys.stdout.write(generate_metrics()[0].decode())
+"""
+
+
+def run_python(code: str, multiproc_dir: Path) -> str:
+    env = {
+        **os.environ,
+        "PROMETHEUS_MULTIPROC_DIR": str(multiproc_dir),
+        "PYTHONPATH": str(BACKEND_DIR),
+    }
+    return subprocess.run(
+        [sys.executable, "-c", code],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+
+
+def test_multiprocess_totals(tmp_path: Path) -> None:
+    # Each worker writes its own files, a scrape from any process adds them up
+    run_python(WORKER.format(count=2), tmp_path)
+    run_python(WORKER.format(count=3), tmp_path)
+    output = run_python(SCRAPE, tmp_path)
+    assert (
+        'http_requests_total{method="GET",operation_id="items-read_items",'
+        'status_code="200"} 5.0'
+    ) in output
+    # The workers exited without marking themselves dead, their gauges remain
+    assert "http_requests_in_progress 2.0" in output
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+
+import pytest
+from sqlmodel import Session, select
+from starlette.types import Message, Receive, Scope, Send
+
+from app.core.queries import QueryCountMiddleware, capture_queries, chunk_queries
+from app.models import User
+
+
+def test_capture_queries(db: Session) -> None:
+    with capture_queries() as log:
+        db.exec(select(User).limit(1)).first()
+        db.exec(select(User).limit(1)).first()
+    assert log.count == 2
+    assert log.summary().startswith("2 x SELECT")
+    # Outside of the block nothing is collected
+    db.exec(select(User).limit(1)).first()
+    assert log.count == 2
+
+
+def call(middleware: QueryCountMiddleware) -> None:
+    scope = {"type": "http", "method": "GET", "path": "/users/", "headers": []}
+
+    async def receive() -> Message:
+        return {"type": "http.request"}
+
+    async def send(_message: Message) -> None:
+        pass
+
+    asyncio.run(middleware(scope, receive, send))
+
+
+def test_query_budget_warning(db: Session, caplog: pytest.LogCaptureFixture) -> None:
+    async def app(_scope: Scope, _receive: Receive, _send: Send) -> None:
+        for _ in range(3):
+            db.exec(select(User).limit(1)).first()
+
+    with caplog.at_level(logging.WARNING, logger="app.core.queries"):
+        call(QueryCountMiddleware(app, budgets={}, default_budget=3))
+        assert caplog.records == []
+        call(QueryCountMiddleware(app, budgets={"unmatched": 2}, default_budget=3))
+    [record] = caplog.records
+    assert "GET /users/ (unmatched) ran 3 SQL queries, its budget is 2" in (
+        record.getMessage()
+    )
+    assert "3 x SELECT" in record.getMessage()
+
+
+def test_chunk_queries(db: Session, caplog: pytest.LogCaptureFixture) -> None:
+    with caplog.at_level(logging.WARNING, logger="app.core.queries"):
+        with capture_queries() as request_log:
+            for budget in (2, 1):
+                with chunk_queries("Import", budget) as log:
+                    db.exec(select(User).limit(1)).first()
+                    db.exec(select(User).limit(1)).first()
+                assert log.count == 2
+    # Not counted in the request, the chunk over its budget is reported
+    assert request_log.count == 0
+    [record] = caplog.records
+    assert "Import chunk ran 2 SQL queries, its budget is 1" in record.getMessage()
@@ -0,0 +1,108 @@
+import asyncio
+import time
+import uuid
+from datetime import timedelta
+from unittest.mock import patch
+
+import jwt
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.security import (
+    PasswordHashExecutor,
+    async_get_password_hash,
+    async_verify_password,
+    create_access_token,
+    decode_access_token,
+    password_hash_executor,
+    token_cache,
+    verify_password,
+)
+from app.main import app
+
+
+def test_async_password_hash() -> None:
+    async def hash_and_verify() -> tuple[str, bool, bool]:
+        hashed_password = await async_get_password_hash("password")
+        return (
+            hashed_password,
+            await async_verify_password("password", hashed_password),
+            await async_verify_password("incorrect", hashed_password),
+        )
+
+    hashed_password, valid, invalid = asyncio.run(hash_and_verify())
+    assert verify_password("password", hashed_password)
+    assert valid is True
+    assert invalid is False
+
+
+def test_password_hash_executor_queue_limit() -> None:
+    executor = PasswordHashExecutor(workers=0, queue_limit=1)
+
+    async def run_concurrently() -> tuple[BaseException | None, ...]:
+        return await asyncio.gather(
+            executor.run(time.sleep, 0.1),
+            executor.run(time.sleep, 0.1),
+            return_exceptions=True,
+        )
+
+    first, second = asyncio.run(run_concurrently())
+    assert first is None
+    assert isinstance(second, HTTPException)
+    assert second.status_code == 503
+    status = executor.status()
+    assert status.calls == 1
+    assert status.rejected == 1
+    assert status.queued_max == 1
+    assert status.in_flight == 0
+    assert status.hash_mean_ms >= 100
+
+
+def test_password_hash_executor_error() -> None:
+    executor = PasswordHashExecutor(workers=0, queue_limit=1)
+    with pytest.raises(ValueError):
+        asyncio.run(executor.run(int, "not a number"))
+    assert executor.in_flight == 0
+
+
+def test_password_hash_executor_shutdown() -> None:
+    executor = PasswordHashExecutor(workers=1, queue_limit=1)
+    assert asyncio.run(executor.run(int, "1")) == 1
+    executor.shutdown()
+    # The next call starts a new pool
+    assert asyncio.run(executor.run(int, "2")) == 2
+    executor.shutdown()
+
+
+def test_lifespan_shuts_down_password_hash_executor() -> None:
+    with patch.object(password_hash_executor, "shutdown") as shutdown:
+        with TestClient(app):
+            shutdown.assert_not_called()
+    shutdown.assert_called_once_with()
+
+
+def test_decode_access_token_cached() -> None:
+    subject = str(uuid.uuid4())
+    token = create_access_token(subject, expires_delta=timedelta(minutes=5))
+    assert decode_access_token(token) == subject
+    hits = token_cache.hits
+    assert decode_access_token(token) == subject
+    assert token_cache.hits == hits + 1
+
+
+def test_decode_access_token_secret_key_rotation() -> None:
+    token = create_access_token(uuid.uuid4(), expires_delta=timedelta(minutes=5))
+    decode_access_token(token)
+    with patch.object(settings, "SECRET_KEY", "rotated-secret-key"):
+        with pytest.raises(jwt.InvalidTokenError):
+            decode_access_token(token)
+
+
+def test_decode_access_token_expired() -> None:
+    token = create_access_token(uuid.uuid4(), expires_delta=timedelta(seconds=1))
+    decode_access_token(token)
+    time.sleep(1.1)
+    with pytest.raises(jwt.ExpiredSignatureError):
+        decode_access_token(token)
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import logging
+from collections.abc import Generator
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from starlette.types import Message, Receive, Scope, Send
+
+from app.core import timing
+from app.core.config import settings
+from app.core.db import async_engine
+from app.core.timing import ServerTimingMiddleware, add_timing, timed
+from app.main import app
+
+
+async def timed_app(_scope: Scope, _receive: Receive, send: Send) -> None:
+    with timed("auth"):
+        pass
+    add_timing("db", 0.002)
+    add_timing("db", 0.001)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+def call(scope: Scope) -> list[Message]:
+    messages: list[Message] = []
+
+    async def receive() -> Message:
+        return {"type": "http.request"}
+
+    async def send(message: Message) -> None:
+        messages.append(message)
+
+    asyncio.run(ServerTimingMiddleware(timed_app)(scope, receive, send))
+    return messages
+
+
+def test_server_timing_header(caplog: pytest.LogCaptureFixture) -> None:
+    scope = {"type": "http", "method": "GET", "path": "/items/", "headers": []}
+    with caplog.at_level(logging.INFO, logger="app.core.timing"):
+        start, _ = call(scope)
+    header = dict(start["headers"])[b"server-timing"].decode()
+    metrics = {m.split(";")[0]: m for m in header.split(", ")}
+    assert list(metrics) == ["auth", "db", "total"]
+    assert metrics["db"] == 'db;dur=3.00;desc="2"'
+    record = json.loads(caplog.records[-1].getMessage())
+    assert record["path"] == "/items/"
+    assert record["status_code"] == 200
+    assert record["db_ms"] == 3.0
+    assert record["db_count"] == 2
+    assert record["auth_count"] == 1
+
+
+def test_timed_outside_request() -> None:
+    # Nothing is recorded, and nothing fails, without the middleware
+    with timed("auth"):
+        add_timing("db", 1.0)
+
+
+@pytest.fixture
+def timed_client() -> Generator[TestClient, None, None]:
+    target = async_engine.sync_engine
+    timing.instrument_engine(target)
+    try:
+        with TestClient(ServerTimingMiddleware(app)) as client:
+            yield client
+    finally:
+        event.remove(target, "before_cursor_execute", timing._before_cursor_execute)
+        event.remove(target, "after_cursor_execute", timing._after_cursor_execute)
+
+
+def test_server_timing_api(timed_client: TestClient) -> None:
+    r = timed_client.post(
+        f"{settings.API_V1_STR}/login/access-token",
+        data={
+            "username": settings.FIRST_SUPERUSER,
+            "password": settings.FIRST_SUPERUSER_PASSWORD,
+        },
+    )
+    assert r.status_code == 200
+    phases = {m.split(";")[0] for m in r.headers["server-timing"].split(", ")}
+    assert {"db", "hash", "hash_wait", "render", "total"} <= phases
+
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    r = timed_client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.status_code == 200
+    phases = {m.split(";")[0] for m in r.headers["server-timing"].split(", ")}
+    assert {"auth", "db", "render", "total"} <= phases
+
+    # The list pages are rendered by rows_page_response
+    r = timed_client.get(f"{settings.API_V1_STR}/users/", headers=headers)
+    assert r.status_code == 200
+    phases = {m.split(";")[0] for m in r.headers["server-timing"].split(", ")}
+    assert {"auth", "db", "render", "total"} <= phases
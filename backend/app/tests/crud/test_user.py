@@ -2,7 +2,8 @@ from fastapi.encoders import jsonable_encoder
 from sqlmodel import Session
 
 from app import crud
-from app.core.security import verify_password
+from app.core.config import settings
+from app.core.security import create_pwd_context, pwd_context, verify_password
 from app.models import User, UserCreate, UserUpdate
 from app.tests.utils.utils import random_email, random_lower_string
 
@@ -26,6 +27,50 @@ def test_authenticate_user(db: Session) -> None:
     assert user.email == authenticated_user.email
 
 
+def test_authenticate_user_rehash_outdated_scheme(db: Session) -> None:
+    password = random_lower_string()
+    user = crud.create_user(
+        session=db,
+        user_create=UserCreate(email=random_email(), password=password),
+    )
+    old_context = create_pwd_context(
+        "pbkdf2_sha256",
+        bcrypt_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+        pbkdf2_rounds=1000,
+    )
+    user.hashed_password = old_context.hash(password)
+    db.add(user)
+    db.commit()
+    assert pwd_context.needs_update(user.hashed_password)
+
+    authenticated_user = crud.authenticate(
+        session=db, email=user.email, password=password
+    )
+    assert authenticated_user
+    db.refresh(user)
+    assert pwd_context.identify(user.hashed_password) == settings.PASSWORD_HASH_SCHEME
+    assert not pwd_context.needs_update(user.hashed_password)
+    assert verify_password(password, user.hashed_password)
+
+
+def test_authenticate_user_rehash_outdated_cost(db: Session) -> None:
+    password = random_lower_string()
+    user = crud.create_user(
+        session=db,
+        user_create=UserCreate(email=random_email(), password=password),
+    )
+    old_context = create_pwd_context(
+        settings.PASSWORD_HASH_SCHEME, bcrypt_rounds=4, pbkdf2_rounds=1000
+    )
+    user.hashed_password = old_context.hash(password)
+    db.add(user)
+    db.commit()
+
+    assert crud.authenticate(session=db, email=user.email, password=password)
+    db.refresh(user)
+    assert not pwd_context.needs_update(user.hashed_password)
+
+
 def test_not_authenticate_user(db: Session) -> None:
     email = random_email()
     password = random_lower_string()
@@ -0,0 +1,45 @@
+from collections.abc import Generator
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session
+
+from app.core.db import engine
+
+PLAN_EMAIL_PREFIX = "query-plan-"
+
+
+@pytest.fixture(scope="package", autouse=True)
+def plan_rows() -> Generator[None, None, None]:
+    """
+    Items of many owners, so the table statistics of the plans look like a real
+    table's: with the few rows of the tests alone, the owner_id condition seems
+    to match the whole table and an index on it looks useless.
+    """
+    with Session(engine) as session:
+        session.connection().execute(
+            text(
+                'INSERT INTO "user" (id, email, is_active, is_superuser, '
+                "hashed_password) SELECT gen_random_uuid(), "
+                ":prefix || i || '@example.com', true, false, 'hash' "
+                "FROM generate_series(1, 200) AS i"
+            ).bindparams(prefix=PLAN_EMAIL_PREFIX)
+        )
+        session.connection().execute(
+            text(
+                "INSERT INTO item (id, title, owner_id) "
+                "SELECT gen_random_uuid(), 'Item ' || i, owner.id "
+                'FROM "user" AS owner, generate_series(1, 5) AS i '
+                "WHERE owner.email LIKE :prefix || '%'"
+            ).bindparams(prefix=PLAN_EMAIL_PREFIX)
+        )
+        session.commit()
+    yield
+    with Session(engine) as session:
+        # Their items are deleted by the ON DELETE CASCADE of item.owner_id
+        session.connection().execute(
+            text("DELETE FROM \"user\" WHERE email LIKE :prefix || '%'").bindparams(
+                prefix=PLAN_EMAIL_PREFIX
+            )
+        )
+        session.commit()
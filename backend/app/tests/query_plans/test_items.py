@@ -0,0 +1,107 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app import crud
+from app.core.config import settings
+from app.models import Item, ItemCreate
+from app.tests.utils.query_plan import assert_index_scans, capture_statements
+from app.tests.utils.user import create_user_with_headers
+from app.tests.utils.utils import random_lower_string
+
+
+def create_user_with_items(
+    client: TestClient, db: Session, count: int = 3
+) -> tuple[dict[str, str], list[Item]]:
+    user, headers = create_user_with_headers(client, db)
+    items = [
+        crud.create_item(
+            session=db,
+            item_in=ItemCreate(title=random_lower_string()),
+            owner_id=user.id,
+        )
+        for _ in range(count)
+    ]
+    return headers, items
+
+
+def test_read_items_owner_plans(client: TestClient, db: Session) -> None:
+    headers, _ = create_user_with_items(client, db)
+    url = f"{settings.API_V1_STR}/items/"
+    with capture_statements() as statements:
+        r = client.get(url, headers=headers, params={"limit": 2})
+        assert r.status_code == 200
+        next_cursor = r.json()["next_cursor"]
+        r = client.get(url, headers=headers, params={"limit": 2, "cursor": next_cursor})
+        assert r.status_code == 200
+        r = client.get(url, headers=headers, params={"count_mode": "capped"})
+        assert r.status_code == 200
+    assert_index_scans(statements)
+
+
+def test_export_items_owner_plans(client: TestClient, db: Session) -> None:
+    headers, _ = create_user_with_items(client, db)
+    with capture_statements() as statements:
+        r = client.get(f"{settings.API_V1_STR}/items/export", headers=headers)
+        assert r.status_code == 200
+    assert_index_scans(statements)
+
+
+def test_read_items_superuser_plans(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    create_user_with_items(client, db)
+    url = f"{settings.API_V1_STR}/items/"
+    with capture_statements() as statements:
+        r = client.get(url, headers=superuser_token_headers, params={"limit": 2})
+        assert r.status_code == 200
+        next_cursor = r.json()["next_cursor"]
+        r = client.get(
+            url,
+            headers=superuser_token_headers,
+            params={"limit": 2, "cursor": next_cursor},
+        )
+        assert r.status_code == 200
+    assert_index_scans(statements)
+
+
+def test_item_by_id_plans(client: TestClient, db: Session) -> None:
+    headers, items = create_user_with_items(client, db, count=2)
+    with capture_statements() as statements:
+        r = client.get(f"{settings.API_V1_STR}/items/{items[0].id}", headers=headers)
+        assert r.status_code == 200
+        r = client.put(
+            f"{settings.API_V1_STR}/items/{items[0].id}",
+            headers=headers,
+            json={"title": "Updated title"},
+        )
+        assert r.status_code == 200
+        r = client.delete(f"{settings.API_V1_STR}/items/{items[1].id}", headers=headers)
+        assert r.status_code == 200
+    assert_index_scans(statements)
+
+
+def test_bulk_plans(client: TestClient, db: Session) -> None:
+    headers, items = create_user_with_items(client, db, count=2)
+    with capture_statements() as statements:
+        r = client.put(
+            f"{settings.API_V1_STR}/items/bulk",
+            headers=headers,
+            json={"data": [{"id": str(item.id), "title": "Bulk"} for item in items]},
+        )
+        assert r.status_code == 200
+        r = client.request(
+            "DELETE",
+            f"{settings.API_V1_STR}/items/bulk",
+            headers=headers,
+            json={"ids": [str(item.id) for item in items]},
+        )
+        assert r.status_code == 200
+    assert_index_scans(statements)
+
+
+def test_sort_without_index_is_reported() -> None:
+    # A page ordered by a column without an index sorts all the rows
+    statement = "SELECT item.id FROM item ORDER BY item.title LIMIT 10"
+    with pytest.raises(AssertionError, match="Sort of item rows"):
+        assert_index_scans([(statement, {})])
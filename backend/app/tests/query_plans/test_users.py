@@ -0,0 +1,57 @@
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app import crud
+from app.core.config import settings
+from app.models import ItemCreate
+from app.tests.utils.query_plan import assert_index_scans, capture_statements
+from app.tests.utils.user import create_random_user
+from app.tests.utils.utils import random_lower_string
+
+
+def test_read_users_plans(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    create_random_user(db)
+    create_random_user(db)
+    url = f"{settings.API_V1_STR}/users/"
+    with capture_statements() as statements:
+        r = client.get(url, headers=superuser_token_headers, params={"limit": 1})
+        assert r.status_code == 200
+        next_cursor = r.json()["next_cursor"]
+        r = client.get(
+            url,
+            headers=superuser_token_headers,
+            params={"limit": 1, "cursor": next_cursor},
+        )
+        assert r.status_code == 200
+    assert_index_scans(statements)
+
+
+def test_login_plans(client: TestClient) -> None:
+    login_data = {
+        "username": settings.FIRST_SUPERUSER,
+        "password": settings.FIRST_SUPERUSER_PASSWORD,
+    }
+    with capture_statements() as statements:
+        r = client.post(f"{settings.API_V1_STR}/login/access-token", data=login_data)
+        assert r.status_code == 200
+    assert_index_scans(statements)
+
+
+def test_delete_user_plans(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    user = create_random_user(db)
+    item_in = ItemCreate(title=random_lower_string())
+    crud.create_item(session=db, item_in=item_in, owner_id=user.id)
+    with capture_statements() as statements:
+        r = client.get(
+            f"{settings.API_V1_STR}/users/{user.id}", headers=superuser_token_headers
+        )
+        assert r.status_code == 200
+        r = client.delete(
+            f"{settings.API_V1_STR}/users/{user.id}", headers=superuser_token_headers
+        )
+        assert r.status_code == 200
+    assert_index_scans(statements)
@@ -0,0 +1,48 @@
+import asyncio
+import io
+import json
+import time
+import uuid
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud, importer
+from app.core.config import settings
+from app.core.db import async_engine
+from app.importer import ValidatedChunk, import_items, validate_chunk
+
+
+def test_import_items_error_waits_for_the_validation() -> None:
+    validated: list[int] = []
+
+    def slow_validate_chunk(*args: Any) -> ValidatedChunk:
+        # Still reading the file when the copy of the previous chunk fails
+        time.sleep(0.1)
+        chunk = validate_chunk(*args)
+        validated.append(chunk[0])
+        return chunk
+
+    async def failing_copy(**_kwargs: Any) -> int:
+        raise RuntimeError("Copy failed")
+
+    async def run() -> list[int]:
+        file = io.StringIO("\n".join(json.dumps({"title": f"{i}"}) for i in range(4)))
+        async with AsyncSession(async_engine) as session:
+            with pytest.raises(RuntimeError, match="Copy failed"):
+                await import_items(
+                    session=session,
+                    owner_id=uuid.uuid4(),
+                    file=file,
+                    file_format="ndjson",
+                )
+        return list(validated)
+
+    with (
+        patch.object(settings, "IMPORT_CHUNK_SIZE", 2),
+        patch.object(importer, "validate_chunk", slow_validate_chunk),
+        patch.object(crud, "async_copy_items", failing_copy),
+    ):
+        assert asyncio.run(run()) == [2, 2]
@@ -0,0 +1,51 @@
+import os
+from pathlib import Path
+
+from jinja2 import Template
+
+from app.utils import (
+    EMAIL_TEMPLATES_DIR,
+    create_email_environment,
+    email_environment,
+    load_email_templates,
+    render_email_template,
+)
+
+
+def test_email_templates_loaded() -> None:
+    load_email_templates()
+    assert set(email_environment.list_templates(extensions=["html"])) == {
+        path.name for path in EMAIL_TEMPLATES_DIR.glob("*.html")
+    }
+    context = {
+        "project_name": "Project",
+        "username": "test@example.com",
+        "email": "test@example.com",
+        "valid_hours": 48,
+        "link": "https://example.com/reset-password?token=token",
+    }
+    template_str = (EMAIL_TEMPLATES_DIR / "reset_password.html").read_text()
+    assert render_email_template(
+        template_name="reset_password.html", context=context
+    ) == Template(template_str).render(context)
+
+
+def test_email_templates_reload(tmp_path: Path) -> None:
+    template_path = tmp_path / "test.html"
+    template_path.write_text("Hello {{ name }}")
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    for auto_reload in (False, True):
+        environment = create_email_environment(
+            auto_reload=auto_reload, cache_dir=str(cache_dir), directory=tmp_path
+        )
+        template_path.write_text("Hello {{ name }}")
+        assert environment.get_template("test.html").render(name="a") == "Hello a"
+        template_path.write_text("Bye {{ name }}")
+        # Newer modification time, not to depend on the file system resolution
+        stat = template_path.stat()
+        os.utime(template_path, (stat.st_atime, stat.st_mtime + 10))
+        expected = "Bye a" if auto_reload else "Hello a"
+        assert environment.get_template("test.html").render(name="a") == expected
+    # The compiled templates were cached
+    assert any(cache_dir.iterdir())
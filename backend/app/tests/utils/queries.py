@@ -0,0 +1,106 @@
+from collections.abc import Generator
+from contextlib import contextmanager
+
+from app.core.queries import QueryLog, request_listeners
+
+# The most SQL queries a request to each route (by operation id) runs in the
+# route tests, each test starting with an empty auth user cache. The route tests
+# fail when a request runs more, and a full run of them fails when no request
+# runs as many: update a count when a change adds or removes queries, raising it
+# only for queries the route really needs
+ROUTE_QUERY_COUNTS = {
+    "items-create_item": 3,
+    "items-create_items": 2,
+    "items-delete_item": 3,
+    "items-delete_items": 3,
+    "items-export_items": 2,
+    "items-import_items": 1,
+    "items-read_item": 2,
+    "items-read_items": 4,
+    "items-update_item": 4,
+    "items-update_items": 3,
+    "login-login_access_token": 2,
+    "login-recover_password": 1,
+    "login-recover_password_html_content": 2,
+    "login-reset_password": 2,
+    "login-test_token": 1,
+    "metrics-metrics": 0,
+    "private-create_user": 2,
+    "users-create_user": 4,
+    "users-delete_user": 3,
+    "users-delete_user_me": 2,
+    "users-read_user_by_id": 2,
+    "users-read_user_me": 1,
+    "users-read_users": 3,
+    "users-register_user": 3,
+    "users-update_password_me": 2,
+    "users-update_user": 4,
+    "users-update_user_me": 4,
+    "utils-cache_stats": 1,
+    "utils-db_pool_stats": 1,
+    "utils-health_check": 0,
+    "utils-mail_stats": 1,
+    "utils-password_hash_stats": 1,
+    "utils-test_email": 1,
+    "unmatched": 0,
+}
+
+RequestQueries = list[tuple[str, QueryLog]]
+
+
+@contextmanager
+def record_request_queries() -> Generator[RequestQueries, None, None]:
+    """
+    Collect the operation id and the SQL queries of each request to the app.
+    """
+    requests: RequestQueries = []
+
+    def listener(operation_id: str, log: QueryLog) -> None:
+        requests.append((operation_id, log))
+
+    request_listeners.append(listener)
+    try:
+        yield requests
+    finally:
+        request_listeners.remove(listener)
+
+
+def assert_query_count(log: QueryLog, expected: int) -> None:
+    assert (
+        log.count == expected
+    ), f"{log.count} SQL queries instead of {expected}:\n{log.summary()}"
+
+
+def update_query_maxima(maxima: dict[str, int], requests: RequestQueries) -> None:
+    for operation_id, log in requests:
+        maxima[operation_id] = max(maxima.get(operation_id, 0), log.count)
+
+
+def assert_exact_query_counts(maxima: dict[str, int]) -> None:
+    """
+    Check that the pinned count of each requested route is the most queries one
+    of its requests ran, so that the counts go down with the queries.
+    """
+    stale = {
+        operation_id: (count, ROUTE_QUERY_COUNTS[operation_id])
+        for operation_id, count in maxima.items()
+        if count != ROUTE_QUERY_COUNTS[operation_id]
+    }
+    assert not stale, "Update ROUTE_QUERY_COUNTS, the most queries run are:\n" + (
+        "\n".join(
+            f"{operation_id}: {count} (pinned {pinned})"
+            for operation_id, (count, pinned) in sorted(stale.items())
+        )
+    )
+
+
+def assert_pinned_query_counts(requests: RequestQueries) -> None:
+    for operation_id, log in requests:
+        assert (
+            operation_id in ROUTE_QUERY_COUNTS
+        ), f"No query count for {operation_id}, add it to ROUTE_QUERY_COUNTS"
+        pinned = ROUTE_QUERY_COUNTS[operation_id]
+        assert log.count <= pinned, (
+            f"{operation_id} ran {log.count} SQL queries, more than the "
+            f"{pinned} of ROUTE_QUERY_COUNTS:\n{log.summary()}"
+        )
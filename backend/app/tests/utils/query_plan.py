@@ -0,0 +1,122 @@
+import re
+from collections.abc import Generator
+from contextlib import contextmanager
+from typing import Any
+
+from sqlalchemy import Engine, event
+
+from app.core.db import async_engine, engine
+
+Statement = tuple[str, Any]
+
+
+@contextmanager
+def capture_statements() -> Generator[list[Statement], None, None]:
+    """
+    Collect the SQL statements (and parameters) the API routes send to the DB.
+    """
+    statements: list[Statement] = []
+
+    def before_cursor_execute(
+        _conn: Any,
+        _cursor: Any,
+        statement: str,
+        parameters: Any,
+        _context: Any,
+        executemany: bool,
+    ) -> None:
+        if not executemany:
+            statements.append((statement, parameters))
+
+    target: Engine = async_engine.sync_engine
+    event.listen(target, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(target, "before_cursor_execute", before_cursor_execute)
+
+
+# Statements that read a whole table on purpose, a Seq Scan is expected there
+FULL_SCAN_STATEMENTS = (
+    # The unfiltered count of the superuser lists
+    re.compile(r'SELECT count\(\*\) AS count_1 FROM (item|"user")'),
+)
+
+
+def _scanned_tables(node: dict[str, Any], tables: set[str]) -> set[str]:
+    found = {node["Relation Name"]} & tables if "Relation Name" in node else set()
+    for child in node.get("Plans", []):
+        found |= _scanned_tables(child, tables)
+    return found
+
+
+def _scan_problems(node: dict[str, Any], tables: set[str]) -> list[str]:
+    problems = []
+    relation = node.get("Relation Name")
+    # A primary key lookup finds at most one row, filtering it is fine, e.g.
+    # the row version check of an UPDATE
+    primary_key_lookup = (
+        node.get("Index Name", "").endswith("_pkey")
+        and node.get("Index Cond", "").startswith("(id = ")
+    ) or (
+        # The same lookup as a bitmap scan, chosen with stale table statistics
+        node.get("Node Type") == "Bitmap Heap Scan"
+        and node.get("Recheck Cond", "").startswith("(id = ")
+    )
+    if relation in tables and node.get("Node Type") == "Seq Scan":
+        problems.append(f"Seq Scan on {relation}")
+    elif relation in tables and "Filter" in node and not primary_key_lookup:
+        problems.append(
+            f"{node['Node Type']} on {relation} "
+            f"filters rows without an index: {node['Filter']}"
+        )
+    # An index in the order of the query makes the sort unnecessary, e.g. for
+    # an ORDER BY id LIMIT page, without it all the matching rows are sorted
+    if node.get("Node Type") == "Sort" and (
+        sorted_tables := _scanned_tables(node, tables)
+    ):
+        problems.append(
+            f"Sort of {', '.join(sorted(sorted_tables))} rows by "
+            f"{node.get('Sort Key')} without an index"
+        )
+    for child in node.get("Plans", []):
+        problems.extend(_scan_problems(child, tables))
+    return problems
+
+
+def assert_index_scans(
+    statements: list[Statement], tables: tuple[str, ...] = ("item", "user")
+) -> None:
+    """
+    EXPLAIN each statement and fail if a scan on tables doesn't use an index for
+    all its conditions, either a Seq Scan or an index scan with a Filter, or
+    if their rows are sorted instead of read in the order of an index. Only
+    the statements of FULL_SCAN_STATEMENTS can read a whole table.
+
+    The test tables are tiny, so sequential scans are disabled to see the plan
+    Postgres would use for a big table, if an index can serve the query. So are
+    index-only scans, with so few rows reading a whole covering index and
+    filtering it can look cheaper than an index lookup. The tables are analyzed
+    first, the plans of a few freshly inserted rows depend on stale statistics.
+    """
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE " + ", ".join(f'"{table}"' for table in tables))
+    checked = 0
+    for statement, parameters in statements:
+        if statement.lstrip().upper().startswith("INSERT"):
+            continue
+        with engine.connect() as conn:
+            conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+            conn.exec_driver_sql("SET LOCAL enable_indexonlyscan = off")
+            plan = conn.exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {statement}", parameters
+            ).scalar_one()
+        problems = _scan_problems(plan[0]["Plan"], set(tables))
+        if any(
+            pattern.fullmatch(" ".join(statement.split()))
+            for pattern in FULL_SCAN_STATEMENTS
+        ):
+            problems = [p for p in problems if not p.startswith("Seq Scan")]
+        assert not problems, f"{problems} in query:\n{statement}"
+        checked += 1
+    assert checked, "No statements to check"
@@ -0,0 +1,84 @@
+import socketserver
+import threading
+from collections.abc import Generator
+from contextlib import contextmanager
+from email import message_from_bytes
+from email.message import Message
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """
+    The SMTP commands smtplib sends, without TLS or authentication.
+    """
+
+    server: "SMTPServer"
+
+    def reply(self, line: str) -> None:
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self) -> None:
+        self.server.connections += 1
+        self.reply("220 localhost SMTP test server")
+        while line := self.rfile.readline():
+            command = line.decode().strip().split(" ", 1)[0].upper()
+            if command == "EHLO":
+                self.reply("250-localhost")
+                self.reply("250 8BITMIME")
+            elif command in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                self.receive_data()
+                if self.server.close_after_message:
+                    return
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+    def receive_data(self) -> None:
+        lines = []
+        while (line := self.rfile.readline()) not in (b".\r\n", b""):
+            lines.append(line[1:] if line.startswith(b"..") else line)
+        with self.server.lock:
+            code = self.server.fail_codes.pop(0) if self.server.fail_codes else 250
+            if code == 250:
+                self.server.messages.append(message_from_bytes(b"".join(lines)))
+        self.reply(f"{code} {'OK' if code == 250 else 'Failed'}")
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    """
+    Local SMTP server keeping the messages it receives.
+
+    fail_codes are replied to the next messages instead of 250, close_after_message
+    closes the connection after each message like a server with a short timeout.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.lock = threading.Lock()
+        self.messages: list[Message] = []
+        self.fail_codes: list[int] = []
+        self.close_after_message = False
+        self.connections = 0
+
+    @property
+    def port(self) -> int:
+        return int(self.server_address[1])
+
+
+@contextmanager
+def smtp_server() -> Generator[SMTPServer, None, None]:
+    server = SMTPServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
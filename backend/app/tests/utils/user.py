@@ -19,14 +19,29 @@ def user_authentication_headers(
     return headers
 
 
-def create_random_user(db: Session) -> User:
-    email = random_email()
-    password = random_lower_string()
+def create_random_user(
+    db: Session, *, email: str | None = None, password: str | None = None
+) -> User:
+    email = email or random_email()
+    password = password or random_lower_string()
     user_in = UserCreate(email=email, password=password)
     user = crud.create_user(session=db, user_create=user_in)
     return user
 
 
+def create_user_with_headers(
+    client: TestClient, db: Session
+) -> tuple[User, dict[str, str]]:
+    """
+    Create a random user and return it with the headers of a logged in request.
+    """
+    email = random_email()
+    password = random_lower_string()
+    user = create_random_user(db, email=email, password=password)
+    headers = user_authentication_headers(client=client, email=email, password=password)
+    return user, headers
+
+
 def authentication_token_from_email(
     *, client: TestClient, email: str, db: Session
 ) -> dict[str, str]:
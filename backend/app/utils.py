@@ -1,16 +1,20 @@
+import base64
+import binascii
 import logging
+import uuid
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Any
 
-import emails  # type: ignore
 import jwt
-from jinja2 import Template
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 from jwt.exceptions import InvalidTokenError
+from pydantic import BaseModel
 
 from app.core import security
 from app.core.config import settings
+from app.core.mailer import OutgoingEmail, mailer
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,11 +26,44 @@ class EmailData:
     subject: str
 
 
+EMAIL_TEMPLATES_DIR = Path(__file__).parent / "email-templates" / "build"
+
+
+def create_email_environment(
+    *,
+    auto_reload: bool,
+    cache_dir: str | None = None,
+    directory: Path = EMAIL_TEMPLATES_DIR,
+) -> Environment:
+    """
+    Jinja environment of the email templates. Each template is compiled once
+    per process, or loaded from the bytecode cache when another process or a
+    previous run compiled it.
+    """
+    return Environment(
+        loader=FileSystemLoader(directory),
+        bytecode_cache=FileSystemBytecodeCache(cache_dir),
+        auto_reload=auto_reload,
+    )
+
+
+email_environment = create_email_environment(
+    auto_reload=bool(settings.EMAIL_TEMPLATES_RELOAD),
+    cache_dir=settings.EMAIL_TEMPLATES_CACHE_DIR,
+)
+
+
+def load_email_templates() -> None:
+    """
+    Compile all the email templates, at startup, so the first emails don't.
+    """
+    for template_name in email_environment.list_templates(extensions=["html"]):
+        email_environment.get_template(template_name)
+
+
 def render_email_template(*, template_name: str, context: dict[str, Any]) -> str:
-    template_str = (
-        Path(__file__).parent / "email-templates" / "build" / template_name
-    ).read_text()
-    html_content = Template(template_str).render(context)
+    template = email_environment.get_template(template_name)
+    html_content = template.render(context)
     return html_content
 
 
@@ -36,23 +73,13 @@ def send_email(
     subject: str = "",
     html_content: str = "",
 ) -> None:
+    """
+    Queue an email, it's sent in the background by the mailer.
+    """
     assert settings.emails_enabled, "no provided configuration for email variables"
-    message = emails.Message(
-        subject=subject,
-        html=html_content,
-        mail_from=(settings.EMAILS_FROM_NAME, settings.EMAILS_FROM_EMAIL),
+    mailer.send(
+        OutgoingEmail(email_to=email_to, subject=subject, html_content=html_content)
     )
-    smtp_options = {"host": settings.SMTP_HOST, "port": settings.SMTP_PORT}
-    if settings.SMTP_TLS:
-        smtp_options["tls"] = True
-    elif settings.SMTP_SSL:
-        smtp_options["ssl"] = True
-    if settings.SMTP_USER:
-        smtp_options["user"] = settings.SMTP_USER
-    if settings.SMTP_PASSWORD:
-        smtp_options["password"] = settings.SMTP_PASSWORD
-    response = message.send(to=email_to, smtp=smtp_options)
-    logger.info(f"send email result: {response}")
 
 
 def generate_test_email(email_to: str) -> EmailData:
@@ -121,3 +148,27 @@ def verify_password_reset_token(token: str) -> str | None:
         return str(decoded_token["sub"])
     except InvalidTokenError:
         return None
+
+
+def encode_cursor(id: uuid.UUID) -> str:
+    return base64.urlsafe_b64encode(id.bytes).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> uuid.UUID | None:
+    try:
+        return uuid.UUID(bytes=base64.urlsafe_b64decode(cursor + "=="))
+    except (binascii.Error, ValueError):
+        return None
+
+
+def parse_fields(fields: str | None, model: type[BaseModel]) -> list[str] | None:
+    """
+    The names in a comma separated fields parameter, in the order of the model
+    fields, all of them if not given. None if a name isn't a field of the model.
+    """
+    if fields is None:
+        return list(model.model_fields)
+    names = {name.strip() for name in fields.split(",") if name.strip()}
+    if not names or not names <= model.model_fields.keys():
+        return None
+    return [name for name in model.model_fields if name in names]